@@ -0,0 +1,62 @@
+"""
+Benchmark of the multi-seller allocation optimizer on synthetic BOMs.
+
+usage: python benchmarks/bench_allocation.py [lines] [offers per line]
+"""
+
+import random
+import sys
+import time
+
+from pyoctopart.bom import allocate_bom, cost_bom
+from pyoctopart.table import OfferTable
+
+
+def synthetic_response(lines, offers, seed=0):
+    ''' A parts_match response with one part of `offers` offers per line '''
+    rand = random.Random(seed)
+    results = []
+    for line in range(lines):
+        part_offers = []
+        for number in range(offers):
+            base = rand.uniform(0.01, 5.0)
+            multiple = rand.choice([1, 1, 1, 5, 10, 100])
+            part_offers.append({
+                '__class__': 'PartOffer', 'sku': 'SKU-%d-%d' % (line, number),
+                'seller': {'__class__': 'Seller', 'uid': str(number),
+                           'name': 'Seller %d' % number},
+                'prices': {'USD': [[1, base], [100, base * 0.8],
+                                   [1000, base * 0.6]]},
+                'in_stock_quantity': rand.choice([0, 10, 100, 1000, 10000]),
+                'moq': rand.choice([1, 1, 10, 100]),
+                'order_multiple': multiple, 'factory_lead_days': 42,
+                'is_authorized': rand.random() < 0.8})
+        results.append({'__class__': 'PartsMatchResult', 'hits': 1,
+                        'items': [{'__class__': 'Part', 'uid': str(line),
+                                   'offers': part_offers}]})
+    quantities = [rand.choice([10, 100, 500, 2000, 20000])
+            for _ in range(lines)]
+    return {'__class__': 'PartsMatchResponse', 'results': results}, quantities
+
+def timed(label, fun, *args, **kwargs):
+    start = time.time()
+    ret = fun(*args, **kwargs)
+    print('%-24s %8.3fs' % (label, time.time() - start))
+    return ret
+
+def main(lines=10000, offers=10):
+    response, quantities = synthetic_response(lines, offers)
+    print('%d lines x %d offers' % (lines, offers))
+    table = timed('OfferTable.from_json', OfferTable.from_json, response)
+    cost = timed('cost_bom', cost_bom, table, quantities)
+    allocations = timed('allocate_bom', allocate_bom, table, quantities)
+    split = sum(1 for allocation in allocations if len(allocation.picks) > 1)
+    short = sum(1 for allocation in allocations if allocation.shortfall)
+    print('single offer total %.2f, %d lines unsourced' % (cost.total,
+        len(cost.missing)))
+    print('allocated total %.2f, %d lines split, %d lines short' % (
+        sum(allocation.cost for allocation in allocations), split, short))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
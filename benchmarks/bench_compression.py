@@ -0,0 +1,115 @@
+"""
+Benchmark of the compression of cached parts_match results: bytes saved
+against the time added to cache writes and reads, by method, level and
+dictionary.
+
+usage: python benchmarks/bench_compression.py [entries]
+"""
+
+import json
+import random
+import sys
+import time
+
+from pyoctopart import compression
+from pyoctopart.compression import Codec, train_dictionary
+
+
+SELLERS = ['Digi-Key', 'Mouser', 'Arrow', 'Avnet', 'Newark', 'Farnell',
+           'RS Components', 'TME', 'Rochester Electronics', 'Future']
+
+
+def synthetic_entry(number, rand):
+    ''' A cached parts_match entry: the echoed query and its result '''
+    mpn = 'MPN-%06d' % number
+    offers = []
+    for seller in rand.sample(range(len(SELLERS)), rand.randint(2, 8)):
+        base = rand.uniform(0.01, 5.0)
+        offers.append({
+            '__class__': 'PartOffer', 'sku': '%s-ND%d' % (mpn, seller),
+            'seller': {'__class__': 'Seller', 'uid': 'a%015x' % seller,
+                       'name': SELLERS[seller],
+                       'homepage_url': 'http://www.%s.com' %
+                           SELLERS[seller].lower().replace(' ', ''),
+                       'display_flag': 'US', 'has_ecommerce': True},
+            'eligible_region': 'US', 'product_url':
+                'https://octopart.com/redirect?sku=%s-ND%d' % (mpn, seller),
+            'octopart_rfq_url': None, 'packaging': 'Cut Tape',
+            'is_authorized': rand.random() < 0.8, 'is_realtime': False,
+            'last_updated': '2016-08-%02dT12:00:00Z' % rand.randint(1, 28),
+            'in_stock_quantity': rand.choice([0, 10, 100, 1000, 10000]),
+            'on_order_quantity': None, 'on_order_eta': None,
+            'factory_lead_days': rand.choice([None, 42, 84]),
+            'factory_order_multiple': None, 'order_multiple': 1,
+            'moq': rand.choice([1, 10, 100]), 'multipack_quantity': None,
+            'prices': {'USD': [[1, round(base, 4)], [100, round(base * .8, 4)],
+                               [1000, round(base * .6, 4)]]}})
+    part = {
+        '__class__': 'Part', 'uid': '%016x' % rand.getrandbits(64),
+        'mpn': mpn, 'octopart_url': 'https://octopart.com/%s' % mpn.lower(),
+        'manufacturer': {'__class__': 'Manufacturer', 'uid': 'b%015x' %
+                         (number % 50), 'name': 'Manufacturer %d' %
+                         (number % 50), 'homepage_url': None},
+        'brand': {'__class__': 'Brand', 'uid': 'c%015x' % (number % 50),
+                  'name': 'Brand %d' % (number % 50), 'homepage_url': None},
+        'short_description': 'Capacitor Ceramic %d nF' % rand.randint(1, 999),
+        'offers': offers,
+        'specs': dict((key, {'__class__': 'SpecValue', 'value': [value],
+                             'min_value': None, 'max_value': None,
+                             'display_value': value,
+                             'metadata': {'__class__': 'SpecMetadata',
+                                          'key': key, 'name': key.title(),
+                                          'datatype': 'string',
+                                          'unit': None}})
+                      for key, value in [
+                          ('capacitance', '%d nF' % rand.randint(1, 999)),
+                          ('case_package', rand.choice(['0402', '0603'])),
+                          ('voltage_rating_dc', rand.choice(['16 V', '50 V'])),
+                          ('lifecycle_status', 'Active')])}
+    return {'query': {'__class__': 'PartsMatchQuery', 'mpn': mpn,
+                      'brand': None, 'q': '', 'reference': None, 'seller': None,
+                      'sku': None, 'mpn_or_sku': None, 'start': 0,
+                      'limit': 3},
+            'result': {'__class__': 'PartsMatchResult', 'hits': 1,
+                       'reference': None, 'error': None, 'items': [part]}}
+
+def measure(label, codec, entries):
+    raw = sum(len(json.dumps(entry, separators=(',', ':')))
+            for entry in entries)
+    start = time.time()
+    encoded = [codec.encode(entry) for entry in entries]
+    encode = time.time() - start
+    start = time.time()
+    for data in encoded:
+        codec.decode(data)
+    decode = time.time() - start
+    size = sum(len(data) for data in encoded)
+    print('%-24s %10d bytes  %5.1f%%  encode %6.1fus  decode %6.1fus' % (
+        label, size, 100.0 * size / raw, 1e6 * encode / len(entries),
+        1e6 * decode / len(entries)))
+
+def main(entries=2000):
+    rand = random.Random(0)
+    training = [synthetic_entry(number, rand) for number in range(500)]
+    entries = [synthetic_entry(number, rand)
+            for number in range(500, 500 + entries)]
+    raw = sum(len(json.dumps(entry, separators=(',', ':')))
+            for entry in entries)
+    start = time.time()
+    for entry in entries:
+        json.loads(json.dumps(entry, separators=(',', ':')))
+    print('%d entries, %d bytes of JSON, JSON round-trip %.1fus' % (
+        len(entries), raw, 1e6 * (time.time() - start) / len(entries)))
+    methods = ['zlib']
+    if compression.zstandard is not None:
+        methods.append('zstd')
+    for method in methods:
+        dictionary = train_dictionary(training, method=method)
+        for level in ([1, 6, 9] if method == 'zlib' else [1, 3, 9]):
+            measure('%s %d' % (method, level), Codec(method, level), entries)
+            measure('%s %d dictionary' % (method, level),
+                    Codec(method, level, dictionary), entries)
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
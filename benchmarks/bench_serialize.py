@@ -0,0 +1,64 @@
+"""
+Benchmark of persisting parts_match results: reading them back from JSON
+resources through new_from_dict(), against to_dict()/from_dict(), pickle and
+msgpack, for the bytes written and the time to write and read them.
+
+usage: python benchmarks/bench_serialize.py [results]
+"""
+
+import json
+import pickle
+import random
+import sys
+import time
+
+from bench_compression import synthetic_entry
+from pyoctopart import serialize
+from pyoctopart.responses import PartsMatchResult
+
+
+def measure(label, dump, load, results, baseline=None):
+    start = time.time()
+    encoded = [dump(result) for result in results]
+    write = time.time() - start
+    start = time.time()
+    for data in encoded:
+        load(data)
+    read = time.time() - start
+    size = sum(len(data) for data in encoded)
+    print('%-24s %10d bytes  write %7.1fus  read %7.1fus%s' % (
+        label, size, 1e6 * write / len(results), 1e6 * read / len(results),
+        '  %5.1fx faster' % (baseline / read) if baseline else ''))
+    return read
+
+def main(results=2000):
+    rand = random.Random(0)
+    resources = [synthetic_entry(number, rand)['result']
+            for number in range(results)]
+    results = [PartsMatchResult.new_from_dict(resource)
+            for resource in resources]
+    print('%d parts_match results' % len(results))
+    # What persisting resources costs: the JSON they came as, built again
+    encoded = [json.dumps(resource, separators=(',', ':'))
+            for resource in resources]
+    start = time.time()
+    for data in encoded:
+        PartsMatchResult.new_from_dict(json.loads(data))
+    baseline = time.time() - start
+    print('%-24s %10d bytes  %20s read %7.1fus' % ('JSON new_from_dict',
+        sum(len(data) for data in encoded), '', 1e6 * baseline / len(results)))
+    measure('JSON to_dict', lambda result: json.dumps(result.to_dict(),
+            separators=(',', ':')), lambda data: PartsMatchResult.from_dict(
+            json.loads(data)), results, baseline)
+    measure('pickle', lambda result: pickle.dumps(result,
+            pickle.HIGHEST_PROTOCOL), pickle.loads, results, baseline)
+    formats = ['pickle']
+    if serialize.msgpack is not None:
+        formats.append('msgpack')
+    for format in formats:
+        measure('serialize %s' % format, lambda result: serialize.dumps(
+                result, format), serialize.loads, results, baseline)
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
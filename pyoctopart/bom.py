@@ -0,0 +1,344 @@
+'''
+BOM costing: pick the cheapest eligible offer of every line of a parts_match
+response at that line's quantity, and total the cost of the BOM; or split
+lines that no single seller can cover across several offers.
+
+Every offer of every line is priced, filtered and ranked at once over an
+OfferTable, so the cost of a run is linear in the number of offers.
+'''
+
+import bisect
+from collections import namedtuple
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from pyoctopart.table import OfferTable, _require_numpy
+from pyoctopart.pricing import PriceIndex, order_quantity
+
+
+BomLine = namedtuple('BomLine', 'line quantity part offer seller_uid sku '
+        'ordered unit_price extended_price eligible reason')
+
+
+class BomCost(object):
+    ''' Outcome of costing a BOM: the choice made for each line '''
+
+    def __init__(self, lines, currency):
+        self.lines = lines
+        self.currency = currency
+        self.total = sum(line.extended_price for line in lines
+                if line.offer is not None)
+        self.missing = [line.line for line in lines if line.offer is None]
+
+    def __str__(self):
+        return '%s of %d lines: %f %s, %d lines unsourced' % (
+                self.__class__.__name__, len(self.lines), self.total,
+                self.currency, len(self.missing))
+
+
+def _table(response):
+    if isinstance(response, OfferTable):
+        return response
+    if isinstance(response, dict):
+        return OfferTable.from_json(response)
+    return OfferTable.from_response(response)
+
+def _priced(table, mask, currency, rates):
+    ''' Rows of table selected by mask, and their PriceIndex '''
+    prices = None
+    if rates is not None:
+        # Convert over the whole table, which is what rates caches
+        prices = rates.table_prices(table, currency)[mask[table.break_offer]]
+    if not mask.all():
+        table = table.filter(mask)
+    return table, PriceIndex(table, currency, prices)
+
+def cost_bom(response, quantities, currency='USD', authorized_only=False,
+             sellers=None, min_stock=None, max_lead_days=None,
+             full_stock=False, rates=None):
+    '''
+    Cost a BOM out of a parts_match response.
+
+    param response: PartsMatchResponse, its JSON, or an OfferTable of it.
+    param quantities: quantity wanted for each line (match result).
+    param currency: currency offers are priced and totalled in.
+    param authorized_only: only consider authorized sellers.
+    param sellers: optional collection of allowed seller uids.
+    param min_stock: optional minimum in-stock quantity of offers.
+    param max_lead_days: optional maximum factory lead time of offers.
+    param full_stock: only consider offers that can ship the whole line.
+    param rates: optional RateTable to convert prices in other currencies
+        to currency; pass the same OfferTable to reuse its conversion.
+    returns: BomCost, with one BomLine per line.
+    '''
+    _require_numpy()
+    table = _table(response)
+    quantities = numpy.asarray(quantities, dtype=float)
+    nlines = len(quantities)
+    table, index = _priced(table, (table.line >= 0) & (table.line < nlines),
+            currency, rates)
+
+    rows = numpy.arange(len(table))
+    line = table.line
+    ordered, unit, extended = index.evaluate(rows, quantities[line])
+
+    checks = (
+        ('unpriced', ~numpy.isnan(extended)),
+        ('unauthorized', table.is_authorized if authorized_only else None),
+        ('other sellers', table.where(sellers=sellers)
+            if sellers is not None else None),
+        ('low stock', table.where(min_stock=min_stock)
+            if min_stock is not None else None),
+        ('long lead time', table.where(max_lead_days=max_lead_days)
+            if max_lead_days is not None else None),
+        ('short stock', table.in_stock_quantity >= ordered
+            if full_stock else None),
+    )
+    eligible = numpy.ones(len(table), dtype=bool)
+    rejected = []
+    for name, passed in checks:
+        if passed is not None:
+            eligible &= passed
+            rejected.append((name, numpy.bincount(line[~passed],
+                minlength=nlines)))
+    offers = numpy.bincount(line, minlength=nlines)
+    candidates = numpy.bincount(line[eligible], minlength=nlines)
+
+    # Cheapest eligible offer per line: sort by line then price, keep firsts
+    picked = rows[eligible]
+    picked = picked[numpy.lexsort((extended[picked], line[picked]))]
+    chosen_lines, first = numpy.unique(line[picked], return_index=True)
+    choice = numpy.full(nlines, -1, dtype=numpy.int64)
+    choice[chosen_lines] = picked[first]
+
+    lines = []
+    for number in range(nlines):
+        row = choice[number]
+        if row < 0:
+            if offers[number] == 0:
+                reason = 'no offers'
+            else:
+                reason = 'none of %d offers eligible: %s' % (offers[number],
+                    ', '.join('%d %s' % (counts[number], name)
+                        for name, counts in rejected if counts[number]))
+            lines.append(BomLine(number, quantities[number], None, None, None,
+                None, None, None, None, 0, reason))
+            continue
+        lines.append(BomLine(number, quantities[number],
+            table.parts[table.part[row]], table.offers[row],
+            table.seller_uid[row], table.sku[row], ordered[row], unit[row],
+            extended[row], candidates[number],
+            'cheapest of %d eligible offers' % candidates[number]))
+    return BomCost(lines, currency)
+
+
+# Multi-seller allocation
+
+Pick = namedtuple('Pick', 'offer seller_uid sku quantity unit_price '
+        'extended_price')
+Allocation = namedtuple('Allocation', 'line demand picks cost shortfall')
+
+
+def _price(quantities, prices, quantity):
+    ''' Unit price at quantity from sorted breaks, or None below the first '''
+    pos = bisect.bisect_right(quantities, quantity) - 1
+    if pos < 0:
+        return None
+    return prices[pos]
+
+def _segments(moq, multiple, capacity, quantities, prices):
+    '''
+    (lowest, highest quantity, unit price) of each price break an offer can
+    be bought in, those quantities being multiples of its order multiple
+    '''
+    ret = []
+    for pos, (start, price) in enumerate(zip(quantities, prices)):
+        end = capacity
+        if pos + 1 < len(quantities):
+            end = min(end, quantities[pos + 1] - 1)
+        low = order_quantity(start, moq, multiple)
+        high = end // multiple * multiple
+        if low <= high:
+            ret.append((low, high, price))
+    return ret
+
+def _window_min(values, width):
+    '''
+    Minimum of each window of width rows of values, padded below with inf:
+    row k of the result is the minimum of rows k to k + width - 1.
+    '''
+    rows = len(values)
+    blocks = -(-(rows + width) // width)
+    padded = numpy.full((blocks * width,) + values.shape[1:], numpy.inf)
+    padded[:rows] = values
+    padded = padded.reshape((blocks, width) + values.shape[1:])
+    # van Herk/Gil-Werman: a window spans the end of a block and the start
+    # of the next one
+    prefix = numpy.minimum.accumulate(padded, axis=1).reshape(
+            (blocks * width,) + values.shape[1:])
+    suffix = numpy.minimum.accumulate(padded[:, ::-1], axis=1)[:, ::-1]\
+        .reshape((blocks * width,) + values.shape[1:])
+    return numpy.minimum(suffix[:rows], prefix[width - 1:width - 1 + rows])
+
+def _completions(demand, multiple, low, high):
+    '''
+    Covered quantities below demand, and the fewest units within low to
+    high that each needs bought to reach demand
+    '''
+    before = numpy.arange(demand)
+    bought = numpy.maximum(low, -(-(demand - before) // multiple) * multiple)
+    enough = bought <= high
+    return before[enough], bought[enough]
+
+def _buy(costs, demand, multiple, low, high, price):
+    '''
+    Cheapest cost of each covered quantity after buying low to high units,
+    by steps of multiple, at price on top of the covered quantities costs.
+    Quantities at or above demand are all counted as demand.
+    '''
+    ret = numpy.full(demand + 1, numpy.inf)
+    steps = -(-(demand + 1) // multiple)
+    width = (high - low) // multiple + 1
+    # Quantities covered before buying, as (quotient, remainder) rows
+    base = numpy.full(steps * multiple, numpy.inf)
+    base[:demand] = costs[:demand] - price * numpy.arange(demand)
+    base = base.reshape(steps, multiple)
+    shift = low // multiple
+    if shift < steps:
+        if width >= steps:
+            # Windows reaching back past no covered quantity
+            best = numpy.minimum.accumulate(base, axis=0)
+        else:
+            best = _window_min(numpy.vstack([numpy.full((width - 1,
+                    multiple), numpy.inf), base]), width)
+        best = best[:steps - shift].ravel()
+        covered = numpy.arange(shift * multiple, shift * multiple + len(best))
+        keep = covered < demand
+        ret[covered[keep]] = best[keep] + price * covered[keep]
+    # Covering the demand, with as few units as the break allows
+    before, bought = _completions(demand, multiple, low, high)
+    if len(before):
+        ret[demand] = numpy.min(costs[before] + price * bought)
+    return ret
+
+def _split(offers, demand):
+    '''
+    Split demand across offers given as (row, moq, multiple, capacity,
+    break quantities, break prices) tuples.
+
+    A dynamic program over the quantity covered so far, up to demand, adds
+    one offer at a time: the cheapest cost of covering each quantity, after
+    buying nothing or a quantity within one of the offer's price breaks.
+    Within a break the cost of a quantity is linear, so the cheapest way of
+    reaching every covered quantity is a sliding window minimum over the
+    quantities covered before, for all of them at once. The split is exact,
+    in O(offers x breaks x demand) time.
+
+    returns: (cost, [(row, quantity, unit price)]) or None if short.
+    '''
+    if sum(offer[3] for offer in offers) < demand:
+        return None
+    demand = max(demand, 0)
+    stages = [numpy.full(demand + 1, numpy.inf)]
+    stages[0][0] = 0.0
+    segments = []
+    for _, moq, multiple, capacity, quantities, prices in offers:
+        multiple = max(multiple, 1)
+        segments.append((multiple, _segments(moq, multiple, capacity,
+                                             quantities, prices)))
+        costs = stages[-1].copy()
+        for low, high, price in segments[-1][1]:
+            numpy.minimum(costs, _buy(stages[-1], demand, multiple, low, high,
+                                      price), out=costs)
+        stages.append(costs)
+    if not numpy.isfinite(stages[-1][demand]):
+        return None
+    # Walk the stages back, finding a purchase that reaches each cost
+    picks = []
+    covered = demand
+    for pos in range(len(offers), 0, -1):
+        cost = stages[pos][covered]
+        slack = 1e-9 * max(1.0, abs(cost))
+        if stages[pos - 1][covered] <= cost + slack:
+            continue
+        multiple, offer_segments = segments[pos - 1]
+        for low, high, price in offer_segments:
+            if covered < demand:
+                bought = numpy.arange(low, min(high, covered) + 1, multiple)
+                before = covered - bought
+            else:
+                before, bought = _completions(demand, multiple, low, high)
+            reached = numpy.nonzero(stages[pos - 1][before] + price * bought
+                                    <= cost + slack)[0]
+            if len(reached):
+                quantity = int(bought[reached[0]])
+                picks.append((offers[pos - 1][0], quantity, price))
+                covered = int(before[reached[0]])
+                break
+    picks.reverse()
+    return sum(price * quantity for _, quantity, price in picks), picks
+
+def allocate_bom(response, quantities, currency='USD', authorized_only=False,
+                 sellers=None, max_lead_days=None, rates=None):
+    '''
+    Split the demand of every BOM line across that line's offers, so as to
+    minimize the cost of the line within each offer's stock, MOQ and order
+    multiple.
+
+    param response: PartsMatchResponse, its JSON, or an OfferTable of it.
+    param quantities: quantity wanted for each line (match result).
+    param rates: optional RateTable, as for cost_bom().
+    returns: list of Allocation, one per line. Lines that cannot be covered
+        buy out every usable offer and report the missing quantity as
+        shortfall.
+    '''
+    _require_numpy()
+    table = _table(response)
+    quantities = numpy.asarray(quantities, dtype=float)
+    nlines = len(quantities)
+    usable = (table.line >= 0) & (table.line < nlines)
+    usable &= table.where(authorized=True if authorized_only else None,
+            sellers=sellers, max_lead_days=max_lead_days)
+    usable &= table.in_stock_quantity > 0
+    table, index = _priced(table, usable, currency, rates)
+    multiple = index.multiple
+    capacity = numpy.floor(table.in_stock_quantity / multiple) * multiple
+    # Break slices of each offer in the sorted index
+    starts = numpy.searchsorted(index.keys,
+            numpy.arange(len(table)) * index.stride)
+    ends = numpy.searchsorted(index.keys,
+            (numpy.arange(len(table)) + 1) * index.stride)
+    break_quantities = index.quantities.tolist()
+    break_prices = index.prices.tolist()
+
+    by_line = [[] for _ in range(nlines)]
+    for row in numpy.argsort(table.line, kind='stable').tolist():
+        start, end = int(starts[row]), int(ends[row])
+        if start == end or capacity[row] < max(index.moq[row], 1):
+            continue
+        by_line[table.line[row]].append((row, int(index.moq[row]),
+            int(multiple[row]), int(capacity[row]),
+            break_quantities[start:end], break_prices[start:end]))
+
+    ret = []
+    for number, offers in enumerate(by_line):
+        demand = int(quantities[number])
+        split = _split(offers, demand)
+        if split is None:
+            split = (0.0, [])
+            for row, moq, _, cap, brk_quantities, brk_prices in offers:
+                unit = _price(brk_quantities, brk_prices, cap)
+                if unit is not None and cap >= moq:
+                    split[1].append((row, cap, unit))
+            split = (sum(unit * quantity for _, quantity, unit in split[1]),
+                    split[1])
+        bought = sum(quantity for _, quantity, _ in split[1])
+        picks = [Pick(table.offers[row], table.seller_uid[row],
+                      table.sku[row], quantity, unit, unit * quantity)
+                 for row, quantity, unit in split[1]]
+        ret.append(Allocation(number, demand, picks, split[0],
+            max(demand - bought, 0)))
+    return ret
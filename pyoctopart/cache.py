@@ -0,0 +1,695 @@
+'''
+Response caching for the Octopart client.
+
+A ResponseCache keeps the raw JSON the API answered with, so that the client
+rebuilds objects from it exactly as from a fresh response. Found resources
+are kept for `ttl` seconds. Misses are kept as negative entries for their
+own, usually shorter, `negative_ttl`: parts_get() uids that 404'd and
+parts_match() queries that matched nothing are then answered locally instead
+of spending API quota on them at every run.
+
+parts_match() caches each query of a request on its own, as the query the API
+echoed and its result, so that a BOM re-run only sends the queries that are
+neither cached nor known to miss.
+
+Fields can get their own ttl through `field_ttls`, such as a few hours for
+the offers of parts, whose prices and stock change often, while their specs or
+datasheets are kept for the whole ttl. The client then re-fetches only the
+stale fields of cached parts, with a narrowed show[] projection, and merges
+them into the cached response.
+
+With a `stale_ttl`, responses past their ttl are still served for that many
+more seconds (stale-while-revalidate): the client answers with the stale
+response at once, and schedules a refresh of it on a Refresher, a bounded pool
+of background threads that runs at most one refresh per key at a time. The
+stale results of a parts_match() call are refreshed as one batch, by one call.
+
+Entries are held by tiers, looked up in order before the client calls the API:
+by default a MemoryStore, an in-process LRU, which can be backed by a DiskStore,
+a SQLite database kept across runs. Responses are written through to every
+tier, and an entry found in a lower tier is promoted to the tiers above it.
+Each endpoint can be given its own tiers. Hits, misses, lookup latency and size
+are kept per tier, and for the network, by stats().
+
+The size of an entry is measured once, as it is cached: the length of its key
+and of its response as compact JSON, which is also what a DiskStore keeps.
+A SizedStore holds at most max_bytes of entries that way, evicting by their
+size and by the cost of fetching them again.
+
+Tiers given a pyoctopart.compression.Codec hold responses compressed, and
+account for them by their compressed size.
+'''
+
+import re
+import json
+import time
+import heapq
+import sqlite3
+import itertools
+import threading
+from collections import OrderedDict
+
+from pyoctopart.compression import Codec
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+
+# Lookup latency is wall time, whatever clock entries expire by
+_timer = getattr(time, 'perf_counter', time.time)
+# Part uids are hexadecimal, such as '721abb1d3046addd'
+UID = re.compile(r'^[0-9a-fA-F]+$')
+
+
+def _dumps(value):
+    return json.dumps(value, separators=(',', ':'))
+
+def _pack(entry, codec):
+    ''' The entry as a tier with codec holds it '''
+    if codec is None:
+        return entry
+    return entry.replace(codec.encode(entry.value))
+
+def _unpack(entry, codec):
+    if codec is None or entry is None:
+        return entry
+    return entry.replace(codec.decode(entry.value))
+
+def _held(key, entry, codec):
+    ''' Bytes a tier with codec holds a packed entry in '''
+    if codec is None:
+        return entry.size
+    return len(key) + len(entry.value)
+
+
+class Entry(object):
+    '''
+    A cached response, or a negative entry remembering a miss: fresh until
+    expires, then stale until stale_until.
+    '''
+    __slots__ = ['value', 'stored', 'expires', 'stale_until', 'negative',
+                 'fields', 'size', 'cost']
+
+    def __init__(self, value, stored, expires, negative=False,
+                 stale_until=None):
+        self.value = value
+        self.stored = stored
+        self.expires = expires
+        self.stale_until = expires if stale_until is None else stale_until
+        self.negative = negative
+        # Time fields refreshed on their own were stored at
+        self.fields = {}
+        # Bytes of the entry, and cost of fetching it again, set once cached
+        self.size = 0
+        self.cost = 1.0
+
+    def field_stored(self, field):
+        return self.fields.get(field, self.stored)
+
+    def replace(self, value):
+        ''' Copy of the entry, holding value '''
+        entry = Entry(value, self.stored, self.expires, self.negative,
+                      self.stale_until)
+        entry.fields = dict(self.fields)
+        entry.size = self.size
+        entry.cost = self.cost
+        return entry
+
+    def __repr__(self):
+        return '%s(%s, expires=%s)' % (self.__class__.__name__,
+                'negative' if self.negative else 'positive', self.expires)
+
+
+class Metrics(object):
+    ''' Hits, misses and seconds spent in the lookups of a tier '''
+    __slots__ = ['hits', 'misses', 'seconds']
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.seconds = 0.0
+
+    def record(self, hit, seconds):
+        if hit:
+            self.hits += 1
+        else:
+            self.misses += 1
+        self.seconds += seconds
+
+    def as_dict(self):
+        lookups = self.hits + self.misses
+        return {'hits': self.hits, 'misses': self.misses,
+                'seconds': self.seconds,
+                'latency': self.seconds / lookups if lookups else 0.0}
+
+
+class MemoryStore(object):
+    '''
+    In-process tier, dropping the least recently used entries once it holds
+    max_entries.
+    '''
+    name = 'memory'
+
+    def __init__(self, max_entries=None, name=None, codec=None):
+        '''
+        param codec: optional Codec compressing the responses held.
+        '''
+        self.max_entries = max_entries
+        if name is not None:
+            self.name = name
+        self.codec = codec
+        self.evictions = 0
+        self.nbytes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def keys(self):
+        with self._lock:
+            return list(self._entries)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                # The most recently used entries are kept last
+                self._entries[key] = entry
+        return _unpack(entry, self.codec)
+
+    def put(self, key, entry):
+        entry = _pack(entry, self.codec)
+        with self._lock:
+            self._pop(key)
+            self._entries[key] = entry
+            self.nbytes += _held(key, entry, self.codec)
+            while self.max_entries is not None and\
+                    len(self._entries) > self.max_entries:
+                key, entry = self._entries.popitem(last=False)
+                self.nbytes -= _held(key, entry, self.codec)
+                self.evictions += 1
+
+    def _pop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.nbytes -= _held(key, entry, self.codec)
+
+    def delete(self, key):
+        with self._lock:
+            self._pop(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+
+    def purge(self, now):
+        ''' Drop the entries past their stale window, returning how many '''
+        with self._lock:
+            expired = [key for key, entry in self._entries.items()
+                    if entry.stale_until <= now]
+            for key in expired:
+                self._pop(key)
+        return len(expired)
+
+    def size(self):
+        return {'entries': len(self), 'bytes': self.nbytes,
+                'evictions': self.evictions}
+
+
+class SizedStore(object):
+    '''
+    In-process tier holding at most max_bytes of entries, evicting them by
+    GreedyDual-Size: an entry is credited its cost per byte when cached and
+    at every hit, on top of an inflation value, and the entry of least credit
+    is evicted first, raising the inflation to its credit. Large responses
+    cheap to fetch again thus go before small or costly ones, and entries
+    left unused age out as the inflation rises past their credit.
+    '''
+    name = 'memory'
+
+    def __init__(self, max_bytes, name=None, codec=None):
+        '''
+        param codec: optional Codec compressing the responses held.
+        '''
+        self.max_bytes = max_bytes
+        if name is not None:
+            self.name = name
+        self.codec = codec
+        self.evictions = 0
+        self.nbytes = 0
+        self._inflation = 0.0
+        # key -> (entry, credit); the heap holds (credit, serial, key), with
+        # outdated credits of keys skipped when popped
+        self._entries = {}
+        self._heap = []
+        self._serial = itertools.count()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def keys(self):
+        with self._lock:
+            return list(self._entries)
+
+    def _credit(self, key, entry):
+        credit = self._inflation + entry.cost / max(
+                _held(key, entry, self.codec), 1)
+        self._entries[key] = (entry, credit)
+        heapq.heappush(self._heap, (credit, next(self._serial), key))
+        if len(self._heap) > 2 * len(self._entries) + 64:
+            self._heap = [(credit, next(self._serial), key)
+                    for key, (_, credit) in self._entries.items()]
+            heapq.heapify(self._heap)
+
+    def get(self, key):
+        with self._lock:
+            found = self._entries.get(key)
+            if found is None:
+                return None
+            self._credit(key, found[0])
+        return _unpack(found[0], self.codec)
+
+    def put(self, key, entry):
+        entry = _pack(entry, self.codec)
+        size = _held(key, entry, self.codec)
+        with self._lock:
+            self._pop(key)
+            if size > self.max_bytes:
+                self.evictions += 1
+                return
+            self.nbytes += size
+            self._credit(key, entry)
+            while self.nbytes > self.max_bytes:
+                credit, _, key = heapq.heappop(self._heap)
+                found = self._entries.get(key)
+                if found is None or found[1] != credit:
+                    continue
+                self._pop(key)
+                self._inflation = credit
+                self.evictions += 1
+
+    def _pop(self, key):
+        found = self._entries.pop(key, None)
+        if found is not None:
+            self.nbytes -= _held(key, found[0], self.codec)
+
+    def delete(self, key):
+        with self._lock:
+            self._pop(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._heap = []
+            self.nbytes = 0
+
+    def purge(self, now):
+        ''' Drop the entries past their stale window, returning how many '''
+        with self._lock:
+            expired = [key for key, (entry, _) in self._entries.items()
+                    if entry.stale_until <= now]
+            for key in expired:
+                self._pop(key)
+        return len(expired)
+
+    def size(self):
+        return {'entries': len(self), 'bytes': self.nbytes,
+                'max_bytes': self.max_bytes, 'evictions': self.evictions}
+
+
+class DiskStore(object):
+    ''' On-disk tier, keeping entries in a SQLite database across runs '''
+    name = 'disk'
+
+    def __init__(self, path, name=None, codec=None):
+        '''
+        param path: path of the database file, created if missing.
+        param codec: optional Codec compressing the responses written, those
+            written uncompressed remaining readable.
+        '''
+        self.path = path
+        if name is not None:
+            self.name = name
+        self.codec = codec
+        # Background refreshes write from other threads, one at a time
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._execute('CREATE TABLE IF NOT EXISTS entries ('
+                'key TEXT PRIMARY KEY, value TEXT, stored REAL, '
+                'expires REAL, stale_until REAL, negative INTEGER, '
+                'fields TEXT, size INTEGER)')
+
+    def _execute(self, sql, *args):
+        ''' Run a statement, returning the number of rows it changed '''
+        with self._lock:
+            with self._db:
+                return self._db.execute(sql, args).rowcount
+
+    def _query(self, sql, *args):
+        with self._lock:
+            return self._db.execute(sql, args).fetchall()
+
+    def __len__(self):
+        return self._query('SELECT COUNT(*) FROM entries')[0][0]
+
+    def keys(self):
+        return [row[0] for row in self._query('SELECT key FROM entries')]
+
+    def get(self, key):
+        rows = self._query('SELECT value, stored, expires, stale_until, '
+                'negative, fields, size FROM entries WHERE key = ?', key)
+        if not rows:
+            return None
+        value, stored, expires, stale_until, negative, fields, size = rows[0]
+        # Responses are stored as JSON text, or compressed as blobs
+        if isinstance(value, type(u'')):
+            value = json.loads(value)
+        else:
+            value = (self.codec or Codec()).decode(bytes(value))
+        entry = Entry(value, stored, expires, bool(negative), stale_until)
+        entry.fields = json.loads(fields)
+        entry.size = size
+        return entry
+
+    def put(self, key, entry):
+        if self.codec is not None:
+            value = sqlite3.Binary(self.codec.encode(entry.value))
+        else:
+            value = _dumps(entry.value)
+        self._execute('INSERT OR REPLACE INTO entries '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?)', key, value, entry.stored,
+                entry.expires, entry.stale_until, int(entry.negative),
+                json.dumps(entry.fields), entry.size)
+
+    def delete(self, key):
+        self._execute('DELETE FROM entries WHERE key = ?', key)
+
+    def clear(self):
+        self._execute('DELETE FROM entries')
+
+    def purge(self, now):
+        ''' Drop the entries past their stale window, returning how many '''
+        return self._execute('DELETE FROM entries WHERE stale_until <= ?',
+                             now)
+
+    def size(self):
+        pages = self._query('PRAGMA page_count')[0][0]
+        page_size = self._query('PRAGMA page_size')[0][0]
+        return {'entries': len(self), 'bytes': pages * page_size}
+
+    def close(self):
+        self._db.close()
+
+
+class ResponseCache(object):
+    ''' Tiered cache of API responses, with negative caching of misses '''
+
+    def __init__(self, ttl=3600, negative_ttl=300, clock=time.time,
+                 stale_ttl=0, refresher=None, field_ttls=None, tiers=None,
+                 endpoints=None, costs=None):
+        '''
+        param ttl: seconds responses are kept for.
+        param negative_ttl: seconds misses are remembered for.
+        param clock: function returning the current time in seconds.
+        param stale_ttl: seconds responses are served stale for, after ttl,
+            while they get refreshed in the background.
+        param refresher: Refresher running background refreshes, a default
+            one being made when stale_ttl is set.
+        param field_ttls: optional seconds each Part field is kept for,
+            within ttl, such as {'offers': 4 * 3600}.
+        param tiers: stores looked up in order, hottest first, a MemoryStore
+            by default.
+        param endpoints: optional names of the tiers each endpoint uses,
+            such as {'parts/{uid}': ['memory']}, endpoints not listed using
+            every tier.
+        param costs: optional cost of fetching an entry of each endpoint
+            again, weighing its eviction from a SizedStore, 1 by default.
+        '''
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.clock = clock
+        self.stale_ttl = stale_ttl
+        if refresher is None and stale_ttl:
+            refresher = Refresher()
+        self.refresher = refresher
+        self.field_ttls = field_ttls or {}
+        self.tiers = tiers or [MemoryStore()]
+        self.endpoints = endpoints or {}
+        self.costs = costs or {}
+        self.metrics = dict((tier.name, Metrics()) for tier in self.tiers)
+        self.metrics['network'] = Metrics()
+
+    @staticmethod
+    def key(method, *args):
+        ''' Cache key of a method called with JSON encodable arguments '''
+        return method + ':' + json.dumps(args, sort_keys=True,
+                separators=(',', ':'))
+
+    @staticmethod
+    def endpoint(key):
+        ''' Endpoint of a key, such as 'parts/match' or 'parts/{uid}' '''
+        method = key.split(':', 1)[0]
+        return '/'.join('{uid}' if UID.match(segment) else segment
+                for segment in method.split('/'))
+
+    def _tiers(self, key):
+        names = self.endpoints.get(self.endpoint(key))
+        if names is None:
+            return self.tiers
+        return [tier for tier in self.tiers if tier.name in names]
+
+    def __len__(self):
+        keys = set()
+        for tier in self.tiers:
+            keys.update(tier.keys())
+        return len(keys)
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def get(self, key):
+        '''
+        The live Entry of key, or None: the first found in the tiers of its
+        endpoint, which is promoted to the tiers above.
+        '''
+        tiers = self._tiers(key)
+        now = self.clock()
+        for pos, tier in enumerate(tiers):
+            start = _timer()
+            entry = tier.get(key)
+            if entry is not None and entry.stale_until <= now:
+                tier.delete(key)
+                entry = None
+            self.metrics[tier.name].record(entry is not None,
+                                           _timer() - start)
+            if entry is not None:
+                if pos:
+                    entry.cost = self.costs.get(self.endpoint(key), 1.0)
+                for upper in tiers[:pos]:
+                    upper.put(key, entry)
+                return entry
+        return None
+
+    def call(self, fun, *args):
+        '''
+        Call the API through fun(*args), counting the call in the network
+        metrics: as a miss when it raises, such as for a 404.
+        '''
+        start = _timer()
+        try:
+            ret = fun(*args)
+        except Exception:
+            self.metrics['network'].record(False, _timer() - start)
+            raise
+        self.metrics['network'].record(True, _timer() - start)
+        return ret
+
+    def stats(self):
+        '''
+        Metrics of each tier by name, and of the network: hits, misses,
+        seconds spent in and mean latency of lookups, and size of tiers.
+        '''
+        ret = {}
+        for tier in self.tiers:
+            ret[tier.name] = self.metrics[tier.name].as_dict()
+            ret[tier.name].update(tier.size())
+        ret['network'] = self.metrics['network'].as_dict()
+        return ret
+
+    def is_stale(self, entry):
+        ''' Whether a live entry is past its ttl, and due for a refresh '''
+        return entry.expires <= self.clock()
+
+    def stale_fields(self, entry, resources):
+        '''
+        Fields of a live entry past their own ttl.
+
+        param resources: the Part resources of the entry, only fields they
+            hold being considered.
+        returns: sorted list of field names.
+        '''
+        now = self.clock()
+        held = set()
+        for resource in resources:
+            held.update(resource)
+        return sorted(field for field, ttl in self.field_ttls.items()
+                if field in held and entry.field_stored(field) + ttl <= now)
+
+    def set_fields(self, key, value, fields):
+        '''
+        Replace the response of key by value, whose fields were just
+        refreshed, keeping the entry's expiry.
+        '''
+        tiers = self._tiers(key)
+        for tier in tiers:
+            entry = tier.get(key)
+            if entry is not None:
+                break
+        else:
+            return
+        # Tiers account for the size entries had when put, so replace it
+        refreshed = entry.replace(value)
+        now = self.clock()
+        for field in fields:
+            refreshed.fields[field] = now
+        self._put(key, refreshed)
+
+    def revalidate(self, key, fetch):
+        '''
+        Schedule a background refresh of key, unless one is pending.
+
+        param fetch: function fetching the response and caching it.
+        returns: whether a refresh was scheduled.
+        '''
+        if self.refresher is None:
+            return False
+        return self.refresher.submit(key, fetch)
+
+    def revalidate_batch(self, keys, fetch):
+        '''
+        Schedule one background refresh of the keys with no refresh pending.
+
+        param fetch: function fetching the responses of a list of keys and
+            caching them, called with those scheduled.
+        returns: list of the keys scheduled.
+        '''
+        if self.refresher is None:
+            return []
+        return self.refresher.submit_batch(keys, fetch)
+
+    def set(self, key, value, ttl=None):
+        ''' Cache a response for ttl seconds, the cache's ttl by default '''
+        now = self.clock()
+        expires = now + (self.ttl if ttl is None else ttl)
+        self._put(key, Entry(value, now, expires,
+                stale_until=expires + self.stale_ttl))
+
+    def set_negative(self, key, value=None, ttl=None):
+        '''
+        Remember a miss for ttl seconds, the cache's negative_ttl by default.
+
+        param value: optional response standing for the miss, such as a
+            PartsMatchResult with no hits.
+        '''
+        now = self.clock()
+        self._put(key, Entry(value, now,
+                now + (self.negative_ttl if ttl is None else ttl), True))
+
+    def _put(self, key, entry):
+        entry.size = len(key) + len(_dumps(entry.value))
+        entry.cost = self.costs.get(self.endpoint(key), 1.0)
+        for tier in self._tiers(key):
+            tier.put(key, entry)
+
+    def delete(self, key):
+        for tier in self.tiers:
+            tier.delete(key)
+
+    def clear(self):
+        for tier in self.tiers:
+            tier.clear()
+
+    def purge(self):
+        ''' Drop expired entries of every tier, and return how many '''
+        now = self.clock()
+        return sum(tier.purge(now) for tier in self.tiers)
+
+
+class Refresher(object):
+    '''
+    Bounded pool of background threads running refreshes, one at a time per
+    key: a refresh submitted while the same key is pending is dropped, as is
+    any refresh submitted while the backlog is full, so that submitting never
+    blocks the caller. A batch refresh covers several keys in one run, such
+    as the queries of one parts_match call.
+    '''
+
+    def __init__(self, workers=4, backlog=256):
+        self.workers = workers
+        self.failures = 0
+        self._queue = queue.Queue(backlog)
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._threads = []
+
+    def submit(self, key, fun):
+        ''' Run fun() in the background, unless key is already pending '''
+        return bool(self._submit([key], lambda keys: fun()))
+
+    def submit_batch(self, keys, fun):
+        '''
+        Run fun(keys) in the background once, with the keys not already
+        pending, in order and without duplicates.
+
+        returns: list of the keys submitted, empty if none was.
+        '''
+        return self._submit(keys, fun)
+
+    def _submit(self, keys, fun):
+        with self._lock:
+            fresh = []
+            for key in keys:
+                if key not in self._pending:
+                    self._pending.add(key)
+                    fresh.append(key)
+            if not fresh:
+                return []
+            while len(self._threads) < self.workers:
+                thread = threading.Thread(target=self._run)
+                thread.daemon = True
+                thread.start()
+                self._threads.append(thread)
+        try:
+            self._queue.put_nowait((fresh, fun))
+        except queue.Full:
+            with self._lock:
+                self._pending.difference_update(fresh)
+            return []
+        return fresh
+
+    def pending(self):
+        ''' Number of refreshes queued or running '''
+        with self._lock:
+            return len(self._pending)
+
+    def join(self):
+        ''' Wait for every submitted refresh to be done '''
+        self._queue.join()
+
+    def _run(self):
+        while True:
+            keys, fun = self._queue.get()
+            try:
+                fun(keys)
+            except Exception: # pylint: disable=broad-except
+                # The stale response keeps being served until one succeeds
+                self.failures += 1
+            finally:
+                with self._lock:
+                    self._pending.difference_update(keys)
+                self._queue.task_done()
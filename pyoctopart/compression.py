@@ -0,0 +1,142 @@
+'''
+Compression of cached responses.
+
+A Codec encodes responses as compact JSON compressed with zlib, or with zstd
+when the zstandard package is installed (`pip install pyoctopart[zstd]`), at
+a configurable level. Given to the tiers of a ResponseCache, such as
+DiskStore(path, codec=Codec()), it compresses the responses they hold, and
+decompresses them as they are read.
+
+A cached response is a single part or parts_match result: too short for the
+compressor to learn the keys, class names and seller blocks every response
+repeats. A dictionary trained on typical responses gives them to it upfront.
+train_dictionary() trains one with zstd's trainer or, for zlib, from the JSON
+fragments found in most samples. Data written with a dictionary can only be
+read by a Codec given the same dictionary.
+'''
+
+import re
+import json
+import zlib
+import threading
+from collections import Counter
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+from pyoctopart.exceptions import ArgumentInvalidError
+
+
+METHODS = ('zlib', 'zstd')
+LEVELS = {'zlib': 6, 'zstd': 3}
+# Leading byte of the data of each method
+HEADERS = {'zlib': b'Z', 'zstd': b'S'}
+
+# A JSON fragment, up to the separator ending it
+FRAGMENT = re.compile(br'[^,{\[]*[,{\[]')
+
+
+def _require_zstandard():
+    if zstandard is None:
+        raise ImportError('zstandard is required for zstd compression, '
+                'install pyoctopart[zstd]')
+
+def _dumps(value):
+    return json.dumps(value, separators=(',', ':')).encode('utf-8')
+
+def _method(method):
+    if method not in METHODS:
+        raise ArgumentInvalidError(['method'], [str], list(METHODS))
+    if method == 'zstd':
+        _require_zstandard()
+
+
+def train_dictionary(samples, size=16384, method='zlib'):
+    '''
+    Dictionary for compressing responses like samples.
+
+    param samples: JSON responses, such as cached parts_match results.
+    param size: maximum size of the dictionary in bytes.
+    param method: 'zlib' or 'zstd', the method it is trained for.
+    returns: the dictionary, as bytes.
+    '''
+    _method(method)
+    encoded = [_dumps(sample) for sample in samples]
+    if method == 'zstd':
+        return zstandard.train_dictionary(size, encoded).as_bytes()
+    # Fragments scored by the bytes they would spare over the samples
+    counts = Counter()
+    for data in encoded:
+        counts.update(set(FRAGMENT.findall(data)))
+    least = 2 if len(encoded) > 1 else 1
+    scored = sorted(((count * len(fragment), fragment)
+            for fragment, count in counts.items()
+            if count >= least and len(fragment) > 3), reverse=True)
+    chosen, total = [], 0
+    for _, fragment in scored:
+        if total + len(fragment) > size:
+            continue
+        chosen.append(fragment)
+        total += len(fragment)
+    # zlib reaches the end of its dictionary at the least cost
+    return b''.join(reversed(chosen))
+
+
+class Codec(object):
+    ''' Compresses JSON values with zlib or zstd, optionally a dictionary '''
+
+    def __init__(self, method='zlib', level=None, dictionary=None):
+        '''
+        param method: 'zlib', or 'zstd' which requires zstandard.
+        param level: compression level, 6 for zlib and 3 for zstd by default.
+        param dictionary: optional dictionary from train_dictionary().
+        '''
+        _method(method)
+        self.method = method
+        self.level = LEVELS[method] if level is None else level
+        self.dictionary = dictionary
+        if method == 'zstd':
+            data = None
+            if dictionary is not None:
+                data = zstandard.ZstdCompressionDict(dictionary)
+            self._compressor = zstandard.ZstdCompressor(level=self.level,
+                                                        dict_data=data)
+            self._decompressor = zstandard.ZstdDecompressor(dict_data=data)
+            # zstandard contexts are not to be shared between threads
+            self._lock = threading.Lock()
+
+    def __repr__(self):
+        return '%s(%r, level=%d%s)' % (self.__class__.__name__, self.method,
+                self.level, ', dictionary' if self.dictionary else '')
+
+    def encode(self, value):
+        ''' Compressed bytes of a JSON value '''
+        data = _dumps(value)
+        if self.method == 'zstd':
+            with self._lock:
+                return HEADERS['zstd'] + self._compressor.compress(data)
+        if self.dictionary is not None:
+            compressor = zlib.compressobj(self.level, zlib.DEFLATED,
+                    zlib.MAX_WBITS, 9, zlib.Z_DEFAULT_STRATEGY,
+                    self.dictionary)
+        else:
+            compressor = zlib.compressobj(self.level)
+        return HEADERS['zlib'] + compressor.compress(data) + compressor.flush()
+
+    def decode(self, data):
+        ''' The JSON value of bytes from encode() '''
+        header, data = data[:1], data[1:]
+        if header != HEADERS[self.method]:
+            raise ValueError('not data of a %s Codec' % self.method)
+        if self.method == 'zstd':
+            with self._lock:
+                data = self._decompressor.decompress(data)
+        else:
+            if self.dictionary is not None:
+                decompressor = zlib.decompressobj(zdict=self.dictionary)
+            else:
+                decompressor = zlib.decompressobj()
+            data = decompressor.decompress(data) + decompressor.flush()
+        return json.loads(data.decode('utf-8'))
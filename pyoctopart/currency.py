@@ -0,0 +1,130 @@
+'''
+Currency normalization of offer prices.
+
+A RateTable holds exchange rates against a base currency, loaded from a local
+JSON file of the form:
+
+    {"base": "USD", "rates": {"EUR": 0.92, "GBP": 0.79, "JPY": 151.3}}
+
+where each rate is the amount of that currency one unit of base buys. Offers
+priced in the target currency keep their own breaks; others are converted
+from a single currency of theirs (the base currency when they have it), so
+that every offer keeps one consistent set of breaks.
+
+Conversions are cached: per PartOffer for offer_prices(), and per OfferTable
+for table_prices(), so repeated costing runs over the same offers only pay for
+the conversion once. Converting table breaks requires numpy.
+'''
+
+import json
+from weakref import WeakKeyDictionary
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from pyoctopart.table import _require_numpy
+from pyoctopart.pricing import PriceIndex
+from .exceptions import ArgumentInvalidError
+
+
+class RateTable(object):
+    ''' Exchange rates of currencies against a base currency '''
+
+    def __init__(self, rates, base='USD'):
+        self.base = base
+        self.rates = dict((currency, float(rate))
+                for currency, rate in rates.items())
+        self.rates[base] = 1.0
+        self._offers = WeakKeyDictionary()
+        self._tables = WeakKeyDictionary()
+
+    @classmethod
+    def load(cls, path):
+        ''' Load a rate table from a JSON file, see module documentation '''
+        with open(path) as rate_file:
+            table = json.load(rate_file)
+        return cls(table['rates'], table.get('base', 'USD'))
+
+    def __contains__(self, currency):
+        return currency in self.rates
+
+    def rate(self, source, target):
+        ''' Amount of target currency one unit of source currency buys '''
+        for currency in (source, target):
+            if currency not in self.rates:
+                raise ArgumentInvalidError(['currency'], [str],
+                        sorted(self.rates))
+        return self.rates[target] / self.rates[source]
+
+    def convert(self, amount, source, target):
+        ''' Convert an amount of source currency to target currency '''
+        return amount * self.rate(source, target)
+
+    def _source(self, currencies, target):
+        ''' Currency an offer priced in `currencies` gets converted from '''
+        for currency in (target, self.base):
+            if currency in currencies:
+                return currency
+        known = sorted(currency for currency in currencies
+                if currency in self.rates)
+        return known[0] if known else None
+
+    def offer_prices(self, offer, target='USD'):
+        '''
+        Price breaks of a PartOffer in target currency.
+
+        returns: sorted list of (quantity, unit price) pairs, empty when the
+            offer has no price in a currency of the table.
+        '''
+        cache = self._offers.setdefault(offer, {})
+        if target not in cache:
+            prices = offer.prices or {}
+            source = self._source(prices, target)
+            if source is None:
+                cache[target] = []
+            else:
+                rate = self.rate(source, target)
+                cache[target] = sorted((int(quantity), float(price) * rate)
+                        for quantity, price in prices[source])
+        return cache[target]
+
+    def table_prices(self, table, target='USD'):
+        '''
+        Break prices of an OfferTable in target currency, for all breaks at
+        once; the breaks each offer is not priced from are NaN.
+
+        returns: array aligned with table.break_price, to pass as the prices
+            of a PriceIndex.
+        '''
+        _require_numpy()
+        cache = self._tables.setdefault(table, {})
+        if target in cache:
+            return cache[target]
+        currencies, inverse = numpy.unique(table.break_currency,
+                return_inverse=True)
+        currencies = currencies.tolist()
+        # Rank currencies by preference, unknown ones last, and keep the
+        # breaks in the best ranked currency of each offer
+        preference = [target, self.base] + currencies
+        unknown = len(preference)
+        rank = numpy.array([preference.index(currency)
+                if currency in self.rates else unknown
+                for currency in currencies], dtype=numpy.int64)[inverse]
+        best = numpy.full(len(table), unknown, dtype=numpy.int64)
+        numpy.minimum.at(best, table.break_offer, rank)
+        keep = (rank == best[table.break_offer]) & (rank < unknown)
+        factors = numpy.array([self.rates[target] / self.rates[currency]
+                if currency in self.rates else numpy.nan
+                for currency in currencies])
+        ret = numpy.where(keep, table.break_price * factors[inverse],
+                numpy.nan)
+        cache[target] = ret
+        return ret
+
+    def price_index(self, table, target='USD'):
+        ''' PriceIndex of an OfferTable with all breaks in target currency '''
+        if target not in self.rates:
+            raise ArgumentInvalidError(['currency'], [str], sorted(self.rates))
+        return PriceIndex(table, target, self.table_prices(table, target))
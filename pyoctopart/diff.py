@@ -0,0 +1,167 @@
+'''
+Structural diffs between two snapshots of Parts or PartsMatchResponses.
+
+Offers are paired by (seller uid, sku), specs by their spec key, parts by
+uid and match results by reference (or position when unreferenced). Each
+pairing is a dictionary lookup, so a diff is linear in the number of offers,
+and any subtree whose fingerprint did not change is skipped altogether.
+'''
+
+from collections import namedtuple, OrderedDict
+from pyoctopart.util import dict_to_class
+from pyoctopart.objects import Part, PartOffer, SpecValue
+from pyoctopart.responses import PartsMatchResponse
+
+
+# Change types: `path` locates the changed resource within the snapshot, as a
+# tuple of result reference, part uid and offer or spec key as relevant.
+PartAdded = namedtuple('PartAdded', 'path part')
+PartRemoved = namedtuple('PartRemoved', 'path part')
+OfferAdded = namedtuple('OfferAdded', 'path offer')
+OfferRemoved = namedtuple('OfferRemoved', 'path offer')
+PriceChanged = namedtuple('PriceChanged', 'path currency old new')
+StockChanged = namedtuple('StockChanged', 'path old new delta')
+SpecChanged = namedtuple('SpecChanged', 'path key old new')
+FieldChanged = namedtuple('FieldChanged', 'path field old new')
+
+PART_FIELDS = ('mpn', 'manufacturer', 'brand', 'external_links',
+        'broker_listings', 'short_description', 'descriptions', 'imagesets',
+        'datasheets', 'compliance_documents', 'reference_designs',
+        'cad_models', 'category_uids')
+
+OFFER_FIELDS = ('eligible_region', 'product_url', 'octopart_rfq_url',
+        'on_order_quantity', 'on_order_eta', 'factory_lead_days',
+        'factory_order_multiple', 'order_multiple', 'moq', 'packaging',
+        'is_authorized', 'last_updated')
+
+
+def offer_key(offer):
+    ''' Identity of an offer across snapshots '''
+    seller = offer.seller.uid if offer.seller is not None else None
+    return (seller, offer.sku)
+
+def spec_key(spec):
+    ''' Identity of a spec value across snapshots '''
+    metadata = spec.metadata
+    if isinstance(metadata, dict):
+        return metadata.get('key')
+    return getattr(metadata, 'key', None)
+
+def _keyed(items, key):
+    ''' Index items by key, numbering the repeats of a duplicate key '''
+    ret = OrderedDict()
+    for item in items:
+        ident = key(item)
+        if ident in ret:
+            count = 1
+            while (ident, count) in ret:
+                count += 1
+            ident = (ident, count)
+        ret[ident] = item
+    return ret
+
+def _pair(old, new):
+    ''' Yield (key, old, new) over the union of two keyed indexes '''
+    for ident, item in old.items():
+        yield ident, item, new.get(ident)
+    for ident, item in new.items():
+        if ident not in old:
+            yield ident, None, item
+
+def diff_offers(old, new, path=()):
+    ''' List the changes between two snapshots of a PartOffer '''
+    if old.fingerprint() == new.fingerprint():
+        return []
+    ret = []
+    old_prices = old.prices or {}
+    new_prices = new.prices or {}
+    for currency in sorted(set(old_prices) | set(new_prices)):
+        if old_prices.get(currency) != new_prices.get(currency):
+            ret.append(PriceChanged(path, currency, old_prices.get(currency),
+                new_prices.get(currency)))
+    if old.in_stock_quantity != new.in_stock_quantity:
+        delta = None
+        if old.in_stock_quantity is not None and\
+                new.in_stock_quantity is not None:
+            delta = new.in_stock_quantity - old.in_stock_quantity
+        ret.append(StockChanged(path, old.in_stock_quantity,
+            new.in_stock_quantity, delta))
+    for field in OFFER_FIELDS:
+        if getattr(old, field) != getattr(new, field):
+            ret.append(FieldChanged(path, field, getattr(old, field),
+                getattr(new, field)))
+    return ret
+
+def diff_parts(old, new, path=()):
+    ''' List the changes between two snapshots of a Part '''
+    old = dict_to_class(old, Part)
+    new = dict_to_class(new, Part)
+    if old.fingerprint() == new.fingerprint():
+        return []
+    path = path + (new.uid,)
+    ret = []
+    if old.uid != new.uid:
+        ret.append(FieldChanged(path, 'uid', old.uid, new.uid))
+    for field in PART_FIELDS:
+        if getattr(old, field) != getattr(new, field):
+            ret.append(FieldChanged(path, field, getattr(old, field),
+                getattr(new, field)))
+    for ident, old_offer, new_offer in _pair(_keyed(old.offers, offer_key),
+                                             _keyed(new.offers, offer_key)):
+        if old_offer is None:
+            ret.append(OfferAdded(path + (ident,), new_offer))
+        elif new_offer is None:
+            ret.append(OfferRemoved(path + (ident,), old_offer))
+        else:
+            ret += diff_offers(old_offer, new_offer, path + (ident,))
+    # Specs come keyed by spec key already
+    for ident, old_spec, new_spec in _pair(old.specs, new.specs):
+        if old_spec is None or new_spec is None or\
+                old_spec.fingerprint() != new_spec.fingerprint():
+            ret.append(SpecChanged(path + (ident,), ident, old_spec, new_spec))
+    return ret
+
+def _result_key(result, index):
+    if result.reference is not None:
+        return result.reference
+    return index
+
+def diff_responses(old, new):
+    ''' List the changes between two snapshots of a PartsMatchResponse '''
+    old = dict_to_class(old, PartsMatchResponse)
+    new = dict_to_class(new, PartsMatchResponse)
+    old_results = OrderedDict((_result_key(result, index), result)
+            for index, result in enumerate(old.results))
+    new_results = OrderedDict((_result_key(result, index), result)
+            for index, result in enumerate(new.results))
+    ret = []
+    for ident, old_result, new_result in _pair(old_results, new_results):
+        old_items = _keyed(old_result.items if old_result else [],
+                           lambda part: part.uid)
+        new_items = _keyed(new_result.items if new_result else [],
+                           lambda part: part.uid)
+        for uid, old_part, new_part in _pair(old_items, new_items):
+            if old_part is None:
+                ret.append(PartAdded((ident, uid), new_part))
+            elif new_part is None:
+                ret.append(PartRemoved((ident, uid), old_part))
+            else:
+                ret += diff_parts(old_part, new_part, (ident,))
+    return ret
+
+def diff(old, new):
+    ''' List the changes between two snapshots of a Part, PartOffer or
+    PartsMatchResponse, given as objects or JSON resources '''
+    if isinstance(old, dict):
+        old = dict_to_class(old)
+    if isinstance(new, dict):
+        new = dict_to_class(new)
+    if isinstance(old, PartsMatchResponse):
+        return diff_responses(old, new)
+    if isinstance(old, PartOffer):
+        return diff_offers(old, new, (offer_key(new),))
+    if isinstance(old, SpecValue):
+        if old.fingerprint() == new.fingerprint():
+            return []
+        return [SpecChanged((), spec_key(new), old, new)]
+    return diff_parts(old, new)
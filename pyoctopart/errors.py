@@ -29,6 +29,8 @@ class ClientErrorResponse(object):
     '''
     https://octopart.com/api/docs/v3/rest-api#error-schemas-clienterrorresponse
     '''
+    fingerprint_fields = ('message',)
+
     def __init__(self, message):
         self.message = message
 
@@ -76,6 +78,8 @@ class ServerErrorResponse(object):
     '''
     https://octopart.com/api/docs/v3/rest-api#error-schemas-servererrorresponse
     '''
+    fingerprint_fields = ('message',)
+
     def __init__(self, message):
         self.message = message
 
@@ -0,0 +1,118 @@
+'''
+Content fingerprints, for cheap change detection between two snapshots of
+the same resource.
+
+A fingerprint is a SHA-1 hex digest over a canonical encoding of a resource,
+and is the same whether computed from the raw JSON dictionary or from the
+API object built out of it. Absent, null and empty values digest alike, and
+lists of specs digest as the mapping by spec key objects hold them in.
+
+API classes declare the fields that participate by default with a
+`fingerprint_fields` attribute, the attributes of their objects, so that keys
+of the JSON that the class does not map are left out on both sides. Resources
+of other classes digest all their fields.
+Callers may restrict the digest to some fields using dotted names, so that
+`('offers.prices', 'offers.in_stock_quantity')` on a Part only looks at the
+prices and stock of its offers, and `('specs.value',)` at the values of its
+specs, whether given as a list or keyed by spec key.
+'''
+
+import hashlib
+import json
+from pyoctopart.util import APIOBJECTS
+
+
+DATATYPES = {str: 'string', int: 'integer', float: 'decimal'}
+
+
+def field_tree(fields):
+    ''' Turn a list of dotted field names into a nested selection dict '''
+    if fields is None:
+        return None
+    tree = {}
+    for name in fields:
+        node = tree
+        path = name.split('.')
+        for step in path[:-1]:
+            if step in node and node[step] is None:
+                break
+            node = node.setdefault(step, {})
+        else:
+            node[path[-1]] = None
+    return tree
+
+def _tag(value):
+    ''' Name of the API class of a JSON resource or object, if any '''
+    if isinstance(value, dict):
+        return value.get('__class__')
+    name = value.__class__.__name__
+    if APIOBJECTS.get(name) is value.__class__:
+        return name
+    return None
+
+def _fields(value, tag):
+    ''' Default fields that participate in the digest of a resource '''
+    cls = APIOBJECTS.get(tag)
+    fields = getattr(cls, 'fingerprint_fields', None)
+    if fields is not None:
+        return dict.fromkeys(fields)
+    if isinstance(value, dict):
+        keys = value.keys()
+    else:
+        keys = vars(value).keys()
+    return dict.fromkeys(key for key in keys if not key.startswith('_'))
+
+def _spec_key(spec):
+    ''' Spec key of a SpecValue resource or object '''
+    return _get(_get(spec, 'metadata'), 'key')
+
+def _get(value, name):
+    if isinstance(value, dict):
+        return value.get(name)
+    return getattr(value, name, None)
+
+def content(value, tree=None):
+    ''' Canonical, JSON encodable form of a resource for digesting '''
+    tag = _tag(value)
+    if tag is not None:
+        if tree is None:
+            tree = _fields(value, tag)
+        ret = [tag]
+        for name in sorted(tree):
+            ret.append([name, content(_get(value, name), tree[name])])
+        return ret
+    if isinstance(value, (list, tuple)):
+        if value and _tag(value[0]) == 'SpecValue':
+            # Objects hold specs keyed by their spec key
+            return content(dict((_spec_key(spec), spec) for spec in value),
+                           tree)
+        return [content(val, tree) for val in value] or None
+    if isinstance(value, dict):
+        # Mappings of resources, such as specs by key, select like lists
+        return dict((key, content(val, tree))
+                    for key, val in value.items()) or None
+    if isinstance(value, type):
+        return DATATYPES.get(value, value.__name__)
+    if value == '':
+        return None
+    return value
+
+def fingerprint(resource, fields=None):
+    '''
+    Stable content digest of an API object or JSON resource
+
+    param resource: API object, or JSON resource dictionary.
+    param fields: optional list of dotted field names taking part in the
+        digest, defaults to the class's fingerprint_fields.
+    returns: hexadecimal digest string.
+    '''
+    if fields is None and not isinstance(resource, dict):
+        cached = resource.__dict__.get('_fingerprint')
+        if cached is not None:
+            return cached
+    encoded = json.dumps(content(resource, field_tree(fields)),
+            sort_keys=True, separators=(',', ':'))
+    digest = hashlib.sha1(encoded.encode('utf-8')).hexdigest()
+    if fields is None and not isinstance(resource, dict):
+        resource.__dict__['_fingerprint'] = digest
+    return digest
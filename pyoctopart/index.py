@@ -0,0 +1,142 @@
+'''
+Inverted indexes over a collection of parts.
+
+A PartIndex maps seller uids to their offers, and manufacturer uids, brand
+uids and category uids to their parts, so that "all offers from seller X" or
+"all parts by manufacturer Y" are dictionary lookups rather than scans of
+every Part.offers. The indexes are maintained incrementally: adding a part
+whose uid is already indexed refreshes it, touching only the index entries
+whose keys it gained or lost, in time proportional to the size of that part.
+
+Parts can be Part objects or Part resource dictionaries.
+'''
+
+from pyoctopart.fingerprint import _get
+
+
+def _uid(resource):
+    return _get(resource, 'uid') if resource is not None else None
+
+
+class PartIndex(object):
+    ''' Parts by uid, with inverted indexes by seller, manufacturer, brand
+    and category '''
+
+    def __init__(self, parts=None):
+        self.parts = {}
+        # seller uid -> {part uid -> [offers]}
+        self.sellers = {}
+        # manufacturer, brand and category uid -> set of part uids
+        self.manufacturers = {}
+        self.brands = {}
+        self.categories = {}
+        # part uid -> the keys it is indexed under, to update on refresh
+        self._keys = {}
+        for part in parts or []:
+            self.add(part)
+
+    def __len__(self):
+        return len(self.parts)
+
+    def __contains__(self, uid):
+        return uid in self.parts
+
+    def __iter__(self):
+        return iter(self.parts.values())
+
+    def get(self, uid, default=None):
+        return self.parts.get(uid, default)
+
+    @staticmethod
+    def _part_keys(part):
+        offers = {}
+        for offer in _get(part, 'offers') or []:
+            offers.setdefault(_uid(_get(offer, 'seller')), []).append(offer)
+        manufacturer = _uid(_get(part, 'manufacturer'))
+        brand = _uid(_get(part, 'brand'))
+        return {
+            'sellers': offers,
+            'manufacturers': set([manufacturer]) - set([None]),
+            'brands': set([brand]) - set([None]),
+            'categories': set(_get(part, 'category_uids') or []),
+        }
+
+    def add(self, part):
+        '''
+        Index a part, or refresh it when its uid is already indexed.
+
+        returns: the part previously indexed under that uid, if any.
+        '''
+        uid = _uid(part)
+        old = self._keys.get(uid)
+        new = self._part_keys(part)
+        previous = self.parts.get(uid)
+        self.parts[uid] = part
+        self._keys[uid] = new
+        old_sellers = old['sellers'] if old else {}
+        for seller in old_sellers:
+            if seller not in new['sellers']:
+                self._discard(self.sellers, seller, uid)
+        for seller, offers in new['sellers'].items():
+            self.sellers.setdefault(seller, {})[uid] = offers
+        for name in ('manufacturers', 'brands', 'categories'):
+            index = getattr(self, name)
+            old_keys = old[name] if old else set()
+            for key in old_keys - new[name]:
+                self._discard(index, key, uid)
+            for key in new[name] - old_keys:
+                index.setdefault(key, set()).add(uid)
+        return previous
+
+    refresh = add
+
+    def update(self, parts):
+        ''' Add or refresh many parts '''
+        for part in parts:
+            self.add(part)
+
+    def remove(self, uid):
+        ''' Remove the part of uid from all indexes, and return it '''
+        part = self.parts.pop(uid)
+        keys = self._keys.pop(uid)
+        for seller in keys['sellers']:
+            self._discard(self.sellers, seller, uid)
+        for name in ('manufacturers', 'brands', 'categories'):
+            for key in keys[name]:
+                self._discard(getattr(self, name), key, uid)
+        return part
+
+    @staticmethod
+    def _discard(index, key, uid):
+        entries = index[key]
+        if isinstance(entries, dict):
+            del entries[uid]
+        else:
+            entries.discard(uid)
+        if not entries:
+            del index[key]
+
+    def offers_by_seller(self, uid):
+        ''' List the (part, offer) pairs of a seller, by Seller uid '''
+        return [(self.parts[part_uid], offer)
+                for part_uid, offers in self.sellers.get(uid, {}).items()
+                for offer in offers]
+
+    def _parts(self, index, uid):
+        return [self.parts[part_uid] for part_uid in index.get(uid, ())]
+
+    def parts_by_seller(self, uid):
+        ''' List the parts a seller offers, by Seller uid '''
+        return self._parts(self.sellers, uid)
+
+    def parts_by_manufacturer(self, uid):
+        ''' List the parts of a manufacturer, by Manufacturer uid '''
+        return self._parts(self.manufacturers, uid)
+
+    def parts_by_brand(self, uid):
+        ''' List the parts of a brand, by Brand uid '''
+        return self._parts(self.brands, uid)
+
+    def parts_by_category(self, uid):
+        ''' List the parts of a category, by category uid '''
+        return self._parts(self.categories, uid)
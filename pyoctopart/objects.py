@@ -25,6 +25,8 @@ import copy
 import inspect
 from pyoctopart.util import Curry, select
 from pyoctopart.util import dict_to_class,list_to_class, api_object
+from pyoctopart.util import freeze, cached_hash
+from pyoctopart.fingerprint import fingerprint
 from .exceptions import TypeArgumentError
 
 
@@ -33,11 +35,31 @@ select_shows = Curry(select, 'show_')
 select_hides = Curry(select, 'hide_')
 
 
+def specs_to_class(specs):
+    '''
+    Instantiate the specs of a part as SpecValues, keyed by spec key as the
+    API returns them. Lists of specs are keyed by their metadata key.
+    '''
+    if isinstance(specs, dict):
+        return dict((key, dict_to_class(spec, SpecValue))
+                    for key, spec in specs.items())
+    ret = {}
+    for spec in list_to_class(specs, SpecValue):
+        metadata = spec.metadata
+        if isinstance(metadata, dict):
+            ret[metadata.get('key')] = spec
+        else:
+            ret[getattr(metadata, 'key', None)] = spec
+    return ret
+
+
 # Octopart Data maps
 
 @api_object
 class Asset(object):
     ''' https://octopart.com/api/docs/v3/rest-api#object-schemas-asset '''
+    fingerprint_fields = ('url', 'mimetype', 'metadata')
+
     def __init__(self, url, mimetype, **kwargs):
         args = copy.deepcopy(kwargs)
         self.url = url
@@ -89,7 +111,8 @@ class Asset(object):
         return not self.__eq__(other)
 
     def __hash__(self):
-        return hash((self.__class__, self.url, self.mimetype, self.metadata))
+        return hash((self.__class__, self.url, self.mimetype,
+            freeze(self.metadata)))
 
     def __str__(self):
         return '%s mimetype %s @ %s' % (self.__class__.__name__,
@@ -98,6 +121,8 @@ class Asset(object):
 @api_object
 class Attribution(object):
     ''' https://octopart.com/api/docs/v3/rest-api#object-schemas-attribution '''
+    fingerprint_fields = ('sources', 'first_acquired')
+
     def __init__(self, sources, first_acquired):
         self.sources = sources
         self.first_acquired = first_acquired
@@ -108,7 +133,8 @@ class Attribution(object):
         if new_dict['__class__'] != cls.__name__:
             raise TypeArgumentError('Dict is for class %s, not %s' % (
                 new_dict['__class__'], cls.__name__))
-        new = cls(new_dict['sources'], new_dict['acquired'])
+        new = cls(new_dict.get('sources', []),
+                new_dict.get('first_acquired', new_dict.get('acquired')))
         return new
 
     def equals_json(self, resource):
@@ -140,7 +166,7 @@ class Attribution(object):
         return not self.__eq__(other)
 
     def __hash__(self):
-        return hash((self.__class__, self.sources, self.first_acquired))
+        return hash((self.__class__, freeze(self.sources), self.first_acquired))
 
     def __str__(self):
         return '%s with %d sources @ %s' % (self.__class__.__name__,
@@ -149,6 +175,8 @@ class Attribution(object):
 @api_object
 class Brand(object):
     ''' https://octopart.com/api/docs/v3/rest-api#object-schemas-brand '''
+    fingerprint_fields = ('uid', 'name', 'homepage_url')
+
     def __init__(self, uid, name, homepage):
         self.uid = uid
         self.name = name
@@ -203,10 +231,13 @@ class Brand(object):
         return '%s %s (%s) @ %s' % (self.__class__.__name__,
                 self.name, self.uid, self.homepage_url)
 
+@api_object
 class BrokerListing(object):
     '''
     https://octopart.com/api/docs/v3/rest-api#object-schemas-brokerlisting
     '''
+    fingerprint_fields = ('seller', 'listing_url', 'octopart_rfq_url')
+
     def __init__(self, seller, listing_url, octopart_rfq_url):
         self.seller = dict_to_class(seller, Seller)
         self.listing_url = listing_url
@@ -265,6 +296,8 @@ class BrokerListing(object):
 @api_object
 class CADModel(Asset):
     ''' https://octopart.com/api/docs/v3/rest-api#object-schemas-cadmodel '''
+    fingerprint_fields = ('url', 'mimetype', 'metadata', 'attribution')
+
     def __init__(self, url, mimetype, **kwargs):
         super(self.__class__, self).__init__(url, mimetype, **kwargs)
         args = copy.deepcopy(kwargs)
@@ -323,6 +356,8 @@ class CADModel(Asset):
 @api_object
 class Category(object):
     ''' https://octopart.com/api/docs/v3/rest-api#object-schemas-category '''
+    fingerprint_fields = ('uid', 'name', 'parent_uid', 'children_uids',
+            'ancestor_uids', 'ancestor_names', 'num_parts', 'imagesets')
 
     def __init__(self, uid, name, parent_uid, children_uids, ancestor_uids,
                  ancestor_names, num_parts, **kwargs):
@@ -413,9 +448,11 @@ class Category(object):
         return not self.__eq__(other)
 
     def __hash__(self):
+        # Lists are compared sorted by __eq__, so hash them order-free
         return hash((self.__class__, self.uid, self.name, self.parent_uid,
-            self.children_uids, self.ancestor_uids, self.ancestor_names,
-            self.num_parts, self.imagesets))
+            frozenset(self.children_uids), frozenset(self.ancestor_uids),
+            frozenset(self.ancestor_names), self.num_parts,
+            frozenset(freeze(self.imagesets))))
 
     def __str__(self):
         return '%s %s (%s) containing %d parts, %d children' % (
@@ -427,6 +464,9 @@ class ComplianceDocument(Asset):
     '''
     https://octopart.com/api/docs/v3/rest-api#object-schemas-compliancedocument
     '''
+    fingerprint_fields = ('url', 'mimetype', 'metadata', 'attribution',
+            'subtypes')
+
     def __init__(self, url, mimetype, **kwargs):
         super(self.__class__, self).__init__(url, mimetype, **kwargs)
         args = copy.deepcopy(kwargs)
@@ -485,7 +525,7 @@ class ComplianceDocument(Asset):
 
     def __hash__(self):
         return hash((self.__class__, self.url, self.mimetype, self.attribution,
-            self.subtypes))
+            freeze(self.subtypes)))
 
     def __str__(self):
         return super(self.__class__, self).__str__()
@@ -493,6 +533,8 @@ class ComplianceDocument(Asset):
 @api_object
 class Datasheet(Asset):
     ''' https://octopart.com/api/docs/v3/rest-api#object-schemas-datasheet '''
+    fingerprint_fields = ('url', 'mimetype', 'metadata', 'attribution')
+
     def __init__(self, url, mimetype, **kwargs):
         super(self.__class__, self).__init__(url, mimetype, **kwargs)
         args = copy.deepcopy(kwargs)
@@ -551,6 +593,8 @@ class Datasheet(Asset):
 @api_object
 class Description(object):
     ''' https://octopart.com/api/docs/v3/rest-api#object-schemas-description'''
+    fingerprint_fields = ('value', 'attribution')
+
     def __init__(self, value, attribution):
         self.value = value
         self.attribution = dict_to_class(attribution, Attribution)
@@ -604,6 +648,8 @@ class ExternaLinks(object):
     '''
     https://octopart.com/api/docs/v3/rest-api#object-schemas-externallinks
     '''
+    fingerprint_fields = ('product_url', 'freesample_url', 'evalkit_url')
+
     def __init__(self, product_url, freesample_url, evalkit_url):
         self.product_url = product_url
         self.freesample_url = freesample_url
@@ -662,6 +708,9 @@ class ExternaLinks(object):
 @api_object
 class ImageSet(object):
     ''' https://octopart.com/api/docs/v3/rest-api#object-schemas-imageset '''
+    fingerprint_fields = ('swatch_image', 'small_image', 'medium_image',
+            'large_image', 'attribution', 'credit_string', 'credit_url')
+
     def __init__(self, swatch_image, small_image, medium_image, large_image,
                  attribution, credit_string, credit_url):
         self.swatch_image = dict_to_class(swatch_image, Asset)
@@ -744,6 +793,8 @@ class Manufacturer(object):
     '''
     https://octopart.com/api/docs/v3/rest-api#object-schemas-manufacturer
     '''
+    fingerprint_fields = ('uid', 'name', 'homepage_url')
+
     def __init__(self, uid, name, homepage_url):
         self.uid = uid
         self.name = name
@@ -801,6 +852,18 @@ class Manufacturer(object):
 @api_object
 class Part(object):
     ''' https://octopart.com/api/docs/v3/rest-api#object-schemas-part '''
+    fingerprint_fields = ('uid', 'mpn', 'manufacturer', 'brand',
+            'external_links', 'offers', 'broker_listings', 'short_description',
+            'descriptions', 'imagesets', 'datasheets', 'compliance_documents',
+            'reference_designs', 'cad_models', 'specs', 'category_uids')
+    # Fields the API serves unless hidden, and those it only serves on include
+    default_fields = ('uid', 'mpn', 'manufacturer', 'brand', 'octopart_url',
+            'offers', 'broker_listings')
+    optional_fields = ('short_description', 'datasheets',
+            'compliance_documents', 'descriptions', 'imagesets', 'specs',
+            'category_uids', 'external_links', 'reference_designs',
+            'cad_models')
+
     @classmethod
     def includes(cls,
                  include_short_description=False,
@@ -950,23 +1013,46 @@ class Part(object):
             args['hide[]'] += ['cad_models']
         return args
 
+    @classmethod
+    def projection(cls, params):
+        '''
+        Set of fields served for a query given its include[]/show[]/hide[]
+        parameters: the default fields plus included ones, or exactly the
+        shown ones, less the hidden ones.
+        '''
+        def names(key):
+            # The API parameters spell compliance_documents with a typo
+            return set('compliance_documents' if name == 'compliante_documents'
+                    else name for name in params.get(key, []))
+        fields = names('show[]')
+        if not fields:
+            fields = set(cls.default_fields) | names('include[]')
+        return frozenset(fields - names('hide[]'))
 
     @classmethod
-    def new_from_dict(cls, part_dict):
+    def new_from_dict(cls, part_dict, fields=None):
         """Constructor for use with JSON resource dictionaries."""
         if part_dict['__class__'] != cls.__name__:
             raise TypeArgumentError('Dict is for class %s, not %s' % (
                 part_dict['__class__'], cls.__name__))
 
         copied_dict = part_dict.copy()
-        uid = copied_dict.pop('uid')
-        mpn = copied_dict.pop('mpn')
-        manufacturer = copied_dict.pop('manufacturer')
-        return cls(uid, mpn, manufacturer, **copied_dict)
+        uid = copied_dict.pop('uid', None)
+        mpn = copied_dict.pop('mpn', None)
+        manufacturer = copied_dict.pop('manufacturer', None)
+        return cls(uid, mpn, manufacturer, fields=fields, **copied_dict)
 
     def __init__(self, uid, mpn, manufacturer, **kwargs):
         # If class data is in dictionary format, convert to class instance
         # Otherwise, assume it is already in class format and do nothing
+        # Fields left out of the query's projection are not built at all, and
+        # keep their empty default: check fetched() to tell them apart.
+        self.requested_fields = kwargs.pop('fields', None)
+        if self.requested_fields is not None:
+            kwargs = dict((key, val) for key, val in kwargs.items()
+                    if key in self.requested_fields)
+            if 'manufacturer' not in self.requested_fields:
+                manufacturer = None
         self.uid = uid
         self.mpn = mpn
         args = copy.deepcopy(kwargs)
@@ -986,7 +1072,7 @@ class Part(object):
         self.reference_designs = list_to_class(
                 args.get('reference_designs', []), ReferenceDesign)
         self.cad_models = list_to_class(args.get('cad_models', []), CADModel)
-        self.specs = list_to_class(args.get('specs', []), SpecValue)
+        self.specs = specs_to_class(args.get('specs', {}))
         self.category_uids = args.get('category_uids', [])
         # Deprecated from V2 -> V3:
         #self.avg_price = args.get('avg_price')
@@ -1042,12 +1128,23 @@ class Part(object):
     def __ne__(self, other):
         return not self.__eq__(other)
 
+    @cached_hash
     def __hash__(self):
         return hash((self.__class__, self.uid, self.mpn, self.manufacturer,
-            self.brand, self.external_links, self.offers, self.broker_listings,
-            self.short_description, self.descriptions, self.imagesets,
-            self.datasheets, self.compliance_documents, self.reference_designs,
-            self.cad_models, self.specs, self.category_uids))
+            self.brand, freeze(self.external_links), freeze(self.offers),
+            freeze(self.broker_listings), self.short_description,
+            freeze(self.descriptions), freeze(self.imagesets),
+            freeze(self.datasheets), freeze(self.compliance_documents),
+            freeze(self.reference_designs), freeze(self.cad_models),
+            freeze(self.specs), freeze(self.category_uids)))
+
+    def fingerprint(self, fields=None):
+        """Stable content digest, see pyoctopart.fingerprint."""
+        return fingerprint(self, fields)
+
+    def fetched(self, field):
+        """Whether field was part of the projection the part was built from."""
+        return self.requested_fields is None or field in self.requested_fields
 
     def __str__(self):
         return '%s %s %s (%s)' % (self.__class__.__name__,
@@ -1056,6 +1153,12 @@ class Part(object):
 @api_object
 class PartOffer(object):
     ''' https://octopart.com/api/docs/v3/rest-api#object-schemas-partoffer '''
+    fingerprint_fields = ('sku', 'seller', 'eligible_region', 'product_url',
+            'octopart_rfq_url', 'prices', 'in_stock_quantity',
+            'on_order_quantity', 'on_order_eta', 'factory_lead_days',
+            'factory_order_multiple', 'order_multiple', 'moq', 'packaging',
+            'is_authorized', 'last_updated')
+
     def __init__(self, sku, seller, eligible_region, product_url,
             octopart_rfq_url, prices, in_stock_quantity, on_order_quantity,
             on_order_eta, factory_lead_days, factory_order_multiple,
@@ -1179,14 +1282,19 @@ class PartOffer(object):
     def __ne__(self, other):
         return not self.__eq__(other)
 
+    @cached_hash
     def __hash__(self):
         return hash((self.__class__, self.sku, self.seller,
             self.eligible_region, self.product_url, self.octopart_rfq_url,
-            self.prices, self.in_stock_quantity, self.on_order_quantity,
+            freeze(self.prices), self.in_stock_quantity, self.on_order_quantity,
             self.on_order_eta, self.factory_lead_days,
             self.factory_order_multiple, self.order_multiple, self.moq,
             self.packaging, self.is_authorized, self.last_updated))
 
+    def fingerprint(self, fields=None):
+        """Stable content digest, see pyoctopart.fingerprint."""
+        return fingerprint(self, fields)
+
     def __str__(self):
         # Attempt to find the maximum and minimum price
         # To avoid making a smart decision about currency type, pick the first!
@@ -1209,6 +1317,9 @@ class PartOffer(object):
 @api_object
 class SpecValue(object):
     ''' https://octopart.com/api/docs/v3/rest-api#object-schemas-specvalue '''
+    fingerprint_fields = ('value', 'display_value', 'min_value', 'max_value',
+            'metadata', 'attribution')
+
     def __init__(self, value, display_value, **kwargs):
         args = copy.deepcopy(kwargs)
         self.value = value
@@ -1217,6 +1328,9 @@ class SpecValue(object):
         self.max_value = args.get('max_value')
         self.metadata = args.get('metadata')
         self.attribution = dict_to_class(args.get('attribution'), Attribution)
+        # Value in the base unit of the spec, see pyoctopart.units
+        self.canonical_value = args.get('canonical_value')
+        self.canonical_unit = args.get('canonical_unit')
 
     @classmethod
     def new_from_dict(cls, new_dict):
@@ -1277,8 +1391,13 @@ class SpecValue(object):
         return not self.__eq__(other)
 
     def __hash__(self):
-        return hash((self.__class__, self.value, self.display_value,
-            self.min_value, self.max_value, self.metadata, self.attribution))
+        return hash((self.__class__, freeze(self.value), self.display_value,
+            freeze(self.min_value), freeze(self.max_value),
+            freeze(self.metadata), self.attribution))
+
+    def fingerprint(self, fields=None):
+        """Stable content digest, see pyoctopart.fingerprint."""
+        return fingerprint(self, fields)
 
     def __str__(self):
         if self.min_value or self.max_value is None:
@@ -1293,6 +1412,9 @@ class ReferenceDesign(Asset):
     '''
     https://octopart.com/api/docs/v3/rest-api#object-schemas-referencedesign
     '''
+    fingerprint_fields = ('url', 'mimetype', 'metadata', 'title',
+            'description', 'attribution')
+
     def __init__(self, url, mimetype, **kwargs):
         super(self.__class__, self).__init__(url, mimetype, **kwargs)
         args = copy.deepcopy(kwargs)
@@ -1360,6 +1482,9 @@ class ReferenceDesign(Asset):
 @api_object
 class Seller(object):
     ''' https://octopart.com/api/docs/v3/rest-api#object-schemas-seller '''
+    fingerprint_fields = ('uid', 'name', 'homepage_url', 'display_flag',
+            'has_ecommerce')
+
     def __init__(self, uid, name, homepage_url, display_flag, has_ecommerce):
         self.uid = uid
         self.name = name
@@ -1431,6 +1556,8 @@ class Seller(object):
 @api_object
 class Source(object):
     ''' https://octopart.com/api/docs/v3/rest-api#object-schemas-source '''
+    fingerprint_fields = ('uid', 'name')
+
     def __init__(self, uid, name):
         self.uid = uid
         self.name = name
@@ -1484,6 +1611,8 @@ class SpecMetadata(object):
     '''
     https://octopart.com/api/docs/v3/rest-api#object-schemas-specmetadata
     '''
+    fingerprint_fields = ('key', 'name', 'datatype', 'unit')
+
     def __init__(self, key, name, datatype, unit):
         self.key = key
         self.name = name
@@ -1558,6 +1687,8 @@ class UnitOfMeasurement(object):
     '''
     https://octopart.com/api/docs/v3/rest-api#object-schemas-unitofmeasurement
     '''
+    fingerprint_fields = ('name', 'symbol')
+
     def __init__(self, name, symbol):
         self.name = name
         self.symbol = symbol
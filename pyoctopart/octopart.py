@@ -30,6 +30,9 @@ from pprint import pprint
 
 from pyoctopart.util import Curry, select, dict_to_class
 from pyoctopart.objects import Part
+from pyoctopart.responses import PartsMatchResponse
+# Imported to register its classes with dict_to_class()
+import pyoctopart.errors
 
 #from .exceptions import ArgumentMissingError
 #from .exceptions import ArgumentInvalidError
@@ -44,7 +47,11 @@ from .exceptions import HTML503Error
 #from .exceptions import TooLongListError
 from .exceptions import InvalidApiKeyError
 
-__version__ = pkg_resources.require('pyoctopart')[0].version
+try:
+    __version__ = pkg_resources.require('pyoctopart')[0].version
+except pkg_resources.DistributionNotFound:
+    # Running from a source checkout
+    __version__ = 'unknown'
 __author__ = 'Joe Baker <jbaker at alum.wpi.edu>'
 __contributors__ = ['Bernard `Guyzmo` Pratz <pyoctopart at m0g dot net>',
                     'Andrew Tergis <theterg at gmail got com>']
@@ -66,14 +73,19 @@ class Octopart(object):
     """
 
     api_url = 'http://octopart.com/api/v%d/'
-    __slots__ = ['apikey', 'callback', 'pretty_print', 'verbose']
+    __slots__ = ['apikey', 'callback', 'pretty_print', 'verbose', 'cache']
 
     def __init__(self, apikey=None, callback=None,
-            pretty_print=False, verbose=False):
+            pretty_print=False, verbose=False, cache=None):
+        """
+        param cache: optional pyoctopart.cache.ResponseCache answering
+            parts_match and parts_get calls it holds responses for.
+        """
         self.apikey = apikey
         self.callback = callback
         self.pretty_print = pretty_print
         self.verbose = verbose
+        self.cache = cache
 
 
     def _get_data(self, method, args, payload=None, ver=2):
@@ -171,7 +183,6 @@ class Octopart(object):
 
         method = 'parts/match'
 
-        args = {'queries': queries, 'exact_only': exact_only}
         params = {}
 
         params.update(Part.includes(**select_incls(show_hide)))
@@ -182,27 +193,266 @@ class Octopart(object):
             if type(q) != dict:
                 raise TypeArgumentError(['queries'], ['str'], [])
 
-        json_obj = self._get_data(method, args, params, ver=3)
-
-        # XXX consider using the following?
-        # items = [Part.new_from_dict(item) for\
-        #  item in json_obj['results']['items']]
+        json_obj = self._match(method, queries, exact_only, params)
 
+        # Only build the Part fields the projection asked for
         if json_obj:
-            return dict_to_class(json_obj)
+            return dict_to_class(json_obj, PartsMatchResponse,
+                    **self._projection(json_obj, PartsMatchResponse, params))
         else:
             return None
 
-    def parts_get(self, uid):
+    def parts_get(self, uid, **show_hide):
         '''
         https://octopart.com/api/docs/v3/rest-api#endpoints-parts-get
         '''
-        method = 'parts/{:d}'.format(uid)
+        method = 'parts/%s' % uid
 
-        json_obj = self._get_data(method, {}, ver=3)
+        params = {}
+        params.update(Part.includes(**select_incls(show_hide)))
+        params.update(Part.shows(**select_shows(show_hide)))
+        params.update(Part.hides(**select_hides(show_hide)))
+
+        json_obj = self._get(method, params)
 
         if json_obj:
-            return dict_to_class(json_obj)
+            return dict_to_class(json_obj, Part,
+                    **self._projection(json_obj, Part, params))
         else:
             return None
 
+    def parts_get_multi(self, uids, **show_hide):
+        '''
+        https://octopart.com/api/docs/v3/rest-api#endpoints-parts-get_multi
+
+        returns: dict of the Parts found, by uid.
+        '''
+        params = {}
+        params.update(Part.includes(**select_incls(show_hide)))
+        params.update(Part.shows(**select_shows(show_hide)))
+        params.update(Part.hides(**select_hides(show_hide)))
+
+        json_obj = self._get_multi([str(uid) for uid in uids], params)
+
+        if json_obj is None:
+            return None
+        if '__class__' in json_obj:
+            # Errors answer the whole call
+            return dict_to_class(json_obj)
+        return dict((uid, dict_to_class(part, Part,
+                **self._projection(part, Part, params)))
+                for uid, part in json_obj.items())
+
+    def _get_multi(self, uids, params):
+        """Get parts through the cache, under the keys parts_get caches
+        them by: only the uids not cached, stale or cached with stale fields
+        are sent, in one call."""
+        if self.cache is None:
+            return self._get_data('parts/get_multi', {},
+                    dict(params, **{'uid[]': uids}), ver=3)
+
+        found = {}
+        pending = []
+        for uid in uids:
+            entry = self.cache.get(self.cache.key('parts/%s' % uid, params))
+            if entry is None or self.cache.is_stale(entry):
+                pending.append(uid)
+            elif entry.negative:
+                continue
+            elif self.cache.stale_fields(entry, [entry.value]):
+                pending.append(uid)
+            else:
+                found[uid] = entry.value
+        if not pending:
+            return found
+        json_obj = self.cache.call(self._get_data, 'parts/get_multi', {},
+                dict(params, **{'uid[]': pending}), 3)
+        if not json_obj or '__class__' in json_obj:
+            return json_obj
+        for uid in pending:
+            key = self.cache.key('parts/%s' % uid, params)
+            if json_obj.get(uid):
+                found[uid] = json_obj[uid]
+                self.cache.set(key, json_obj[uid])
+            else:
+                self.cache.set_negative(key)
+        return found
+
+    def _match(self, method, queries, exact_only, params):
+        """Match queries through the cache: cached results and misses are
+        answered locally, only the other queries are sent. Stale results are
+        answered too, and refreshed in the background."""
+        if self.cache is None:
+            return self._get_data(method, {'queries': queries,
+                'exact_only': exact_only}, params, ver=3)
+
+        # Entries hold the query as the API echoed it, and its result
+        keys = [self.cache.key(method, query, exact_only, params)
+                for query in queries]
+        entries = [None] * len(queries)
+        pending = []
+        # Queries of the stale results, by key
+        expired = {}
+        # Positions of the cached results whose parts have stale fields
+        stale = {}
+        for pos, key in enumerate(keys):
+            entry = self.cache.get(key)
+            if entry is None:
+                pending.append(pos)
+                continue
+            entries[pos] = entry.value
+            if self.cache.is_stale(entry):
+                expired.setdefault(key, queries[pos])
+            elif not entry.negative:
+                fields = self.cache.stale_fields(entry,
+                        entry.value['result'].get('items') or [])
+                if fields:
+                    stale.setdefault(tuple(fields), []).append(pos)
+
+        if expired:
+            # Stale results are refreshed together, as one call
+            self.cache.revalidate_batch(
+                    [key for key in keys if key in expired],
+                    Curry(self._revalidate_matches, method, expired,
+                          exact_only, params))
+
+        for fields, positions in stale.items():
+            refreshed = self._refresh_matches(method,
+                    [queries[pos] for pos in positions], exact_only,
+                    [keys[pos] for pos in positions],
+                    [entries[pos] for pos in positions], fields)
+            for pos, entry in zip(positions, refreshed):
+                entries[pos] = entry
+
+        json_obj = None
+        if pending:
+            json_obj = self._fetch_match(method,
+                    [queries[pos] for pos in pending], exact_only, params,
+                    [keys[pos] for pos in pending])
+            if len(pending) == len(queries) or not json_obj or\
+                    'results' not in json_obj:
+                # Top-level errors answer the whole call, as when uncached
+                return json_obj
+            echoed = (json_obj.get('request') or {}).get('queries') or []
+            for pos, query, result in zip(pending, echoed,
+                                          json_obj.get('results') or []):
+                entries[pos] = {'query': query, 'result': result}
+
+        ret = dict(json_obj or {'__class__': 'PartsMatchResponse', 'msec': 0})
+        ret['request'] = {'__class__': 'PartsMatchRequest',
+                          'queries': [entry['query'] for entry in entries],
+                          'exact_only': exact_only}
+        ret['results'] = [entry['result'] for entry in entries]
+        return ret
+
+    def _fetch_match(self, method, queries, exact_only, params, keys):
+        """Send queries, and cache each result under its key."""
+        json_obj = self.cache.call(self._get_data, method, {'queries': queries,
+            'exact_only': exact_only}, dict(params), 3)
+        echoed = (json_obj.get('request') or {}).get('queries') or []
+        for key, query, result in zip(keys, echoed,
+                                      json_obj.get('results') or []):
+            if result.get('error'):
+                continue
+            entry = {'query': query, 'result': result}
+            if result.get('hits') == 0:
+                self.cache.set_negative(key, entry)
+            else:
+                self.cache.set(key, entry)
+        return json_obj
+
+    def _revalidate_matches(self, method, queries, exact_only, params, keys):
+        """Send the queries of keys, from the dict of queries by key."""
+        return self._fetch_match(method, [queries[key] for key in keys],
+                                 exact_only, params, keys)
+
+    @staticmethod
+    def _narrowed(fields):
+        """Projection of only the uid and fields of parts."""
+        return Part.shows(show_uid=True,
+                **dict(('show_' + field, True) for field in fields))
+
+    def _refresh_matches(self, method, queries, exact_only, keys, entries,
+                         fields):
+        """Re-match queries for their stale fields only, and merge these
+        into the parts of their cached entries, by uid."""
+        json_obj = self.cache.call(self._get_data, method, {'queries': queries,
+            'exact_only': exact_only}, self._narrowed(fields), 3)
+        ret = []
+        for key, entry, result in zip(keys, entries,
+                                      json_obj.get('results') or []):
+            if result.get('error'):
+                ret.append(entry)
+                continue
+            fresh = dict((item.get('uid'), item)
+                    for item in result.get('items') or [])
+            items = []
+            for item in entry['result'].get('items') or []:
+                if item.get('uid') in fresh:
+                    item = dict(item)
+                    item.update((field, fresh[item['uid']].get(field))
+                            for field in fields)
+                items.append(item)
+            entry = {'query': entry['query'],
+                     'result': dict(entry['result'], items=items)}
+            self.cache.set_fields(key, entry, fields)
+            ret.append(entry)
+        return ret
+
+    def _get(self, method, params):
+        """Get a resource through the cache, remembering 404s. Stale
+        resources are returned, and refreshed in the background."""
+        if self.cache is None:
+            return self._get_data(method, {}, params, ver=3)
+
+        key = self.cache.key(method, params)
+        entry = self.cache.get(key)
+        if entry is None:
+            return self._fetch(method, params, key)
+        if entry.negative:
+            raise HTML404Error({}, [], [])
+        if self.cache.is_stale(entry):
+            self.cache.revalidate(key, Curry(self._fetch, method, params, key))
+            return entry.value
+        fields = self.cache.stale_fields(entry, [entry.value])
+        if fields:
+            return self._refresh_fields(method, key, entry.value, fields)
+        return entry.value
+
+    def _refresh_fields(self, method, key, value, fields):
+        """Re-fetch the stale fields of a cached part only, and merge them
+        into it. On an error reply, the cached part is returned as is, its
+        fields staying stale."""
+        try:
+            json_obj = self.cache.call(self._get_data, method, {},
+                    self._narrowed(fields), 3)
+        except HTML404Error:
+            self.cache.set_negative(key)
+            raise
+        if (json_obj or {}).get('__class__') != 'Part':
+            return value
+        value = dict(value)
+        value.update((field, json_obj.get(field)) for field in fields)
+        self.cache.set_fields(key, value, fields)
+        return value
+
+    def _fetch(self, method, params, key):
+        """Get a resource, and cache it or its 404 under key. Error replies
+        are returned without being cached."""
+        try:
+            json_obj = self.cache.call(self._get_data, method, {},
+                    dict(params), 3)
+        except HTML404Error:
+            self.cache.set_negative(key)
+            raise
+        if (json_obj or {}).get('__class__') == 'Part':
+            self.cache.set(key, json_obj)
+        return json_obj
+
+    @staticmethod
+    def _projection(json_obj, cls, params):
+        ''' Projection arguments for building json_obj, if it is a cls '''
+        if json_obj.get('__class__') != cls.__name__:
+            return {}
+        return {'fields': Part.projection(params)}
+
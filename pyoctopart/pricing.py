@@ -0,0 +1,124 @@
+'''
+Price-at-quantity evaluation over offer price breaks.
+
+Buying `quantity` units from an offer means ordering at least its MOQ,
+rounded up to its order multiple; the unit price is the one of the largest
+price break not above the ordered quantity. Quantities below the first break
+have no price (None, or NaN in arrays).
+
+offer_price() evaluates a single PartOffer. PriceIndex evaluates any number of
+(offer, quantity) pairs of an OfferTable at once: every break of the table is
+encoded as `offer * stride + quantity` in one sorted array, so that looking up
+the break of every pair is a single numpy.searchsorted() call.
+'''
+
+import bisect
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from pyoctopart.table import _require_numpy
+
+
+def order_quantity(quantity, moq=None, order_multiple=None):
+    ''' Quantity to order to get `quantity` units, honoring MOQ and multiple '''
+    ordered = max(quantity, moq or 0)
+    if order_multiple and order_multiple > 1:
+        ordered = -(-ordered // order_multiple) * order_multiple
+    return ordered
+
+def offer_price(offer, quantity, currency='USD', rates=None):
+    '''
+    Price of buying quantity units from a PartOffer.
+
+    param rates: optional RateTable to price offers in other currencies.
+    returns: (ordered quantity, unit price, extended price), or None when the
+        offer has no price break in currency for that quantity.
+    '''
+    if rates is not None:
+        breaks = rates.offer_prices(offer, currency)
+    else:
+        breaks = sorted((int(qty), float(price))
+                for qty, price in (offer.prices or {}).get(currency) or [])
+    if not breaks:
+        return None
+    ordered = order_quantity(quantity, offer.moq, offer.order_multiple)
+    pos = bisect.bisect_right([qty for qty, _ in breaks], ordered) - 1
+    if pos < 0:
+        return None
+    unit = breaks[pos][1]
+    return ordered, unit, unit * ordered
+
+
+class PriceIndex(object):
+    ''' Sorted price breaks of an OfferTable in one currency '''
+
+    def __init__(self, table, currency='USD', prices=None):
+        '''
+        param table: OfferTable whose breaks get indexed.
+        param currency: currency of the breaks to index.
+        param prices: optional array replacing table.break_price, such as
+            prices converted from other currencies; breaks whose price is
+            NaN are left out.
+        '''
+        _require_numpy()
+        if prices is None:
+            selected = table.break_currency == currency
+            prices = table.break_price
+        else:
+            selected = ~numpy.isnan(prices)
+        offers = table.break_offer[selected]
+        quantities = table.break_quantity[selected]
+        self.currency = currency
+        self.max_quantity = int(quantities.max()) if len(quantities) else 0
+        self.stride = self.max_quantity + 1
+        keys = offers * self.stride + quantities
+        order = numpy.argsort(keys, kind='stable')
+        self.keys = keys[order]
+        self.offers = offers[order]
+        self.quantities = quantities[order]
+        self.prices = prices[selected][order]
+        self.moq = numpy.nan_to_num(table.moq, nan=0.0)
+        self.multiple = numpy.maximum(
+                numpy.nan_to_num(table.order_multiple, nan=1.0), 1.0)
+
+    def order_quantity(self, offers, quantities):
+        ''' Vectorized order_quantity() for offer rows of the table '''
+        ordered = numpy.maximum(quantities, self.moq[offers])
+        multiple = self.multiple[offers]
+        return numpy.ceil(ordered / multiple) * multiple
+
+    def evaluate(self, offers, quantities):
+        '''
+        Price of buying quantities from offers, broadcast against each other:
+        pass offers[:, None] and quantities[None, :] to price every offer at
+        every quantity in one call.
+
+        returns: (ordered quantity, unit price, extended price) arrays.
+        '''
+        offers, quantities = numpy.broadcast_arrays(
+                numpy.asarray(offers, dtype=numpy.int64),
+                numpy.asarray(quantities, dtype=float))
+        ordered = self.order_quantity(offers, quantities)
+        if not len(self.keys):
+            unit = numpy.full(ordered.shape, numpy.nan)
+            return ordered, unit, unit
+        # Past the largest break the price stays flat, so clip the lookup
+        # to keep it from spilling into the next offer's keys
+        lookup = numpy.minimum(ordered, self.max_quantity).astype(numpy.int64)
+        pos = numpy.searchsorted(self.keys,
+                offers * self.stride + lookup, side='right') - 1
+        safe = numpy.maximum(pos, 0)
+        found = (pos >= 0) & (self.offers[safe] == offers)
+        unit = numpy.where(found, self.prices[safe], numpy.nan)
+        return ordered, unit, unit * ordered
+
+    def unit_price(self, offers, quantities):
+        ''' Unit prices of buying quantities from offers '''
+        return self.evaluate(offers, quantities)[1]
+
+    def extended_price(self, offers, quantities):
+        ''' Total prices of buying quantities from offers '''
+        return self.evaluate(offers, quantities)[2]
@@ -0,0 +1,96 @@
+'''
+Top-k ranking of offers across many parts.
+
+rank_offers() streams the offers of any number of parts through a heap bounded
+to k entries (heapq.nsmallest()), so the k best offers are found in O(n log k)
+time and O(k) memory rather than by sorting all n offers.
+
+Ranking keys are functions of (part, offer) returning a sortable value, lower
+ranking first, or None to leave the offer out. Several keys rank by the first,
+breaking ties by the next ones. Key factories are provided for the effective
+price at a quantity, the lead time and the stock of offers; descending()
+reverses a numeric key.
+'''
+
+import heapq
+from collections import namedtuple
+
+from pyoctopart.pricing import offer_price
+
+
+Ranked = namedtuple('Ranked', 'key part offer')
+
+
+def effective_price(quantity, currency='USD', rates=None):
+    '''
+    Key ranking offers by the unit cost of buying quantity units, once MOQ,
+    order multiple and price breaks are applied. Offers without a price for
+    that quantity are left out.
+
+    param rates: optional RateTable to compare prices in other currencies.
+    '''
+    def key(part, offer):
+        price = offer_price(offer, quantity, currency, rates)
+        if price is None:
+            return None
+        return price[2] / quantity
+    return key
+
+def lead_time(part, offer):
+    ''' Key ranking offers by factory lead time, unknown ones last '''
+    if offer.factory_lead_days is None:
+        return float('inf')
+    return offer.factory_lead_days
+
+def stock(part, offer):
+    ''' Key ranking offers by decreasing in-stock quantity '''
+    return -(offer.in_stock_quantity or 0)
+
+def descending(key):
+    ''' Reverse a key of numeric values '''
+    def reverse(part, offer):
+        value = key(part, offer)
+        return -value if value is not None else None
+    return reverse
+
+
+def _candidates(parts, keys, authorized_only, min_stock, where):
+    for part in parts:
+        for offer in part.offers or []:
+            if authorized_only and not offer.is_authorized:
+                continue
+            if min_stock is not None and\
+                    (offer.in_stock_quantity or 0) < min_stock:
+                continue
+            if where is not None and not where(part, offer):
+                continue
+            ranks = []
+            for key in keys:
+                rank = key(part, offer)
+                if rank is None:
+                    break
+                ranks.append(rank)
+            else:
+                yield Ranked(tuple(ranks), part, offer)
+
+def rank_offers(parts, keys, k=20, authorized_only=False, min_stock=None,
+                where=None):
+    '''
+    The k best offers of parts by keys, for instance the 20 cheapest
+    authorized offers at 1000 pieces with stock, fastest first on ties:
+
+        rank_offers(parts, [effective_price(1000), lead_time], k=20,
+                    authorized_only=True, min_stock=1)
+
+    param parts: iterable of Part objects, consumed once.
+    param keys: ranking key, or list of keys.
+    param authorized_only: only rank offers of authorized sellers.
+    param min_stock: optional minimum in-stock quantity of offers.
+    param where: optional predicate of (part, offer) offers must pass.
+    returns: list of Ranked (key tuple, part, offer), best first; ties keep
+        the order offers came in.
+    '''
+    if callable(keys):
+        keys = [keys]
+    return heapq.nsmallest(k, _candidates(parts, keys, authorized_only,
+        min_stock, where), key=lambda ranked: ranked.key)
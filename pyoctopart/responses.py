@@ -24,6 +24,7 @@ limitations under the License.
 import copy
 from pyoctopart.util import Curry, select
 from pyoctopart.util import dict_to_class, list_to_class, api_object
+from pyoctopart.util import freeze, cached_hash
 from pyoctopart.objects import Part
 
 #from .exceptions import ArgumentMissingError
@@ -42,6 +43,8 @@ class PartsMatchRequest(object):
     '''
     https://octopart.com/api/docs/v3/rest-api#response-schemas-partsmatchrequest
     '''
+    fingerprint_fields = ('queries', 'exact_only')
+
     def __init__(self, queries, exact_only):
         self.queries = list_to_class(queries, PartsMatchQuery)
         self.exact_only = exact_only
@@ -83,8 +86,9 @@ class PartsMatchRequest(object):
     def __ne__(self, other):
         return not self.__eq__(other)
 
+    @cached_hash
     def __hash__(self):
-        return hash((self.__class__, self.queries, self.exact_only))
+        return hash((self.__class__, freeze(self.queries), self.exact_only))
 
     def __str__(self):
         return '%s with %d queries, exact_only %s' % (self.__class__.__name__,
@@ -95,6 +99,9 @@ class PartsMatchQuery(object):
     '''
     https://octopart.com/api/docs/v3/rest-api#response-schemas-partsmatchquery
     '''
+    fingerprint_fields = ('q', 'mpn', 'brand', 'sku', 'seller', 'mpn_or_sku',
+            'start', 'limit', 'reference')
+
     # pylint: disable=invalid-name
     def __init__(self, q, mpn, brand, sku, seller, mpn_or_sku,
             start, limit, reference):
@@ -211,19 +218,23 @@ class PartsMatchResponse(object):
     '''
     https://octopart.com/api/docs/v3/rest-api#response-schemas-partsmatchresponse
     '''
-    def __init__(self, request, results, msec):
+    fingerprint_fields = ('request', 'results', 'msec')
+
+    def __init__(self, request, results, msec, fields=None):
+        # fields: the Part projection of the query, see Part.projection()
+        self.requested_fields = fields
         self.request = dict_to_class(request, PartsMatchRequest)
-        self.results = list_to_class(results, PartsMatchResult)
+        self.results = list_to_class(results, PartsMatchResult, fields=fields)
         self.msec = msec
 
     @classmethod
-    def new_from_dict(cls, new_dict):
+    def new_from_dict(cls, new_dict, fields=None):
         """Constructor for use with JSON resource dictionaries."""
         if new_dict['__class__'] != cls.__name__:
             raise TypeArgumentError('Dict is for class %s, not %s' % (
                 new_dict['__class__'], cls.__name__))
         new = cls(new_dict['request'], new_dict['results'],
-                new_dict['msec'])
+                new_dict['msec'], fields)
         return new
 
     def equals_json(self, resource):
@@ -258,8 +269,10 @@ class PartsMatchResponse(object):
     def __ne__(self, other):
         return not self.__eq__(other)
 
+    @cached_hash
     def __hash__(self):
-        return hash((self.__class__, self.request, self.results, self.msec))
+        return hash((self.__class__, self.request, freeze(self.results),
+            self.msec))
 
     def __str__(self):
         return '%s completed in %d ms, %d results' % (
@@ -270,15 +283,18 @@ class PartsMatchResult(object):
     '''
     https://octopart.com/api/docs/v3/rest-api#response-schemas-partsmatchresult
     '''
+    fingerprint_fields = ('items', 'hits', 'reference', 'error')
+
     def __init__(self, items, hits, **kwargs):
+        fields = kwargs.pop('fields', None)
         args = copy.deepcopy(kwargs)
-        self.items = list_to_class(items, Part)
+        self.items = list_to_class(items, Part, fields=fields)
         self.hits = hits
         self.reference = args.get('reference')
         self.error = args.get('error')
 
     @classmethod
-    def new_from_dict(cls, new_dict):
+    def new_from_dict(cls, new_dict, fields=None):
         """Constructor for use with JSON resource dictionaries."""
         if new_dict['__class__'] != cls.__name__:
             raise TypeArgumentError('Dict is for class %s, not %s' % (
@@ -286,7 +302,7 @@ class PartsMatchResult(object):
         new_dict = copy.deepcopy(new_dict)
         items = new_dict.pop('items')
         hits = new_dict.pop('hits')
-        new = cls(items, hits, **new_dict)
+        new = cls(items, hits, fields=fields, **new_dict)
         return new
 
     def equals_json(self, resource):
@@ -327,9 +343,10 @@ class PartsMatchResult(object):
     def __ne__(self, other):
         return not self.__eq__(other)
 
+    @cached_hash
     def __hash__(self):
-        return hash((self.__class__, self.items, self.hits, self.reference,
-            self.error))
+        return hash((self.__class__, freeze(self.items), self.hits,
+            self.reference, freeze(self.error)))
 
     def __str__(self):
         if self.error is not None:
@@ -343,6 +360,9 @@ class SearchRequest(object):
     '''
     https://octopart.com/api/docs/v3/rest-api#response-schemas-searchrequest
     '''
+    fingerprint_fields = ('q', 'start', 'limit', 'sortby', 'filter', 'facet',
+            'stats')
+
     # pylint: disable=invalid-name
     def __init__(self, q, start, limit, sortby, **kwargs):
         args = copy.deepcopy(kwargs)
@@ -418,9 +438,11 @@ class SearchRequest(object):
     def __ne__(self, other):
         return not self.__eq__(other)
 
+    @cached_hash
     def __hash__(self):
         return hash((self.__class__, self.q, self.start, self.limit,
-            self.sortby, self.filter, self.facet, self.stats))
+            self.sortby, freeze(self.filter), freeze(self.facet),
+            freeze(self.stats)))
 
     def __str__(self):
         return '%s: %s' % (
@@ -431,6 +453,9 @@ class SearchResponse(object):
     '''
     https://octopart.com/api/docs/v3/rest-api#response-schemas-searchresponse
     '''
+    fingerprint_fields = ('request', 'results', 'hits', 'msec',
+            'facet_results', 'stats_results', 'spec_metadata')
+
     def __init__(self, request, results, hits, msec, **kwargs):
         args = copy.deepcopy(kwargs)
         self.request = dict_to_class(request, SearchRequest)
@@ -510,10 +535,11 @@ class SearchResponse(object):
     def __ne__(self, other):
         return not self.__eq__(other)
 
+    @cached_hash
     def __hash__(self):
-        return hash((self.__class__, self.request, self.results, self.hits,
-            self.msec, self.facet_results, self.stats_results,
-            self.spec_metadata))
+        return hash((self.__class__, self.request, freeze(self.results),
+            self.hits, self.msec, freeze(self.facet_results),
+            freeze(self.stats_results), freeze(self.spec_metadata)))
 
     def __str__(self):
         return '%s completed in %d ms, %d hits' % (
@@ -524,10 +550,11 @@ class SearchResult(object):
     '''
     https://octopart.com/api/docs/v3/rest-api#response-schemas-searchresult
     '''
+    fingerprint_fields = ('item',)
+
     def __init__(self, item):
-        # XXX HACK: We need to implement dynamic object instantiation
-        # This could be any type of object.
-        self.item = dict_to_class(item, Part)
+        # This could be any type of object, built after its __class__ tag
+        self.item = dict_to_class(item)
 
     @classmethod
     def new_from_dict(cls, new_dict):
@@ -562,6 +589,7 @@ class SearchResult(object):
     def __ne__(self, other):
         return not self.__eq__(other)
 
+    @cached_hash
     def __hash__(self):
         return hash((self.__class__, self.item))
 
@@ -574,6 +602,8 @@ class SearchFacetResult(object):
     '''
     https://octopart.com/api/docs/v3/rest-api#response-schemas-searchfacetresult
     '''
+    fingerprint_fields = ('facets', 'missing', 'spec_drilldown_rank')
+
     def __init__(self, facets, missing, spec_drilldown_rank):
         self.facets = facets
         self.missing = missing
@@ -622,7 +652,7 @@ class SearchFacetResult(object):
         return not self.__eq__(other)
 
     def __hash__(self):
-        return hash((self.__class__, self.facets, self.missing,
+        return hash((self.__class__, freeze(self.facets), self.missing,
             self.spec_drilldown_rank))
 
     def __str__(self):
@@ -635,6 +665,9 @@ class SearchStatsResult(object):
     '''
     https://octopart.com/api/docs/v3/rest-api#response-schemas-searchstatsresult
     '''
+    fingerprint_fields = ('min', 'max', 'mean', 'stddev', 'count', 'missing',
+            'spec_drilldown_rank')
+
     def __init__(self, min, max, mean, stddev, count, missing, spec_drilldown_rank):
         self.min = min
         self.max = max
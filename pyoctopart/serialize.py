@@ -0,0 +1,68 @@
+'''
+Compact binary serialization of API objects.
+
+Every API object has a to_dict() method giving a lossless, JSON encodable form
+of its attributes, which its class's from_dict() turns back into the object
+without going through new_from_dict(): no copy of the resource, no validation
+and no parsing of its fields, as the object was built by new_from_dict()
+already. API objects also pickle by their public attributes, leaving out the
+hashes and fingerprints they cache.
+
+dumps() encodes API objects, or lists and dicts of them, as msgpack when the
+msgpack package is installed (`pip install pyoctopart[msgpack]`), and as a
+pickle otherwise; loads() reads both back, by the leading byte of the data.
+Pickles run code as they are loaded: only load data written by a trusted
+process, such as a cache of your own.
+'''
+
+import pickle
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+from pyoctopart.util import _encode, _revive
+from pyoctopart.exceptions import ArgumentInvalidError
+
+
+FORMATS = ('msgpack', 'pickle')
+# Leading byte of the data of each format
+HEADERS = {'msgpack': b'M', 'pickle': b'P'}
+
+
+def _require_msgpack():
+    if msgpack is None:
+        raise ImportError('msgpack is required for msgpack serialization, '
+                'install pyoctopart[msgpack]')
+
+
+def dumps(value, format=None):
+    '''
+    Bytes of API objects.
+
+    param value: API object, or list or dict of API objects.
+    param format: 'msgpack', which requires msgpack, or 'pickle'; msgpack
+        when it is installed by default.
+    returns: bytes read back by loads().
+    '''
+    # pylint: disable=redefined-builtin
+    if format is None:
+        format = 'msgpack' if msgpack is not None else 'pickle'
+    if format not in FORMATS:
+        raise ArgumentInvalidError(['format'], [str], list(FORMATS))
+    if format == 'msgpack':
+        _require_msgpack()
+        return HEADERS['msgpack'] + msgpack.packb(_encode(value),
+                                                  use_bin_type=True)
+    return HEADERS['pickle'] + pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+
+def loads(data):
+    ''' The API objects of bytes from dumps() '''
+    header, data = data[:1], data[1:]
+    if header == HEADERS['msgpack']:
+        _require_msgpack()
+        return msgpack.unpackb(data, raw=False, object_hook=_revive)
+    if header == HEADERS['pickle']:
+        return pickle.loads(data)
+    raise ValueError('not data of pyoctopart.serialize.dumps()')
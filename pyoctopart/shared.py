@@ -0,0 +1,294 @@
+'''
+Cache tier shared by the processes of a host, through a memory-mapped file.
+
+A SharedStore maps a file, on a tmpfs such as /dev/shm for it to stay in
+memory, that every worker of a pre-fork pool opens or inherits: a response
+cached by one worker is then read by the others without SQLite or the network.
+
+The file holds a header, a table of slots and a ring of records. A record
+holds the key, expiry and response of an entry; slots index records by a 64
+bit hash of their key, with a few probes per key. Records are appended at the
+head of the ring, which overwrites the oldest ones as it wraps around, so the
+tier keeps the most recently written entries that fit in its capacity.
+
+Writers take an exclusive flock() on the file, and a lock within a process.
+Readers take no lock: each slot is guarded by a sequence number, odd while a
+writer updates it, which readers check before and after reading the slot, and
+the head is moved past a record before it is overwritten, which readers check
+after copying it. A read copies the record once, out of the mapping, before
+decoding the response, with a Codec when the tier has one.
+
+This module requires a POSIX system.
+'''
+
+import os
+import mmap
+import json
+import fcntl
+import struct
+import hashlib
+import threading
+from contextlib import contextmanager
+
+from pyoctopart.cache import Entry, _dumps
+from pyoctopart.compression import Codec
+
+
+MAGIC = b'PYOCSHM1'
+# magic, version, slots, ring size, head of the ring
+HEADER = struct.Struct('<8sIIQQ')
+HEADER_SIZE = 64
+HEAD_OFFSET = 24
+# sequence, key hash, position of the record in the ring, record length
+SLOT = struct.Struct('<QQQQ')
+# key, fields and response lengths, entry size, stored, expires,
+# stale_until, flags
+RECORD = struct.Struct('<IIIIdddB')
+NEGATIVE, COMPRESSED = 1, 2
+PROBES = 8
+RETRIES = 16
+
+
+def _hash(key):
+    digest = hashlib.sha1(key.encode('utf-8')).digest()
+    # 0 marks empty slots
+    return struct.unpack('<Q', digest[:8])[0] or 1
+
+
+class SharedStore(object):
+    ''' Tier in a memory-mapped file, shared by the processes opening it '''
+    name = 'shared'
+
+    def __init__(self, path, capacity=64 * 2 ** 20, slots=65536, name=None,
+                 codec=None):
+        '''
+        param path: path of the file, created if missing.
+        param capacity: bytes of records, when creating the file.
+        param slots: number of entries indexed, when creating the file;
+            an existing file keeps the geometry it was created with.
+        param codec: optional Codec compressing the responses written.
+        '''
+        self.path = path
+        if name is not None:
+            self.name = name
+        self.codec = codec
+        self._lock = threading.Lock()
+        self._open()
+        with self._writing():
+            if os.fstat(self._fd).st_size < HEADER_SIZE or\
+                    self._pread(len(MAGIC)) != MAGIC:
+                os.ftruncate(self._fd, 0)
+                os.ftruncate(self._fd, HEADER_SIZE + slots * SLOT.size +
+                             capacity)
+                os.lseek(self._fd, 0, os.SEEK_SET)
+                os.write(self._fd, HEADER.pack(MAGIC, 1, slots, capacity, 0))
+            _, _, self.slots, self.capacity, _ = HEADER.unpack(
+                    self._pread(HEADER.size))
+        self._ring = HEADER_SIZE + self.slots * SLOT.size
+        self._map = mmap.mmap(self._fd, self._ring + self.capacity)
+
+    def _open(self):
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        self._pid = os.getpid()
+
+    def _pread(self, length):
+        os.lseek(self._fd, 0, os.SEEK_SET)
+        return os.read(self._fd, length)
+
+    @contextmanager
+    def _writing(self):
+        ''' Context of a writer, excluding other threads and processes '''
+        with self._lock:
+            if self._pid != os.getpid():
+                # Forked workers share the parent's flock() through its fd
+                os.close(self._fd)
+                self._open()
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def close(self):
+        self._map.close()
+        os.close(self._fd)
+
+    def _head(self):
+        return struct.unpack_from('<Q', self._map, HEAD_OFFSET)[0]
+
+    def _slot(self, index):
+        ''' Consistent (hash, position, length) of a slot '''
+        offset = HEADER_SIZE + index * SLOT.size
+        for _ in range(RETRIES):
+            sequence, key_hash, position, length = SLOT.unpack_from(
+                    self._map, offset)
+            if sequence & 1:
+                continue
+            if struct.unpack_from('<Q', self._map, offset)[0] == sequence:
+                return key_hash, position, length
+        return 0, 0, 0
+
+    def _set_slot(self, index, key_hash, position, length):
+        offset = HEADER_SIZE + index * SLOT.size
+        sequence = struct.unpack_from('<Q', self._map, offset)[0]
+        struct.pack_into('<Q', self._map, offset, sequence + 1)
+        SLOT.pack_into(self._map, offset, sequence + 1, key_hash, position,
+                       length)
+        struct.pack_into('<Q', self._map, offset, sequence + 2)
+
+    def _probes(self, key_hash):
+        return [(key_hash + probe) % self.slots for probe in range(PROBES)]
+
+    def _live(self, position, head):
+        return position + self.capacity >= head
+
+    def _record(self, position, length):
+        ''' Copy of a record, or None once the ring overwrote it '''
+        start = self._ring + position % self.capacity
+        data = self._map[start:start + length]
+        if not self._live(position, self._head()):
+            return None
+        return data
+
+    def _read(self, key_hash, key=None):
+        for index in self._probes(key_hash):
+            found, position, length = self._slot(index)
+            if found != key_hash or not length:
+                continue
+            data = self._record(position, length)
+            if data is None:
+                continue
+            lengths = RECORD.unpack_from(data)
+            start = RECORD.size + lengths[0]
+            if key is not None and data[RECORD.size:start].decode(
+                    'utf-8') != key:
+                continue
+            return data
+        return None
+
+    def _entry(self, data):
+        key_length, fields_length, value_length, size, stored, expires,\
+            stale_until, flags = RECORD.unpack_from(data)
+        start = RECORD.size + key_length
+        fields = json.loads(data[start:start + fields_length].decode('utf-8'))
+        start += fields_length
+        value = data[start:start + value_length]
+        if flags & COMPRESSED:
+            value = (self.codec or Codec()).decode(value)
+        else:
+            value = json.loads(value.decode('utf-8'))
+        entry = Entry(value, stored, expires, bool(flags & NEGATIVE),
+                      stale_until)
+        entry.fields = fields
+        entry.size = size
+        return entry
+
+    def get(self, key):
+        data = self._read(_hash(key), key)
+        return self._entry(data) if data is not None else None
+
+    def put(self, key, entry):
+        flags = NEGATIVE if entry.negative else 0
+        if self.codec is not None:
+            value = self.codec.encode(entry.value)
+            flags |= COMPRESSED
+        else:
+            value = _dumps(entry.value).encode('utf-8')
+        encoded = key.encode('utf-8')
+        fields = json.dumps(entry.fields).encode('utf-8')
+        record = RECORD.pack(len(encoded), len(fields), len(value),
+                entry.size, entry.stored, entry.expires, entry.stale_until,
+                flags) + encoded + fields + value
+        if len(record) > self.capacity:
+            return
+        key_hash = _hash(key)
+        with self._writing():
+            position = self._head()
+            if position % self.capacity + len(record) > self.capacity:
+                # Records do not wrap around the end of the ring
+                position += self.capacity - position % self.capacity
+            head = position + len(record)
+            # Readers see the records the new head passed as overwritten
+            struct.pack_into('<Q', self._map, HEAD_OFFSET, head)
+            start = self._ring + position % self.capacity
+            self._map[start:start + len(record)] = record
+            self._set_slot(self._victim(key, key_hash, head), key_hash,
+                           position, len(record))
+
+    def _victim(self, key, key_hash, head):
+        ''' Slot for key: its own, a free one, or the oldest of its probes '''
+        probes = self._probes(key_hash)
+        for index in probes:
+            found, position, length = self._slot(index)
+            if found == key_hash and length:
+                data = self._record(position, length)
+                if data is not None and self._key(data) == key:
+                    return index
+        oldest = None
+        for index in probes:
+            found, position, length = self._slot(index)
+            if not found or not length or not self._live(position, head):
+                return index
+            if oldest is None or position < oldest[1]:
+                oldest = (index, position)
+        return oldest[0]
+
+    def _remove(self, predicate):
+        ''' Free the slots of the live entries predicate holds for '''
+        removed = 0
+        with self._writing():
+            head = self._head()
+            for index in range(self.slots):
+                found, position, length = self._slot(index)
+                if not found or not length:
+                    continue
+                data = self._record(position, length) if\
+                    self._live(position, head) else None
+                if data is None or predicate(data):
+                    self._set_slot(index, 0, 0, 0)
+                    removed += data is not None
+        return removed
+
+    def _key(self, data):
+        return data[RECORD.size:RECORD.size + RECORD.unpack_from(data)[0]]\
+            .decode('utf-8')
+
+    def delete(self, key):
+        key_hash = _hash(key)
+        with self._writing():
+            for index in self._probes(key_hash):
+                found, position, length = self._slot(index)
+                if found == key_hash and length:
+                    data = self._record(position, length)
+                    if data is None or self._key(data) == key:
+                        self._set_slot(index, 0, 0, 0)
+
+    def clear(self):
+        self._remove(lambda data: True)
+
+    def purge(self, now):
+        ''' Drop the entries past their stale window, returning how many '''
+        return self._remove(lambda data: RECORD.unpack_from(data)[6] <= now)
+
+    def _records(self):
+        head = self._head()
+        for index in range(self.slots):
+            found, position, length = self._slot(index)
+            if found and length and self._live(position, head):
+                data = self._record(position, length)
+                if data is not None:
+                    yield data
+
+    def keys(self):
+        return [self._key(data) for data in self._records()]
+
+    def __len__(self):
+        return sum(1 for _ in self._records())
+
+    def size(self):
+        entries = nbytes = 0
+        for data in self._records():
+            entries += 1
+            nbytes += len(data)
+        return {'entries': entries, 'bytes': nbytes,
+                'capacity': self.capacity}
@@ -0,0 +1,198 @@
+'''
+Alternate-part finder ranking parts by similarity of their specs.
+
+A SimilarityIndex encodes the specs of every part as a feature vector over all
+spec keys: numeric specs by the midpoint of their value, on a log scale when
+positive and standardized per key so that keys of different units weigh
+alike, and string specs as codes compared for equality. Category uids are kept
+in an inverted index and compared by Jaccard distance.
+
+The distance of a part to a query is the Euclidean distance over the spec keys
+the query has, a part lacking a key counting as `missing` standard deviations
+away. It is computed one key at a time over all candidates at once, and the k
+closest are picked by numpy.argpartition(), so a query is linear in the number
+of candidates without sorting them. Candidates can first be narrowed to parts
+sharing a category with the query, or to those meeting SpecIndex conditions.
+
+This module requires numpy (`pip install pyoctopart[analysis]`).
+'''
+
+from collections import namedtuple
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from pyoctopart.table import _require_numpy
+from pyoctopart.specs import SpecIndex, spec_rows, _field, _interval
+
+
+Alternate = namedtuple('Alternate', 'part distance in_stock_quantity')
+
+
+def _stock(part):
+    ''' Total in-stock quantity of the offers of a part '''
+    return sum(_field(offer, 'in_stock_quantity') or 0
+            for offer in _field(part, 'offers') or [])
+
+
+class SimilarityIndex(object):
+    ''' Feature vectors of the specs and categories of parts '''
+
+    def __init__(self, parts, weights=None, category_weight=1.0,
+                 missing=2.0):
+        '''
+        param parts: Part objects or resources, with their specs normalized
+            by pyoctopart.units for values to compare across units.
+        param weights: optional weight of each spec key, 1 by default.
+        param category_weight: weight of the category Jaccard distance.
+        param missing: distance of a part lacking a spec key of the query.
+        '''
+        _require_numpy()
+        self.specs = SpecIndex.from_parts(parts)
+        self.parts = self.specs.parts
+        self.weights = weights or {}
+        self.category_weight = category_weight
+        self.missing = missing
+        self.uids = numpy.array([_field(part, 'uid') or ''
+                for part in self.parts], dtype=numpy.str_)
+        self.stock = numpy.array([_stock(part) for part in self.parts],
+                dtype=float)
+        self.numeric = {}
+        self.strings = {}
+        for key, column in self.specs.columns.items():
+            if column.numeric:
+                self._add_numeric(key, column)
+            else:
+                self._add_string(key, column)
+        self._add_categories()
+
+    def _add_numeric(self, key, column):
+        values = (column.low.astype(float) + column.high.astype(float)) / 2
+        log = bool(len(values)) and bool((values > 0).all())
+        if log:
+            values = numpy.log10(values)
+        mean = values.mean() if len(values) else 0.0
+        std = values.std() if len(values) else 0.0
+        std = std if std > 0 else 1.0
+        feature = numpy.full(len(self.parts), numpy.nan, dtype=numpy.float32)
+        feature[column.parts] = (values - mean) / std
+        self.numeric[key] = (feature, log, mean, std)
+
+    def _add_string(self, key, column):
+        vocabulary, codes = numpy.unique(column.low, return_inverse=True)
+        feature = numpy.full(len(self.parts), -1, dtype=numpy.int32)
+        feature[column.parts] = codes
+        self.strings[key] = (feature,
+                dict((value, code) for code, value in enumerate(vocabulary)))
+
+    def _add_categories(self):
+        # Inverted index: the parts of each category, as sorted arrays
+        members = {}
+        sizes = numpy.zeros(len(self.parts), dtype=numpy.int32)
+        for index, part in enumerate(self.parts):
+            uids = set(_field(part, 'category_uids') or [])
+            sizes[index] = len(uids)
+            for uid in uids:
+                members.setdefault(uid, []).append(index)
+        self.categories = dict((uid, numpy.array(indexes, dtype=numpy.int64))
+                for uid, indexes in members.items())
+        self.category_sizes = sizes
+
+    def __len__(self):
+        return len(self.parts)
+
+    def encode(self, part):
+        '''
+        Feature vector of any part against this index's keys.
+
+        returns: ({key: standardized value}, {key: string code},
+            set of category uids); keys unknown to the index are left out.
+        '''
+        numeric, strings = {}, {}
+        for key, datatype, _, value, min_value, max_value in spec_rows(part):
+            interval = _interval(datatype, value, min_value, max_value)
+            if interval is None:
+                continue
+            if key in self.numeric:
+                _, log, mean, std = self.numeric[key]
+                value = (float(interval[0]) + float(interval[1])) / 2
+                if log:
+                    if value <= 0:
+                        continue
+                    value = numpy.log10(value)
+                numeric[key] = (value - mean) / std
+            elif key in self.strings:
+                strings[key] = self.strings[key][1].get(interval[0], -2)
+        return numeric, strings, set(_field(part, 'category_uids') or [])
+
+    def candidates(self, categories=None, **conditions):
+        ''' Indexes of the parts sharing a category, meeting conditions '''
+        if categories is not None:
+            found = [self.categories[uid] for uid in categories
+                    if uid in self.categories]
+            ret = numpy.unique(numpy.concatenate(found)) if found else\
+                numpy.array([], dtype=numpy.int64)
+        else:
+            ret = numpy.arange(len(self.parts))
+        if conditions:
+            ret = numpy.intersect1d(ret, self.specs.query(**conditions),
+                    assume_unique=True)
+        return ret
+
+    def distances(self, part, candidates=None):
+        ''' Distance of the part to each candidate, all by default '''
+        numeric, strings, categories = self.encode(part)
+        if candidates is None:
+            candidates = numpy.arange(len(self.parts))
+        total = numpy.zeros(len(candidates))
+        missing = self.missing ** 2
+        for key, value in numeric.items():
+            diff = self.numeric[key][0][candidates] - value
+            total += self.weights.get(key, 1.0) * numpy.where(
+                    numpy.isnan(diff), missing, diff * diff)
+        for key, code in strings.items():
+            total += self.weights.get(key, 1.0) * missing * (
+                    self.strings[key][0][candidates] != code)
+        if categories and self.category_weight:
+            # Shared categories per candidate, from the inverted index
+            shared = numpy.zeros(len(self.parts), dtype=numpy.int32)
+            for uid in categories:
+                if uid in self.categories:
+                    shared[self.categories[uid]] += 1
+            shared = shared[candidates]
+            union = self.category_sizes[candidates] + len(categories) - shared
+            jaccard = 1.0 - shared / numpy.maximum(union, 1).astype(float)
+            total += (self.category_weight * jaccard) ** 2
+        return numpy.sqrt(total)
+
+    def alternates(self, part, k=10, same_category=True, in_stock=False,
+                   **conditions):
+        '''
+        The k parts closest to part, excluding parts of the same uid.
+
+        param part: Part object or resource, in the index or not.
+        param same_category: only consider parts sharing a category with
+            part, when it has any.
+        param in_stock: only consider parts with stock.
+        param conditions: SpecIndex.query() conditions candidates must meet.
+        returns: list of Alternate, closest first.
+        '''
+        categories = set(_field(part, 'category_uids') or [])
+        candidates = self.candidates(categories if same_category and
+                categories else None, **conditions)
+        keep = self.uids[candidates] != (_field(part, 'uid') or '')
+        if in_stock:
+            keep &= self.stock[candidates] > 0
+        candidates = candidates[keep]
+        if not len(candidates):
+            return []
+        distances = self.distances(part, candidates)
+        if k < len(candidates):
+            top = numpy.argpartition(distances, k)[:k]
+        else:
+            top = numpy.arange(len(candidates))
+        top = top[numpy.argsort(distances[top], kind='stable')]
+        return [Alternate(self.parts[candidates[pos]], float(distances[pos]),
+                          self.stock[candidates[pos]]) for pos in top]
@@ -0,0 +1,176 @@
+'''
+Memory-mapped snapshots of part catalogs.
+
+A snapshot file holds Part resources as compact JSON records, optionally
+compressed by a Codec, with an index of their uids sorted by a 64 bit hash.
+Opening a Snapshot maps the file and reads its fixed-size header only, in
+constant time whatever the size of the catalog; looking a part up by uid is a
+binary search of the mapped index, after which only that record is decoded and
+built into a Part, with its offers and specs. Pages of the file are loaded by
+the operating system as they are read, and shared by the processes mapping it.
+
+Layout, integers being little endian:
+
+    header   magic, format version, codec, part count, then the offset and
+             length of the records, codec dictionary, metadata and index
+    records  one per part
+    index    (uid hash, record offset, record length) per part, by hash
+
+The format version is bumped on incompatible changes, which readers refuse.
+Snapshots are written to a temporary file renamed over path, so that readers
+never see a partial snapshot.
+'''
+
+import os
+import mmap
+import json
+import struct
+import hashlib
+
+from pyoctopart.compression import Codec
+from pyoctopart.objects import Part
+from pyoctopart.util import dict_to_class
+
+
+MAGIC = b'PYOCSNAP'
+VERSION = 1
+# magic, version, codec, count, records, dictionary, metadata and index
+# offsets and lengths
+HEADER = struct.Struct('<8sIIQQQQQQQQQ')
+HEADER_SIZE = 128
+INDEX = struct.Struct('<QQQ')
+CODECS = {None: 0, 'zlib': 1, 'zstd': 2}
+
+
+def _hash(uid):
+    return struct.unpack('<Q', hashlib.sha1(uid.encode('utf-8'))
+                         .digest()[:8])[0]
+
+def _dumps(value):
+    return json.dumps(value, separators=(',', ':')).encode('utf-8')
+
+
+def write_snapshot(path, parts, codec=None, metadata=None):
+    '''
+    Write a snapshot of Part resources.
+
+    param parts: iterable of Part resource dictionaries, consumed once, so
+        that a catalog can be streamed from disk.
+    param codec: optional Codec compressing records, its dictionary being
+        kept in the snapshot.
+    param metadata: optional JSON encodable description of the snapshot.
+    returns: the number of parts written.
+    '''
+    index = []
+    temporary = '%s.%d.tmp' % (path, os.getpid())
+    with open(temporary, 'wb') as out:
+        out.write(b'\0' * HEADER_SIZE)
+        offset = HEADER_SIZE
+        for part in parts:
+            record = codec.encode(part) if codec else _dumps(part)
+            out.write(record)
+            index.append((_hash(part['uid']), offset, len(record)))
+            offset += len(record)
+        sections = [HEADER_SIZE, offset - HEADER_SIZE]
+        for data in (codec.dictionary if codec else None,
+                     _dumps(metadata) if metadata is not None else None):
+            out.write(data or b'')
+            sections += [offset, len(data or b'')]
+            offset += len(data or b'')
+        index.sort()
+        for entry in index:
+            out.write(INDEX.pack(*entry))
+        sections += [offset, len(index) * INDEX.size]
+        out.seek(0)
+        out.write(HEADER.pack(MAGIC, VERSION,
+                CODECS[codec.method if codec else None], len(index),
+                *sections))
+    os.rename(temporary, path)
+    return len(index)
+
+
+class Snapshot(object):
+    ''' Read-only view of a snapshot file, building parts as they are read '''
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as snapshot:
+            self._map = mmap.mmap(snapshot.fileno(), 0,
+                                  access=mmap.ACCESS_READ)
+        magic, self.version, codec, self.count, _, _, dictionary,\
+            dictionary_length, metadata, metadata_length, self._index, _\
+            = HEADER.unpack_from(self._map)
+        if magic != MAGIC:
+            raise ValueError('%s is not a snapshot' % path)
+        if self.version > VERSION:
+            raise ValueError('%s is a version %d snapshot, this version '
+                    'reads up to version %d' % (path, self.version, VERSION))
+        self.codec = None
+        if codec:
+            method = [name for name, code in CODECS.items()
+                      if code == codec][0]
+            self.codec = Codec(method, dictionary=self._map[
+                dictionary:dictionary + dictionary_length] or None)
+        self._metadata = (metadata, metadata_length)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self._map.close()
+
+    def __len__(self):
+        return self.count
+
+    def __contains__(self, uid):
+        return self.resource(uid) is not None
+
+    def __iter__(self):
+        ''' Parts of the snapshot, built one at a time '''
+        for pos in range(self.count):
+            yield dict_to_class(self._decode(pos), Part)
+
+    @property
+    def metadata(self):
+        offset, length = self._metadata
+        if not length:
+            return None
+        return json.loads(self._map[offset:offset + length].decode('utf-8'))
+
+    def _entry(self, pos):
+        return INDEX.unpack_from(self._map, self._index + pos * INDEX.size)
+
+    def _decode(self, pos):
+        _, offset, length = self._entry(pos)
+        record = self._map[offset:offset + length]
+        if self.codec is not None:
+            return self.codec.decode(record)
+        return json.loads(record.decode('utf-8'))
+
+    def resource(self, uid):
+        ''' The Part resource of uid, or None '''
+        key = _hash(uid)
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if self._entry(middle)[0] < key:
+                low = middle + 1
+            else:
+                high = middle
+        # Parts whose uids share a hash follow each other
+        while low < self.count and self._entry(low)[0] == key:
+            resource = self._decode(low)
+            if resource.get('uid') == uid:
+                return resource
+            low += 1
+        return None
+
+    def get(self, uid, default=None):
+        ''' The Part of uid, built from its record, or default '''
+        resource = self.resource(uid)
+        if resource is None:
+            return default
+        return dict_to_class(resource, Part)
@@ -0,0 +1,244 @@
+'''
+Columnar index of part specs, for local parametric queries.
+
+A SpecIndex holds one SpecColumn per spec key, typed after the key's
+SpecMetadata datatype: numeric columns keep each part's value as a (low,
+high) interval, taken from min_value and max_value when the spec is a range,
+sorted by low bound, so that a range query is one numpy.searchsorted() call
+followed by a mask over the candidates. String columns are sorted the same
+way and answer equality queries.
+
+Values are compared in the base unit of their spec: the canonical_value of
+specs normalized by pyoctopart.units when set, else their value as the API
+returns it. Query bounds may be quantities such as "4.7uF".
+
+This module requires numpy (`pip install pyoctopart[analysis]`).
+'''
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from pyoctopart.table import _require_numpy
+from pyoctopart.units import parse
+from .exceptions import ArgumentInvalidError
+
+
+DATATYPES = {'string': str, 'integer': int, 'decimal': float}
+
+
+def _field(resource, name):
+    if isinstance(resource, dict):
+        return resource.get(name)
+    return getattr(resource, name, None)
+
+def _datatype(metadata):
+    datatype = _field(metadata, 'datatype')
+    return DATATYPES.get(datatype, datatype)
+
+def _scalar(value):
+    ''' The API gives spec values as lists of strings '''
+    if isinstance(value, (list, tuple)):
+        value = value[0] if value else None
+    if value == '':
+        return None
+    return value
+
+def _bound(value, unit=None):
+    ''' Numeric query bound, parsing quantities such as "10uF" '''
+    if not isinstance(value, (str, type(u''))):
+        return value
+    quantity = parse(value, unit)
+    if quantity is None:
+        raise ArgumentInvalidError([value], [float], [])
+    return quantity[0]
+
+def _specs(part):
+    ''' (key, spec) pairs of a part, its specs being keyed by spec key '''
+    specs = _field(part, 'specs') or {}
+    if isinstance(specs, dict):
+        return specs.items()
+    return [(_field(_field(spec, 'metadata'), 'key'), spec) for spec in specs]
+
+def spec_rows(part):
+    '''
+    Yield the (key, datatype, unit symbol, value, min value, max value) of
+    each spec of a Part object or resource, values being canonical when set.
+    '''
+    for key, spec in _specs(part):
+        if key is None or spec is None:
+            continue
+        metadata = _field(spec, 'metadata')
+        value = _field(spec, 'canonical_value')
+        if value is None:
+            value = _scalar(_field(spec, 'value'))
+        yield (key, _datatype(metadata),
+               _field(_field(metadata, 'unit'), 'symbol'), value,
+               _scalar(_field(spec, 'min_value')),
+               _scalar(_field(spec, 'max_value')))
+
+def _interval(datatype, value, min_value, max_value):
+    ''' Typed (low, high) bounds of a spec value, or None if it has none '''
+    try:
+        if datatype in (int, float):
+            low = min_value if min_value is not None else value
+            high = max_value if max_value is not None else value
+            if low is None or high is None:
+                return None
+            return datatype(low), datatype(high)
+        if value is None:
+            return None
+        return str(value), str(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class SpecColumn(object):
+    ''' Typed, sorted values of one spec key across parts '''
+
+    def __init__(self, key, datatype, parts, low, high, unit=None):
+        '''
+        param parts: index of the part of each value in its SpecIndex.
+        param low, high: bounds of each value, equal for single values.
+        param unit: symbol of the unit of the values, if any.
+        '''
+        self.key = key
+        self.datatype = datatype
+        self.unit = unit
+        order = numpy.argsort(low, kind='stable')
+        self.parts = parts[order]
+        self.low = low[order]
+        self.high = high[order]
+
+    @classmethod
+    def build(cls, key, datatype, rows, unit=None):
+        ''' Build a column from (part, value, min value, max value) rows '''
+        parts, lows, highs = [], [], []
+        for part, value, min_value, max_value in rows:
+            interval = _interval(datatype, value, min_value, max_value)
+            if interval is not None:
+                parts.append(part)
+                lows.append(interval[0])
+                highs.append(interval[1])
+        dtype = {int: numpy.int64, float: numpy.float64}.get(datatype,
+                numpy.str_)
+        return cls(key, datatype, numpy.array(parts, dtype=numpy.int64),
+                numpy.array(lows, dtype=dtype),
+                numpy.array(highs, dtype=dtype), unit)
+
+    def __len__(self):
+        return len(self.parts)
+
+    @property
+    def numeric(self):
+        return self.datatype in (int, float)
+
+    def between(self, low=None, high=None):
+        '''
+        Parts whose whole value lies within [low, high]; either bound may be
+        None for an open range.
+
+        returns: array of part indexes, unordered.
+        '''
+        start = 0 if low is None else numpy.searchsorted(self.low, low, 'left')
+        stop = len(self) if high is None else\
+            numpy.searchsorted(self.low, high, 'right')
+        parts = self.parts[start:stop]
+        if high is not None:
+            parts = parts[self.high[start:stop] <= high]
+        return parts
+
+    def covers(self, low, high=None):
+        ''' Parts whose value range spans all of [low, high] '''
+        if high is None:
+            high = low
+        stop = numpy.searchsorted(self.low, low, 'right')
+        return self.parts[:stop][self.high[:stop] >= high]
+
+    def equals(self, values):
+        ''' Parts whose value is one of values '''
+        if isinstance(values, (str, int, float)):
+            values = [values]
+        ret = [self.parts[numpy.searchsorted(self.low, value, 'left'):
+                          numpy.searchsorted(self.low, value, 'right')]
+               for value in values]
+        if not ret:
+            return numpy.array([], dtype=numpy.int64)
+        return numpy.concatenate(ret)
+
+
+class SpecIndex(object):
+    ''' One SpecColumn per spec key of a list of parts '''
+
+    def __init__(self, parts, columns):
+        _require_numpy()
+        self.parts = parts
+        self.columns = columns
+
+    @classmethod
+    def from_parts(cls, parts):
+        '''
+        Index the specs of parts, given as Part objects or Part resource
+        dictionaries.
+        '''
+        _require_numpy()
+        parts = list(parts)
+        rows = {}
+        datatypes = {}
+        units = {}
+        for index, part in enumerate(parts):
+            for key, datatype, unit, value, min_value, max_value in\
+                    spec_rows(part):
+                datatypes.setdefault(key, datatype)
+                units.setdefault(key, unit)
+                rows.setdefault(key, []).append((index, value, min_value,
+                    max_value))
+        columns = dict((key, SpecColumn.build(key, datatypes[key], key_rows,
+                units[key])) for key, key_rows in rows.items())
+        return cls(parts, columns)
+
+    def __len__(self):
+        return len(self.parts)
+
+    def keys(self):
+        return sorted(self.columns)
+
+    def column(self, key):
+        if key not in self.columns:
+            raise ArgumentInvalidError([key], [str], self.keys())
+        return self.columns[key]
+
+    def query(self, **conditions):
+        '''
+        Parts matching every condition, given by spec key:
+
+            index.query(capacitance=(1e-6, 1e-5), voltage_rating_dc=(25, None),
+                        dielectric_characteristic=['X7R', 'X5R'])
+
+        A (low, high) pair of a numeric spec matches values within it, None
+        leaving a side open; other conditions match values equal to any of
+        theirs.
+
+        returns: sorted array of indexes into self.parts.
+        '''
+        # Intersect as boolean masks over parts, which is linear in the
+        # number of matches rather than a sort of them
+        ret = numpy.ones(len(self.parts), dtype=bool)
+        for key, condition in conditions.items():
+            column = self.column(key)
+            if column.numeric and isinstance(condition, tuple):
+                matches = column.between(*[_bound(value, column.unit)
+                    for value in condition])
+            elif column.numeric:
+                matches = column.equals(_bound(condition, column.unit))
+            else:
+                matches = column.equals(condition)
+            mask = numpy.zeros(len(self.parts), dtype=bool)
+            mask[matches] = True
+            ret &= mask
+        return numpy.flatnonzero(ret)
+
+    def select(self, **conditions):
+        ''' Parts matching every condition, see query() '''
+        return [self.parts[index] for index in self.query(**conditions)]
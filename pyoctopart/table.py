@@ -0,0 +1,226 @@
+'''
+Columnar offer tables, for vectorized analysis of large sets of offers.
+
+An OfferTable holds one numpy array per PartOffer field, with a row per offer,
+and the price breaks of all offers flattened into a second set of arrays
+pointing back at their offer's row. Quantities are floats so that absent
+values can be NaN, which never passes a comparison filter.
+
+This module requires numpy (`pip install pyoctopart[analysis]`).
+'''
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from .exceptions import ArgumentInvalidError
+
+
+def _require_numpy():
+    if numpy is None:
+        raise ImportError('numpy is required for offer tables, '
+                'install pyoctopart[analysis]')
+
+def _number(value):
+    if value is None:
+        return float('nan')
+    return float(value)
+
+def _dict_row(offer):
+    seller = offer.get('seller') or {}
+    return (seller.get('uid'), offer.get('sku'),
+            offer.get('in_stock_quantity'), offer.get('moq'),
+            offer.get('order_multiple'), offer.get('factory_lead_days'),
+            offer.get('is_authorized'), offer.get('prices'))
+
+def _object_row(offer):
+    seller = offer.seller
+    return (seller.uid if seller is not None else None, offer.sku,
+            offer.in_stock_quantity, offer.moq, offer.order_multiple,
+            offer.factory_lead_days, offer.is_authorized, offer.prices)
+
+
+class OfferTable(object):
+    ''' Offers of many parts, as one numpy array per field '''
+    columns = ('line', 'part', 'part_uid', 'seller_uid', 'sku',
+            'in_stock_quantity', 'moq', 'order_multiple', 'factory_lead_days',
+            'is_authorized')
+    break_columns = ('break_offer', 'break_currency', 'break_quantity',
+            'break_price')
+
+    def __init__(self, **arrays):
+        '''
+        Build a table out of its column arrays, see columns and
+        break_columns. Use the from_*() constructors rather than this one.
+
+        `line` is the index of the match result (query line) an offer was
+        returned for, or -1; `part` indexes the table's `parts` list.
+        '''
+        _require_numpy()
+        for name in self.columns + self.break_columns:
+            setattr(self, name, arrays[name])
+        self.parts = arrays.get('parts', [])
+        self.offers = arrays.get('offers', [])
+
+    @classmethod
+    def _build(cls, rows, parts, offers):
+        ''' Build a table from (line, part, part uid, offer row) tuples '''
+        _require_numpy()
+        cols = dict((name, []) for name in cls.columns + cls.break_columns)
+        for index, (line, part, part_uid, row) in enumerate(rows):
+            (seller_uid, sku, stock, moq, multiple, lead_days, authorized,
+                    prices) = row
+            cols['line'].append(line)
+            cols['part'].append(part)
+            cols['part_uid'].append(part_uid or '')
+            cols['seller_uid'].append(seller_uid or '')
+            cols['sku'].append(sku or '')
+            cols['in_stock_quantity'].append(_number(stock))
+            cols['moq'].append(_number(moq))
+            cols['order_multiple'].append(_number(multiple))
+            cols['factory_lead_days'].append(_number(lead_days))
+            cols['is_authorized'].append(bool(authorized))
+            for currency, breaks in (prices or {}).items():
+                for quantity, price in breaks:
+                    cols['break_offer'].append(index)
+                    cols['break_currency'].append(currency)
+                    cols['break_quantity'].append(quantity)
+                    cols['break_price'].append(float(price))
+        return cls(
+            line=numpy.array(cols['line'], dtype=numpy.int64),
+            part=numpy.array(cols['part'], dtype=numpy.int64),
+            part_uid=numpy.array(cols['part_uid'], dtype=numpy.str_),
+            seller_uid=numpy.array(cols['seller_uid'], dtype=numpy.str_),
+            sku=numpy.array(cols['sku'], dtype=numpy.str_),
+            in_stock_quantity=numpy.array(cols['in_stock_quantity']),
+            moq=numpy.array(cols['moq']),
+            order_multiple=numpy.array(cols['order_multiple']),
+            factory_lead_days=numpy.array(cols['factory_lead_days']),
+            is_authorized=numpy.array(cols['is_authorized'], dtype=bool),
+            break_offer=numpy.array(cols['break_offer'], dtype=numpy.int64),
+            break_currency=numpy.array(cols['break_currency'],
+                dtype=numpy.str_),
+            break_quantity=numpy.array(cols['break_quantity'],
+                dtype=numpy.int64),
+            break_price=numpy.array(cols['break_price']),
+            parts=parts, offers=offers)
+
+    @classmethod
+    def from_parts(cls, parts, lines=None):
+        '''
+        Tabulate the offers of a list of Part objects.
+
+        param lines: optional list giving the query line of each part.
+        '''
+        parts = list(parts)
+        offers = []
+        def rows():
+            for index, part in enumerate(parts):
+                line = lines[index] if lines is not None else -1
+                for offer in part.offers:
+                    offers.append(offer)
+                    yield line, index, part.uid, _object_row(offer)
+        return cls._build(rows(), parts, offers)
+
+    @classmethod
+    def from_response(cls, response):
+        ''' Tabulate the offers of a PartsMatchResponse object '''
+        parts = []
+        lines = []
+        for line, result in enumerate(response.results):
+            parts += result.items
+            lines += [line] * len(result.items)
+        return cls.from_parts(parts, lines)
+
+    @classmethod
+    def from_json(cls, resource):
+        '''
+        Tabulate offers straight from JSON, without building any object.
+
+        param resource: a parts_match response dictionary, or a list of
+            Part resource dictionaries.
+        '''
+        if isinstance(resource, dict):
+            items = [(line, part)
+                    for line, result in enumerate(resource.get('results', []))
+                    for part in result.get('items') or []]
+        else:
+            items = [(-1, part) for part in resource]
+        parts = [part for _, part in items]
+        offers = []
+        def rows():
+            for index, (line, part) in enumerate(items):
+                for offer in part.get('offers') or []:
+                    offers.append(offer)
+                    yield line, index, part.get('uid'), _dict_row(offer)
+        return cls._build(rows(), parts, offers)
+
+    def __len__(self):
+        return len(self.sku)
+
+    def where(self, authorized=None, sellers=None, min_stock=None,
+              max_lead_days=None):
+        ''' Boolean row mask of the offers meeting all given constraints '''
+        mask = numpy.ones(len(self), dtype=bool)
+        if authorized is not None:
+            mask &= self.is_authorized == authorized
+        if sellers is not None:
+            mask &= numpy.isin(self.seller_uid, list(sellers))
+        if min_stock is not None:
+            mask &= self.in_stock_quantity >= min_stock
+        if max_lead_days is not None:
+            mask &= self.factory_lead_days <= max_lead_days
+        return mask
+
+    def filter(self, mask):
+        ''' New table holding the rows selected by a boolean mask '''
+        mask = numpy.asarray(mask, dtype=bool)
+        arrays = dict((name, getattr(self, name)[mask])
+                for name in self.columns)
+        kept = mask[self.break_offer]
+        renumber = numpy.cumsum(mask) - 1
+        arrays['break_offer'] = renumber[self.break_offer[kept]]
+        for name in self.break_columns[1:]:
+            arrays[name] = getattr(self, name)[kept]
+        arrays['parts'] = self.parts
+        arrays['offers'] = [offer for offer, keep
+                in zip(self.offers, mask) if keep]
+        return self.__class__(**arrays)
+
+    def group_by(self, column):
+        ''' Distinct values of a column, and each row's index among them '''
+        return numpy.unique(getattr(self, column), return_inverse=True)
+
+    def aggregate(self, column, by, how='sum'):
+        '''
+        Aggregate a numeric column per distinct value of another, ignoring
+        absent (NaN) values.
+
+        param how: one of 'sum', 'count', 'mean', 'min' or 'max'.
+        returns: (keys, values) arrays.
+        '''
+        keys, inverse = self.group_by(by)
+        values = numpy.asarray(getattr(self, column), dtype=float)
+        valid = ~numpy.isnan(values)
+        inverse, values = inverse[valid], values[valid]
+        count = numpy.bincount(inverse, minlength=len(keys))
+        if how == 'count':
+            return keys, count
+        if how in ('sum', 'mean'):
+            total = numpy.bincount(inverse, weights=values,
+                    minlength=len(keys))
+            if how == 'sum':
+                return keys, total
+            with numpy.errstate(invalid='ignore', divide='ignore'):
+                return keys, total / count
+        if how not in ('min', 'max'):
+            raise ArgumentInvalidError(['how'], [str],
+                    ['sum', 'count', 'mean', 'min', 'max'])
+        ret = numpy.full(len(keys), numpy.nan)
+        if len(values):
+            order = numpy.argsort(inverse, kind='stable')
+            groups, starts = numpy.unique(inverse[order], return_index=True)
+            ufunc = numpy.minimum if how == 'min' else numpy.maximum
+            ret[groups] = ufunc.reduceat(values[order], starts)
+        return keys, ret
@@ -0,0 +1,170 @@
+'''
+SI prefix and unit normalization of spec values.
+
+parse() reads quantities such as "4.7 uF", "4700nF" or "0.0047mF" into their
+value in the base unit and that unit's symbol, here (4.7e-06, 'F'). Parsing is
+memoized per distinct (text, expected unit) pair, so that a column of a few
+thousand parts over a handful of distinct values only parses that handful.
+The memo keeps the MAX_PARSED most recently used pairs, so that its size stays
+bounded in processes going through whole catalogs.
+
+normalize_specs() stores the parsed value of a batch of specs next to each as
+canonical_value and canonical_unit, falling back to the value field, which the
+API already gives in the base unit, when display_value cannot be parsed.
+'''
+
+import re
+import threading
+from collections import OrderedDict
+
+from pyoctopart.fingerprint import _get
+
+
+OHM = u'\u03a9'
+CELSIUS = u'\u00b0C'
+FAHRENHEIT = u'\u00b0F'
+
+PREFIXES = {
+    'Y': 1e24, 'Z': 1e21, 'E': 1e18, 'P': 1e15, 'T': 1e12, 'G': 1e9,
+    'M': 1e6, 'k': 1e3, 'K': 1e3, 'h': 1e2, 'da': 1e1, 'd': 1e-1,
+    'c': 1e-2, 'm': 1e-3, 'u': 1e-6, u'\u00b5': 1e-6, u'\u03bc': 1e-6,
+    'n': 1e-9, 'p': 1e-12, 'f': 1e-15, 'a': 1e-18, 'z': 1e-21, 'y': 1e-24,
+}
+
+# Spellings of units, mapped to their canonical symbol
+UNITS = {
+    'F': 'F', 'H': 'H', 'V': 'V', 'A': 'A', 'W': 'W', 'Hz': 'Hz',
+    's': 's', 'm': 'm', 'g': 'g', 'K': 'K', 'Pa': 'Pa', 'J': 'J',
+    'S': 'S', 'T': 'T', 'C': 'C', 'Wh': 'Wh', 'Ah': 'Ah', 'VA': 'VA',
+    'B': 'B', 'bit': 'bit', 'bps': 'bps', 'lm': 'lm', 'cd': 'cd',
+    'lx': 'lx', 'dB': 'dB', 'dBm': 'dBm', '%': '%', 'ppm': 'ppm',
+    OHM: OHM, u'\u2126': OHM, 'ohm': OHM, 'Ohm': OHM, 'ohms': OHM,
+    'Ohms': OHM, 'R': OHM, CELSIUS: CELSIUS, 'degC': CELSIUS,
+    FAHRENHEIT: FAHRENHEIT, 'degF': FAHRENHEIT,
+}
+
+# Units that take no prefix
+UNPREFIXED = set(['%', 'ppm', 'dB', 'dBm', CELSIUS, FAHRENHEIT])
+
+QUANTITY = re.compile(r'^\s*([-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)\s*'
+        r'(\S*?)\s*$', re.UNICODE)
+
+# Most recently used parse() results, kept last
+MAX_PARSED = 65536
+_PARSED = OrderedDict()
+_PARSED_LOCK = threading.Lock()
+_MISSING = object()
+
+
+def _unit(symbol, expected=None):
+    ''' Split a unit symbol into (factor, canonical unit), or None '''
+    if not symbol:
+        return 1.0, UNITS.get(expected, expected)
+    # A whole symbol matching a unit wins over a prefix: "m" is metres and
+    # "Pa" pascals, unless the spec's own unit says otherwise.
+    candidates = []
+    if symbol in UNITS:
+        candidates.append((1.0, UNITS[symbol]))
+    for length in (2, 1):
+        prefix, rest = symbol[:length], symbol[length:]
+        if prefix in PREFIXES and rest in UNITS and\
+                UNITS[rest] not in UNPREFIXED:
+            candidates.append((PREFIXES[prefix], UNITS[rest]))
+    if symbol in PREFIXES and expected:
+        candidates.append((PREFIXES[symbol], UNITS.get(expected, expected)))
+    if not candidates:
+        return None
+    if expected:
+        expected = UNITS.get(expected, expected)
+        for candidate in candidates:
+            if candidate[1] == expected:
+                return candidate
+    return candidates[0]
+
+def parse(text, unit=None):
+    '''
+    Parse a quantity into its value in the base unit.
+
+    param text: quantity such as "4.7 uF", "10k" or "0.1".
+    param unit: optional symbol of the expected unit, as given by the spec's
+        UnitOfMeasurement, which settles ambiguous symbols and bare prefixes.
+    returns: (value, unit symbol), or None if text is no quantity.
+    '''
+    key = (text, unit)
+    with _PARSED_LOCK:
+        ret = _PARSED.pop(key, _MISSING)
+        if ret is not _MISSING:
+            _PARSED[key] = ret
+            return ret
+    ret = None
+    match = QUANTITY.match(text) if text else None
+    if match is not None:
+        factor = _unit(match.group(2), unit)
+        if factor is not None:
+            ret = (float(match.group(1)) * factor[0], factor[1])
+    with _PARSED_LOCK:
+        _PARSED[key] = ret
+        while len(_PARSED) > MAX_PARSED:
+            _PARSED.popitem(last=False)
+    return ret
+
+def parse_many(texts, unit=None):
+    ''' parse() a column of quantities, parsing distinct values once '''
+    distinct = dict((text, parse(text, unit)) for text in set(texts))
+    return [distinct[text] for text in texts]
+
+def _unit_symbol(spec):
+    unit = _get(_get(spec, 'metadata'), 'unit')
+    return _get(unit, 'symbol') if unit is not None else None
+
+def _value(spec):
+    value = _get(spec, 'value')
+    if isinstance(value, (list, tuple)):
+        value = value[0] if value else None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+def normalize_specs(specs):
+    '''
+    Store the canonical value and unit of a batch of specs next to each, as
+    canonical_value and canonical_unit attributes of SpecValue objects or
+    keys of SpecValue resources.
+
+    param specs: SpecValue objects or resources, or a part's specs keyed
+        by spec key.
+    returns: list of the canonical values.
+    '''
+    if isinstance(specs, dict):
+        specs = specs.values()
+    specs = list(specs)
+    groups = {}
+    for pos, spec in enumerate(specs):
+        groups.setdefault(_unit_symbol(spec), []).append(pos)
+    ret = [None] * len(specs)
+    for unit, positions in groups.items():
+        parsed = parse_many([_get(specs[pos], 'display_value')
+                for pos in positions], unit)
+        for pos, quantity in zip(positions, parsed):
+            spec = specs[pos]
+            if quantity is None:
+                value = _value(spec)
+                quantity = (value, UNITS.get(unit, unit)) \
+                        if value is not None else (None, None)
+            if isinstance(spec, dict):
+                spec['canonical_value'], spec['canonical_unit'] = quantity
+            else:
+                spec.canonical_value, spec.canonical_unit = quantity
+            ret[pos] = quantity[0]
+    return ret
+
+def normalize_parts(parts):
+    ''' normalize_specs() over the specs of all of parts at once '''
+    specs = []
+    for part in parts:
+        part_specs = _get(part, 'specs') or {}
+        if isinstance(part_specs, dict):
+            part_specs = part_specs.values()
+        specs += part_specs
+    return normalize_specs(specs)
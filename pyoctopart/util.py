@@ -2,8 +2,17 @@
 Utility features
 '''
 
+import functools
+
+from pyoctopart.exceptions import TypeArgumentError
+
 
 APIOBJECTS = {}
+CONSTRUCTORS = {}
+
+# Hashes cached on objects are only reused by an interpreter sharing the same
+# string hash seed, so that pickled copies never carry a foreign hash around.
+HASH_SALT = hash(__name__)
 
 # pylint: disable=star-args, too-few-public-methods
 class Curry(object):
@@ -22,23 +31,44 @@ class Curry(object):
 
         return self.fun(*(self.pending + args), **kw_copy)
 
-def dict_to_class(obj, cls=None):
-    ''' Check if obj is an instance of cls, instantiate it otherwise '''
-    global APIOBJECTS
-    if cls is None:
-        cls = APIOBJECTS[obj['__class__']]
-    if not isinstance(obj, cls):
-        return cls.new_from_dict(obj)
-    return obj
+def _constructor(tag, cls=None):
+    ''' Resolve a __class__ tag to a constructor, falling back to cls '''
+    build = CONSTRUCTORS.get(tag)
+    if build is None and cls is not None:
+        build = cls.new_from_dict
+    return build
 
-def list_to_class(objects, cls=None):
-    ''' Given a list of dicts, instantiate them each as cls '''
-    global APIOBJECTS
-    if cls is None:
-        cls = APIOBJECTS[objects[0]['__class__']]
+def dict_to_class(obj, cls=None, **kwargs):
+    '''
+    Instantiate a JSON resource as the API class its __class__ tag names, or
+    as cls when the tag is unknown. Objects that are already instantiated,
+    null values and untagged data are returned as is. Extra keyword
+    arguments are passed on to new_from_dict().
+    '''
+    if not isinstance(obj, dict):
+        return obj
+    build = _constructor(obj.get('__class__'), cls)
+    if build is None:
+        return obj
+    return build(obj, **kwargs)
+
+def list_to_class(objects, cls=None, **kwargs):
+    ''' Given a list of dicts, instantiate them each as dict_to_class does '''
+    if isinstance(objects, dict):
+        # Iterating would build the keys of the mapping, not its resources
+        raise TypeArgumentError(['objects'], [list], [])
+    if not objects:
+        return []
+    tag = build = None
     ret = []
     for obj in objects:
-        obj = dict_to_class(obj, cls)
+        if isinstance(obj, dict):
+            # Lists are nearly always homogeneous: resolve once per tag run
+            if build is None or obj.get('__class__') != tag:
+                tag = obj.get('__class__')
+                build = _constructor(tag, cls)
+            if build is not None:
+                obj = build(obj, **kwargs)
         ret.append(obj)
     return ret
 
@@ -47,8 +77,130 @@ def select(param, obj):
     return {key: val for key, val in obj.items() if param in key}
 
 def api_object(cls):
-    ''' Decorator for API objects that can be converted from dicts '''
+    '''
+    Decorator for API objects that can be converted from dicts, giving them
+    to_dict(), from_dict() and pickling by their public attributes.
+    '''
     global APIOBJECTS
     APIOBJECTS[cls.__name__] = cls
+    CONSTRUCTORS[cls.__name__] = cls.new_from_dict
+    for name, method in (('to_dict', _to_dict),
+                         ('from_dict', classmethod(_from_dict)),
+                         ('__reduce__', _reduce)):
+        if name not in vars(cls):
+            setattr(cls, name, method)
     return cls
 
+
+# Single-key dicts standing for values JSON and msgpack have no type for
+DATATYPES = {'string': str, 'integer': int, 'decimal': float}
+ESCAPES = ('__dict__', '__tuple__', '__set__', '__frozenset__', '__type__')
+
+def _state(obj):
+    ''' Public attributes of an object, leaving out cached hashes '''
+    return dict((key, val) for key, val in obj.__dict__.items()
+                if not key.startswith('_'))
+
+def _encode(value):
+    ''' JSON encodable form of a value holding API objects '''
+    if APIOBJECTS.get(value.__class__.__name__) is value.__class__:
+        return value.to_dict()
+    if isinstance(value, list):
+        return [_encode(val) for val in value]
+    if isinstance(value, dict):
+        ret = dict((key, _encode(val)) for key, val in value.items())
+        # Raw resources kept by objects must not be read back as objects
+        if '__class__' in value or (len(value) == 1 and
+                                    next(iter(value)) in ESCAPES):
+            return {'__dict__': [[key, val] for key, val in ret.items()]}
+        return ret
+    if isinstance(value, tuple):
+        return {'__tuple__': [_encode(val) for val in value]}
+    if isinstance(value, (set, frozenset)):
+        return {'__%s__' % value.__class__.__name__:
+                [_encode(val) for val in value]}
+    if isinstance(value, type):
+        return {'__type__': [name for name, datatype in DATATYPES.items()
+                             if datatype is value][0]}
+    return value
+
+def _rebuild(cls, state):
+    ''' An object of cls with state as attributes, without new_from_dict '''
+    obj = cls.__new__(cls)
+    obj.__dict__.update(state)
+    return obj
+
+def _revive(value):
+    '''
+    The value a dict from _encode() stands for, its own values being decoded
+    already, as msgpack object hooks are called.
+    '''
+    tag = value.get('__class__')
+    if tag is not None:
+        cls = APIOBJECTS.get(tag)
+        if cls is None:
+            return value
+        del value['__class__']
+        return _rebuild(cls, value)
+    if len(value) == 1:
+        key, payload = next(iter(value.items()))
+        if key == '__dict__':
+            return dict(payload)
+        if key == '__tuple__':
+            return tuple(payload)
+        if key == '__set__':
+            return set(payload)
+        if key == '__frozenset__':
+            return frozenset(payload)
+        if key == '__type__':
+            return DATATYPES[payload]
+    return value
+
+def _decode(value):
+    ''' The value of the JSON encodable form from _encode() '''
+    if isinstance(value, list):
+        return [_decode(val) for val in value]
+    if isinstance(value, dict):
+        return _revive(dict((key, _decode(val)) for key, val in value.items()))
+    return value
+
+def _to_dict(self):
+    '''
+    Lossless JSON encodable form of the object, tagged by its class as API
+    resources are, read back by from_dict(). Unlike the resource the object
+    was built from, it holds the object's attributes as they are, and may be
+    turned back into the object without validation.
+    '''
+    state = dict((key, _encode(val)) for key, val in _state(self).items())
+    state['__class__'] = self.__class__.__name__
+    return state
+
+def _from_dict(cls, state):
+    ''' The object of a dict from to_dict() '''
+    if state.get('__class__') != cls.__name__:
+        raise TypeArgumentError(['__class__'], [str], [cls.__name__])
+    return _decode(state)
+
+def _reduce(self):
+    return (_rebuild, (self.__class__, _state(self)))
+
+
+def freeze(value):
+    ''' Recursively convert lists and dicts into hashable equivalents '''
+    if isinstance(value, dict):
+        return frozenset((key, freeze(val)) for key, val in value.items())
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(val) for val in value)
+    return value
+
+def cached_hash(fun):
+    ''' Decorator computing an object's __hash__ once and caching it '''
+    @functools.wraps(fun)
+    def wrapper(self):
+        cached = self.__dict__.get('_hash')
+        if cached is not None and cached[0] == HASH_SALT:
+            return cached[1]
+        ret = fun(self)
+        self.__dict__['_hash'] = (HASH_SALT, ret)
+        return ret
+    return wrapper
@@ -0,0 +1,238 @@
+'''
+Cache warming from BOM files and watchlists.
+
+warm() preloads the cache of a client with parts_match() results for MPN/brand
+queries, in batches of up to 20 queries per call as the API allows, and with
+the parts of part uids, fetched in batches as well by parts_get_multi() and
+cached as parts_get() looks them up. Calls are spaced to stay under a rate,
+and queries already cached are answered by the cache without calling the API,
+so a warm-up run only spends quota on what is missing or expired. Uids that
+are not hexadecimal, as Octopart uids are, are skipped and reported, as are
+batches the API answered with an error, the next batch being sent anyway.
+
+read_items() reads queries and uids from CSV lines: with a header naming mpn,
+brand, sku or uid columns, or else one MPN per line, optionally followed by a
+brand. Lines starting with '#' are skipped.
+
+The pyoctopart-warm command warms an on-disk cache from such files:
+
+    pyoctopart-warm --apikey KEY --cache octopart.sqlite bom.csv watchlist.csv
+'''
+
+import os
+import csv
+import sys
+import time
+import argparse
+from collections import namedtuple
+
+from pyoctopart.cache import UID
+from pyoctopart.responses import PartsMatchResponse
+
+MAX_QUERIES = 20
+
+WarmReport = namedtuple('WarmReport', 'queries uids matched missing calls '
+                        'seconds invalid failed')
+
+
+def read_items(lines):
+    '''
+    Queries and uids listed by CSV lines.
+
+    returns: (list of parts_match query dicts, list of uids).
+    '''
+    rows = [row for row in csv.reader(line for line in lines
+            if line.strip() and not line.lstrip().startswith('#')) if row]
+    queries, uids = [], []
+    if not rows:
+        return queries, uids
+    header = [column.strip().lower() for column in rows[0]]
+    if set(header) & set(['mpn', 'brand', 'sku', 'uid']):
+        rows = [dict(zip(header, row)) for row in rows[1:]]
+    else:
+        rows = [dict(zip(['mpn', 'brand'], row)) for row in rows]
+    for row in rows:
+        row = dict((key, value.strip()) for key, value in row.items()
+                if key in ('mpn', 'brand', 'sku', 'uid') and value.strip())
+        if 'uid' in row:
+            uids.append(row['uid'])
+        elif 'mpn' in row or 'sku' in row:
+            queries.append(row)
+    return queries, uids
+
+
+class _Limiter(object):
+    ''' Spaces calls to at most rate per second '''
+
+    def __init__(self, rate, clock, sleep):
+        self.interval = 1.0 / rate if rate else 0.0
+        self.clock = clock
+        self.sleep = sleep
+        self.last = self.previous = None
+
+    def wait(self):
+        if self.interval and self.last is not None:
+            delay = self.last + self.interval - self.clock()
+            if delay > 0:
+                self.sleep(delay)
+        self.previous, self.last = self.last, self.clock()
+
+    def refund(self):
+        ''' Forget the last call, which the cache answered '''
+        self.last = self.previous
+
+
+def _calls(client):
+    if client.cache is None:
+        return None
+    network = client.cache.metrics['network']
+    return network.hits + network.misses
+
+
+def warm(client, queries=(), uids=(), batch_size=MAX_QUERIES, rate=None,
+         progress=None, clock=time.time, sleep=time.sleep, **show_hide):
+    '''
+    Fill the cache of client with the responses to queries and uids.
+
+    param client: Octopart client, with the cache to fill.
+    param queries: parts_match query dicts, such as {'mpn': 'SN74S74N'}.
+    param uids: part uids, such as '721abb1d3046addd'.
+    param batch_size: queries or uids per call, at most 20.
+    param rate: optional maximum number of calls per second.
+    param progress: optional function called with (done, total, calls)
+        after every call, calls being the number of API calls spent so far.
+    param show_hide: include/show/hide arguments of the calls, which must
+        match those the cached responses are then looked up with.
+    returns: WarmReport of the numbers of queries and uids warmed, of those
+        found and missing, of API calls spent and of seconds taken, the
+        list of the invalid uids skipped, and the list of (batch, reply) of
+        the batches of queries or uids not answered, reply being the error
+        the API answered with.
+    '''
+    batch_size = max(1, min(batch_size, MAX_QUERIES))
+    queries = list(queries)
+    valid, invalid = [], []
+    for uid in uids:
+        uid = str(uid).strip()
+        if UID.match(uid):
+            valid.append(uid)
+        else:
+            invalid.append(uid)
+    uids = valid
+    limiter = _Limiter(rate, clock, sleep)
+    start = clock()
+    first = _calls(client)
+    total = len(queries) + len(uids)
+    done = matched = missing = sent = 0
+    failed = []
+
+    def spent():
+        calls = _calls(client)
+        return sent if calls is None else calls - first
+
+    def called(before):
+        if before is not None and _calls(client) == before:
+            limiter.refund()
+
+    for pos in range(0, len(queries), batch_size):
+        batch = queries[pos:pos + batch_size]
+        before = _calls(client)
+        limiter.wait()
+        response = client.parts_match(batch, **show_hide)
+        called(before)
+        sent += 1
+        if isinstance(response, PartsMatchResponse):
+            for result in response.results:
+                if result.hits:
+                    matched += 1
+                else:
+                    missing += 1
+        else:
+            failed.append((batch, response))
+        done += len(batch)
+        if progress is not None:
+            progress(done, total, spent())
+    for pos in range(0, len(uids), batch_size):
+        batch = uids[pos:pos + batch_size]
+        before = _calls(client)
+        limiter.wait()
+        parts = client.parts_get_multi(batch, **show_hide)
+        called(before)
+        sent += 1
+        if isinstance(parts, dict):
+            matched += len(parts)
+            missing += len(batch) - len(parts)
+        else:
+            failed.append((batch, parts))
+        done += len(batch)
+        if progress is not None:
+            progress(done, total, spent())
+    return WarmReport(len(queries), len(uids), matched, missing, spent(),
+                      clock() - start, invalid, failed)
+
+
+def main(argv=None):
+    ''' pyoctopart-warm command '''
+    # Imported here, so that reading items does not need requests
+    from pyoctopart.octopart import Octopart
+    from pyoctopart.cache import ResponseCache, DiskStore
+
+    parser = argparse.ArgumentParser(prog='pyoctopart-warm',
+            description='Preload an on-disk Octopart response cache with '
+                        'the parts of BOM files and watchlists.')
+    parser.add_argument('files', nargs='*',
+            help='CSV files of mpn/brand queries or uids, stdin by default')
+    parser.add_argument('--apikey', default=os.environ.get('OCTOPART_APIKEY'),
+            help='Octopart API key, $OCTOPART_APIKEY by default')
+    parser.add_argument('--cache', required=True,
+            help='path of the SQLite cache database')
+    parser.add_argument('--ttl', type=int, default=24 * 3600,
+            help='seconds responses are kept for')
+    parser.add_argument('--rate', type=float, default=3.0,
+            help='maximum API calls per second')
+    parser.add_argument('--batch-size', type=int, default=MAX_QUERIES,
+            help='queries per parts_match call, at most 20')
+    parser.add_argument('--include', action='append', default=[],
+            metavar='FIELD',
+            help='include[] directive of the calls, such as specs')
+    parser.add_argument('--quiet', action='store_true',
+            help='do not report progress')
+    args = parser.parse_args(argv)
+
+    queries, uids = [], []
+    for path in args.files or ['-']:
+        if path == '-':
+            found = read_items(sys.stdin)
+        else:
+            with open(path) as lines:
+                found = read_items(lines)
+        queries.extend(found[0])
+        uids.extend(found[1])
+
+    def progress(done, total, calls):
+        sys.stderr.write('\r%d/%d warmed, %d API calls' % (done, total,
+                                                           calls))
+        sys.stderr.flush()
+
+    store = DiskStore(args.cache)
+    client = Octopart(apikey=args.apikey,
+            cache=ResponseCache(ttl=args.ttl, tiers=[store]))
+    report = warm(client, queries, uids, batch_size=args.batch_size,
+            rate=args.rate, progress=None if args.quiet else progress,
+            **dict(('include_' + field, True) for field in args.include))
+    store.close()
+    if not args.quiet:
+        sys.stderr.write('\n')
+    print('%d queries and %d uids warmed in %.1fs: %d found, %d missing, '
+          '%d API calls' % (report.queries, report.uids, report.seconds,
+                            report.matched, report.missing, report.calls))
+    if report.invalid:
+        print('%d invalid uids skipped: %s' % (len(report.invalid),
+                                               ', '.join(report.invalid)))
+    for batch, reply in report.failed:
+        print('batch of %d not warmed: %s' % (len(batch), reply))
+    return 0 if not report.failed else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -24,6 +24,14 @@ setup(name='pyoctopart',
           'requests',
           'setuptools',
       ],
+      extras_require={
+          'analysis': ['numpy'],
+          'zstd': ['zstandard'],
+          'msgpack': ['msgpack'],
+      },
+      entry_points={
+          'console_scripts': ['pyoctopart-warm = pyoctopart.warm:main'],
+      },
       )
 
 if "install" in sys.argv:
@@ -0,0 +1,77 @@
+"""
+Sample APIv3 JSON resources used by the offline unit tests.
+"""
+
+def seller(uid='459', name='Digi-Key'):
+    return {'__class__': 'Seller', 'uid': uid, 'name': name,
+            'homepage_url': 'http://www.digikey.com', 'display_flag': 'US',
+            'has_ecommerce': True}
+
+def manufacturer(uid='2c3be9310496fffc', name='Texas Instruments'):
+    return {'__class__': 'Manufacturer', 'uid': uid, 'name': name,
+            'homepage_url': 'http://www.ti.com'}
+
+def brand(uid='2c3be9310496fffc', name='Texas Instruments'):
+    return {'__class__': 'Brand', 'uid': uid, 'name': name,
+            'homepage_url': 'http://www.ti.com'}
+
+def offer(sku='296-1234-ND', seller_uid='459', seller_name='Digi-Key',
+          prices=None, in_stock_quantity=100, moq=1, order_multiple=1,
+          factory_lead_days=42, is_authorized=True):
+    if prices is None:
+        prices = {'USD': [[1, '0.50'], [10, '0.40'], [100, '0.30']]}
+    return {'__class__': 'PartOffer', 'sku': sku,
+            'seller': seller(seller_uid, seller_name),
+            'eligible_region': 'US', 'product_url': 'http://example.com/',
+            'octopart_rfq_url': None, 'prices': prices,
+            'in_stock_quantity': in_stock_quantity, 'on_order_quantity': 0,
+            'on_order_eta': None, 'factory_lead_days': factory_lead_days,
+            'factory_order_multiple': None, 'order_multiple': order_multiple,
+            'moq': moq, 'packaging': 'Cut Tape', 'is_authorized': is_authorized,
+            'last_updated': '2016-01-01T00:00:00Z'}
+
+def spec(key='capacitance', value='0.0000047', display_value='4.7 µF',
+         datatype='decimal', unit_symbol='F', unit_name='farads'):
+    return {'__class__': 'SpecValue', 'value': [value],
+            'display_value': display_value, 'min_value': None,
+            'max_value': None, 'attribution': None,
+            'metadata': {'__class__': 'SpecMetadata', 'key': key,
+                         'name': key.replace('_', ' ').title(),
+                         'datatype': datatype,
+                         'unit': {'__class__': 'UnitOfMeasurement',
+                                  'name': unit_name,
+                                  'symbol': unit_symbol}}}
+
+def specs(*values):
+    ''' Specs keyed by spec key, as the API returns them '''
+    return dict((spec['metadata']['key'], spec) for spec in values)
+
+def part(uid='721abb1d3046addd', mpn='SN74S74N', offers=None, specs=None,
+         **kwargs):
+    if offers is None:
+        offers = [offer()]
+    ret = {'__class__': 'Part', 'uid': uid, 'mpn': mpn,
+           'manufacturer': manufacturer(), 'brand': brand(),
+           'octopart_url': 'http://octopart.com/%s' % mpn.lower(),
+           'offers': offers, 'broker_listings': []}
+    if specs is not None:
+        ret['specs'] = specs
+    ret.update(kwargs)
+    return ret
+
+def match_result(items, reference=None):
+    return {'__class__': 'PartsMatchResult', 'items': items,
+            'hits': len(items), 'reference': reference, 'error': None}
+
+def match_query(mpn, reference=None):
+    return {'__class__': 'PartsMatchQuery', 'q': '', 'mpn': mpn,
+            'brand': None, 'sku': None, 'seller': None, 'mpn_or_sku': None,
+            'start': 0, 'limit': 3, 'reference': reference}
+
+def match_response(results, queries=None):
+    if queries is None:
+        queries = [match_query('SN74S74N') for _ in results]
+    return {'__class__': 'PartsMatchResponse',
+            'request': {'__class__': 'PartsMatchRequest',
+                        'queries': queries, 'exact_only': False},
+            'results': results, 'msec': 42}
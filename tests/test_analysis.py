@@ -0,0 +1,498 @@
+"""
+Offline unit tests for the vectorized analysis helpers.
+"""
+
+import os
+import json
+import random
+import itertools
+import tempfile
+import unittest
+
+import numpy
+
+import samples
+
+from pyoctopart.util import dict_to_class
+from pyoctopart.objects import Part, PartOffer
+from pyoctopart.table import OfferTable
+from pyoctopart.pricing import PriceIndex, offer_price
+from pyoctopart.bom import cost_bom, allocate_bom, _split, _price
+from pyoctopart.currency import RateTable
+from pyoctopart.specs import SpecIndex
+from pyoctopart.similarity import SimilarityIndex
+from pyoctopart.ranking import (rank_offers, effective_price, lead_time, stock,
+        descending)
+from pyoctopart.units import parse, parse_many, normalize_specs, normalize_parts
+from pyoctopart import units
+from pyoctopart.exceptions import ArgumentInvalidError
+
+
+def bom_response():
+    return samples.match_response([
+        samples.match_result([samples.part(offers=[
+            samples.offer(),
+            samples.offer(sku='595-SN74S74N', seller_uid='2',
+                seller_name='Mouser', in_stock_quantity=None,
+                prices={'USD': [[1, '0.45'], [50, '0.35']],
+                        'EUR': [[1, '0.41']]},
+                is_authorized=False)])]),
+        samples.match_result([samples.part(uid='b', mpn='LM358', offers=[
+            samples.offer(sku='LM358-ND', in_stock_quantity=5000,
+                prices={'USD': [[1, '0.20'], [1000, '0.08']]}, moq=10,
+                order_multiple=10, factory_lead_days=84)])]),
+    ])
+
+
+class OfferTableTest(unittest.TestCase):
+
+    def test_json_and_objects_agree(self):
+        resource = bom_response()
+        raw = OfferTable.from_json(resource)
+        built = OfferTable.from_response(dict_to_class(resource))
+        assert len(raw) == len(built) == 3
+        for name in OfferTable.columns + OfferTable.break_columns:
+            numpy.testing.assert_array_equal(getattr(raw, name),
+                                             getattr(built, name))
+        assert list(raw.line) == [0, 0, 1]
+        assert list(raw.seller_uid) == ['459', '2', '459']
+        assert numpy.isnan(raw.in_stock_quantity[1])
+        assert len(raw.break_price) == 8
+
+    def test_filter(self):
+        table = OfferTable.from_json(bom_response())
+        mask = table.where(authorized=True, min_stock=50)
+        assert list(mask) == [True, False, True]
+        subset = table.filter(mask)
+        assert list(subset.sku) == ['296-1234-ND', 'LM358-ND']
+        assert list(subset.break_offer) == [0, 0, 0, 1, 1]
+        assert subset.offers[1]['sku'] == 'LM358-ND'
+
+    def test_aggregate(self):
+        table = OfferTable.from_json(bom_response())
+        keys, stock = table.aggregate('in_stock_quantity', 'seller_uid')
+        assert list(keys) == ['2', '459']
+        assert list(stock) == [0, 5100]
+        keys, lead = table.aggregate('factory_lead_days', 'part_uid', 'max')
+        assert list(lead) == [42, 84]
+
+
+class PricingTest(unittest.TestCase):
+
+    def test_offer_price(self):
+        offer = PartOffer.new_from_dict(samples.offer(moq=5, order_multiple=5))
+        assert offer_price(offer, 1) == (5, 0.5, 2.5)
+        assert offer_price(offer, 12) == (15, 0.4, 6.0)
+        assert offer_price(offer, 12, 'EUR') is None
+
+    def test_index_matches_scalar(self):
+        resource = bom_response()
+        table = OfferTable.from_json(resource)
+        index = PriceIndex(table)
+        offers = [PartOffer.new_from_dict(offer) for offer in table.offers]
+        quantities = numpy.array([1, 7, 49, 50, 99, 100, 5000])
+        ordered, unit, extended = index.evaluate(
+                numpy.arange(len(table))[:, None], quantities[None, :])
+        assert unit.shape == (3, 7)
+        for row, offer in enumerate(offers):
+            for col, quantity in enumerate(quantities):
+                expected = offer_price(offer, int(quantity))
+                assert ordered[row, col] == expected[0]
+                assert abs(unit[row, col] - expected[1]) < 1e-12
+                assert abs(extended[row, col] - expected[2]) < 1e-9
+
+    def test_missing_currency(self):
+        table = OfferTable.from_json(bom_response())
+        unit = PriceIndex(table, 'EUR').unit_price([0, 1, 2], 10)
+        assert numpy.isnan(unit[0]) and unit[1] == 0.41
+        assert numpy.isnan(unit[2])
+
+
+class BomTest(unittest.TestCase):
+
+    def test_cheapest_offer(self):
+        cost = cost_bom(bom_response(), [60, 100])
+        assert cost.lines[0].sku == '595-SN74S74N'
+        assert cost.lines[0].extended_price == 60 * 0.35
+        assert cost.lines[1].sku == 'LM358-ND'
+        assert abs(cost.total - (21.0 + 20.0)) < 1e-9
+        assert cost.missing == []
+
+    def test_constraints(self):
+        cost = cost_bom(dict_to_class(bom_response()), [60, 100],
+                authorized_only=True, max_lead_days=60)
+        assert cost.lines[0].sku == '296-1234-ND'
+        assert cost.lines[0].extended_price == 60 * 0.40
+        assert cost.lines[1].offer is None
+        assert cost.lines[1].reason == \
+                'none of 1 offers eligible: 1 long lead time'
+        assert cost.missing == [1]
+
+    def test_lines_without_offers(self):
+        resource = bom_response()
+        resource['results'].append(samples.match_result([]))
+        cost = cost_bom(resource, [1, 1, 1], full_stock=True)
+        assert cost.lines[2].reason == 'no offers'
+        assert cost.lines[0].sku == '296-1234-ND'
+
+
+class AllocationTest(unittest.TestCase):
+
+    def response(self):
+        return samples.match_response([samples.match_result([samples.part(
+            offers=[
+                samples.offer(sku='A', in_stock_quantity=200,
+                    prices={'USD': [[1, '0.50'], [100, '0.30']]}),
+                samples.offer(sku='B', seller_uid='2', in_stock_quantity=105,
+                    moq=10, order_multiple=10, prices={'USD': [[1, '0.40']]}),
+                samples.offer(sku='C', seller_uid='3', in_stock_quantity=0),
+            ])])])
+
+    def test_split(self):
+        allocation = allocate_bom(self.response(), [250])[0]
+        assert [(pick.sku, pick.quantity) for pick in allocation.picks] == \
+                [('A', 200), ('B', 50)]
+        assert abs(allocation.cost - 80.0) < 1e-9
+        assert allocation.shortfall == 0
+
+    def test_rounds_up_to_cheaper_break(self):
+        allocation = allocate_bom(self.response(), [90])[0]
+        assert [(pick.sku, pick.quantity) for pick in allocation.picks] == \
+                [('A', 100)]
+        assert abs(allocation.cost - 30.0) < 1e-9
+
+    def test_shortfall(self):
+        allocation = allocate_bom(self.response(), [1000])[0]
+        assert sorted(pick.quantity for pick in allocation.picks) == [100, 200]
+        assert allocation.shortfall == 700
+
+    def test_partial_multiple(self):
+        response = samples.match_response([samples.match_result([
+            samples.part(offers=[
+                samples.offer(sku='A', in_stock_quantity=7,
+                    prices={'USD': [[1, 1.49], [21, 0.76]]}),
+                samples.offer(sku='B', seller_uid='2', in_stock_quantity=25,
+                    order_multiple=5, prices={'USD': [[1, 1.29], [20, 1.21]]}),
+            ])])])
+        allocation = allocate_bom(response, [12])[0]
+        assert sorted((pick.sku, pick.quantity) for pick in
+                allocation.picks) == [('A', 2), ('B', 10)]
+        assert abs(allocation.cost - 15.88) < 1e-9
+
+    def test_matches_exhaustive_search(self):
+        rand = random.Random(0)
+        for _ in range(300):
+            offers = []
+            for row in range(rand.randint(1, 3)):
+                quantities = sorted(rand.sample(range(1, 30),
+                                                rand.randint(1, 3)))
+                prices = sorted((round(rand.uniform(0.1, 2.0), 2)
+                                 for _ in quantities), reverse=True)
+                offers.append((row, rand.choice([1, 1, 3, 8]),
+                    rand.choice([1, 1, 2, 5]), rand.randint(1, 30),
+                    quantities, prices))
+            demand = rand.randint(1, 40)
+            split = _split(offers, demand)
+            # Every quantity each offer can be bought at, or none of it
+            choices = [[(0, 0.0)] + [(quantity, quantity * _price(
+                    quantities, prices, quantity))
+                for quantity in range(moq, capacity + 1)
+                if quantity % multiple == 0 and
+                    _price(quantities, prices, quantity) is not None]
+                for _, moq, multiple, capacity, quantities, prices in offers]
+            costs = [sum(cost for _, cost in combination)
+                     for combination in itertools.product(*choices)
+                     if sum(quantity for quantity, _ in combination) >=
+                        demand]
+            if not costs:
+                assert split is None
+                continue
+            assert abs(split[0] - min(costs)) < 1e-9, (offers, demand)
+            assert sum(quantity for _, quantity, _ in split[1]) >= demand
+            for row, quantity, unit in split[1]:
+                assert quantity * unit in [cost for bought, cost in
+                        choices[row] if bought == quantity]
+
+
+if __name__ == '__main__':
+    unittest.main()
+
+
+class CurrencyTest(unittest.TestCase):
+
+    def setUp(self):
+        self.rates = RateTable({'EUR': 0.5, 'GBP': 0.25})
+        self.response = bom_response()
+        # A cheaper offer of the first line, priced in pounds only
+        self.response['results'][0]['items'][0]['offers'].append(
+            samples.offer(sku='UK-74', seller_uid='3', seller_name='Farnell',
+                prices={'GBP': [[1, '0.05']]}))
+
+    def test_load(self):
+        handle, path = tempfile.mkstemp(suffix='.json')
+        with os.fdopen(handle, 'w') as rate_file:
+            json.dump({'base': 'EUR', 'rates': {'USD': 2.0}}, rate_file)
+        try:
+            rates = RateTable.load(path)
+        finally:
+            os.remove(path)
+        assert rates.base == 'EUR'
+        assert rates.convert(1.0, 'EUR', 'USD') == 2.0
+        assert rates.rate('USD', 'EUR') == 0.5
+        self.assertRaises(ArgumentInvalidError, rates.rate, 'USD', 'JPY')
+
+    def test_table_prices(self):
+        table = OfferTable.from_json(self.response)
+        prices = self.rates.table_prices(table, 'USD')
+        # Native dollars are kept over euros, pounds get converted
+        assert list(table.break_currency[numpy.isnan(prices)]) == ['EUR']
+        assert prices[table.break_currency == 'GBP'][0] == 0.2
+        assert self.rates.table_prices(table, 'USD') is prices
+        eur = self.rates.table_prices(table, 'EUR')
+        assert list(table.break_currency[~numpy.isnan(eur)]) == \
+            ['USD', 'USD', 'USD', 'EUR', 'GBP', 'USD', 'USD']
+
+    def test_offer_prices(self):
+        offer = dict_to_class(self.response['results'][0]['items'][0]
+                ['offers'][1])
+        assert self.rates.offer_prices(offer, 'EUR') == [(1, 0.41)]
+        assert self.rates.offer_prices(offer, 'GBP') == \
+            [(1, 0.1125), (50, 0.0875)]
+        assert self.rates.offer_prices(offer, 'GBP') is \
+            self.rates.offer_prices(offer, 'GBP')
+
+    def test_cost_bom(self):
+        table = OfferTable.from_json(self.response)
+        assert cost_bom(table, [10, 10]).lines[0].sku == '296-1234-ND'
+        cost = cost_bom(table, [10, 10], rates=self.rates)
+        assert cost.lines[0].sku == 'UK-74'
+        assert abs(cost.lines[0].extended_price - 2.0) < 1e-9
+        allocations = allocate_bom(table, [10, 10], rates=self.rates)
+        assert allocations[0].picks[0].sku == 'UK-74'
+
+
+def capacitors():
+    ''' Capacitor parts of (capacitance, voltage, dielectric) specs '''
+    values = [('0.000001', u'1 µF', '50', 'X7R'),
+              ('0.0000047', u'4.7 µF', '25', 'X5R'),
+              ('0.0000047', u'4.7 µF', '16', 'X7R'),
+              ('0.00001', u'10 µF', '35', 'Y5V'),
+              ('0.000022', u'22 µF', '25', 'X7R')]
+    ret = []
+    for number, (capacitance, display, voltage, dielectric) in\
+            enumerate(values):
+        ret.append(samples.part(uid=str(number), mpn='CAP%d' % number,
+            specs=samples.specs(
+                samples.spec('capacitance', capacitance, display),
+                samples.spec('voltage_rating_dc', voltage, voltage + ' V',
+                    unit_symbol='V', unit_name='volts'),
+                samples.spec('dielectric_characteristic', dielectric,
+                    dielectric, datatype='string', unit_symbol=None,
+                    unit_name=None))))
+    ranged = samples.spec('operating_temperature', None, '-55 to 125 C',
+        unit_symbol='C', unit_name='celsius')
+    ranged.update({'value': [], 'min_value': '-55', 'max_value': '125'})
+    ret[0]['specs']['operating_temperature'] = ranged
+    return ret
+
+
+class SpecIndexTest(unittest.TestCase):
+
+    def test_columns(self):
+        index = SpecIndex.from_parts(capacitors())
+        assert index.keys() == ['capacitance', 'dielectric_characteristic',
+                'operating_temperature', 'voltage_rating_dc']
+        assert index.column('capacitance').low.dtype == numpy.float64
+        assert index.column('dielectric_characteristic').low.dtype.kind == 'U'
+        self.assertRaises(ArgumentInvalidError, index.column, 'resistance')
+
+    def test_query(self):
+        index = SpecIndex.from_parts(capacitors())
+        assert list(index.query(capacitance=(1e-6, 1e-5))) == [0, 1, 2, 3]
+        assert list(index.query(capacitance=(1e-6, 1e-5),
+                                voltage_rating_dc=(25, None))) == [0, 1, 3]
+        assert list(index.query(capacitance=(1e-6, 1e-5),
+                voltage_rating_dc=(25, None),
+                dielectric_characteristic=['X7R', 'X5R'])) == [0, 1]
+        assert list(index.query(dielectric_characteristic='Y5V')) == [3]
+        assert list(index.query()) == [0, 1, 2, 3, 4]
+        assert [part['mpn'] for part in index.select(
+                voltage_rating_dc=(None, 20))] == ['CAP2']
+
+    def test_part_objects(self):
+        parts = [dict_to_class(part, Part) for part in capacitors()]
+        index = SpecIndex.from_parts(parts)
+        assert index.keys() == ['capacitance', 'dielectric_characteristic',
+                'operating_temperature', 'voltage_rating_dc']
+        assert list(index.query(capacitance=(1e-6, 1e-5),
+                                voltage_rating_dc=(25, None))) == [0, 1, 3]
+        assert index.select(dielectric_characteristic='Y5V')[0] is parts[3]
+
+    def test_ranges(self):
+        index = SpecIndex.from_parts(dict_to_class(part, Part)
+                for part in capacitors())
+        column = index.column('operating_temperature')
+        assert list(column.covers(-40, 85)) == [0]
+        assert list(column.covers(-60, 85)) == []
+        assert list(column.between(-60, 150)) == [0]
+        assert list(column.between(-40, 150)) == []
+
+
+class UnitsTest(unittest.TestCase):
+
+    def test_parse(self):
+        for text in (u'4.7 µF', u'4.7μF', '4.7uF', '4700nF',
+                     '0.0047mF', '4.7e-6 F'):
+            value, unit = parse(text)
+            assert unit == 'F' and abs(value - 4.7e-6) < 1e-18, text
+        assert parse('10k', u'Ω') == (10000.0, u'Ω')
+        assert parse('10 kohm') == (10000.0, u'Ω')
+        assert parse('5 mm', 'm') == (0.005, 'm')
+        assert parse('3 m', 'm') == (3.0, 'm')
+        assert parse('3 m', 'F') == (0.003, 'F')
+        assert parse('25 %') == (25.0, '%')
+        assert parse('-55 to 125 C') is None
+        assert parse_many(['1V', '2V', '1V']) == [(1.0, 'V'), (2.0, 'V'),
+                                                  (1.0, 'V')]
+
+    def test_normalize(self):
+        parts = capacitors()
+        parts[1]['specs']['capacitance']['display_value'] = '4700nF'
+        built = [dict_to_class(part, Part) for part in parts]
+        values = normalize_parts(built)
+        assert len(values) == 16
+        capacitance = built[1].specs['capacitance']
+        assert abs(capacitance.canonical_value - 4.7e-6) < 1e-18
+        assert built[1].specs['capacitance'].canonical_unit == 'F'
+        assert built[0].specs['voltage_rating_dc'].canonical_value == 50.0
+        # Unparsed display values fall back to the value
+        assert built[0].specs['operating_temperature'].canonical_value is None
+        assert built[0].specs['dielectric_characteristic'].canonical_value\
+            is None
+        normalize_specs(parts[2]['specs'])
+        assert parts[2]['specs']['voltage_rating_dc']['canonical_value'] ==\
+            16.0
+        assert dict_to_class(parts[2], Part).specs[
+            'voltage_rating_dc'].canonical_value == 16.0
+
+    def test_normalize_objects(self):
+        parts = [dict_to_class(part, Part) for part in capacitors()]
+        assert all(isinstance(part.specs, dict) for part in parts)
+        normalize_parts(parts)
+        assert [part.specs['voltage_rating_dc'].canonical_value
+                for part in parts] == [50.0, 25.0, 16.0, 35.0, 25.0]
+        capacitance = parts[3].specs['capacitance'].canonical_value
+        assert abs(capacitance - 1e-5) < 1e-18
+
+    def test_memo_bounded(self):
+        bound = units.MAX_PARSED
+        units.MAX_PARSED = 4
+        try:
+            for number in range(10):
+                parse('%d V' % number)
+            parse('6 V')
+            parse('10 V')
+            assert len(units._PARSED) == 4
+            assert list(units._PARSED) == [('8 V', None), ('9 V', None),
+                                           ('6 V', None), ('10 V', None)]
+        finally:
+            units.MAX_PARSED = bound
+
+    def test_index_quantities(self):
+        parts = [dict_to_class(part, Part) for part in capacitors()]
+        normalize_parts(parts)
+        index = SpecIndex.from_parts(parts)
+        assert list(index.query(capacitance=('1uF', u'10µF'),
+                                voltage_rating_dc=('25V', None))) == [0, 1, 3]
+        self.assertRaises(ArgumentInvalidError, index.query,
+                          capacitance=('big', None))
+
+
+class SimilarityTest(unittest.TestCase):
+
+    def setUp(self):
+        self.parts = capacitors()
+        for number, part in enumerate(self.parts):
+            part['category_uids'] = ['capacitors', 'ceramic'] if number < 4\
+                else ['tantalum']
+        self.parts[2]['offers'][0]['in_stock_quantity'] = 0
+        normalize_parts(self.parts)
+        self.index = SimilarityIndex(self.parts, weights={'capacitance': 4})
+
+    def test_alternates(self):
+        alternates = self.index.alternates(self.parts[1], k=2)
+        # The other 4.7uF part first, then the next closest ceramic
+        assert [alt.part['mpn'] for alt in alternates] == ['CAP2', 'CAP3']
+        assert alternates[0].distance < alternates[1].distance
+        assert alternates[0].in_stock_quantity == 0
+        in_stock = self.index.alternates(self.parts[1], k=2, in_stock=True)
+        assert [alt.part['mpn'] for alt in in_stock] == ['CAP3', 'CAP0']
+        assert in_stock[0].in_stock_quantity == 100
+
+    def test_conditions(self):
+        alternates = self.index.alternates(self.parts[1], k=10,
+                voltage_rating_dc=('25V', None))
+        assert [alt.part['mpn'] for alt in alternates] == ['CAP3', 'CAP0']
+        # Parts of other categories only when asked for
+        assert len(self.index.alternates(self.parts[1], k=10)) == 3
+        assert len(self.index.alternates(self.parts[1], k=10,
+                                         same_category=False)) == 4
+
+    def test_part_objects(self):
+        parts = [dict_to_class(part, Part) for part in self.parts]
+        index = SimilarityIndex(parts, weights={'capacitance': 4})
+        assert sorted(index.numeric) == ['capacitance',
+                'operating_temperature', 'voltage_rating_dc']
+        assert sorted(index.strings) == ['dielectric_characteristic']
+        alternates = index.alternates(parts[1], k=2)
+        assert [alt.part.mpn for alt in alternates] == ['CAP2', 'CAP3']
+        assert alternates[0].part is parts[2]
+
+    def test_outside_part(self):
+        part = dict_to_class(samples.part(uid='new', specs=samples.specs(
+            samples.spec('capacitance', '0.000022', u'22 µF'))), Part)
+        normalize_parts([part])
+        alternates = self.index.alternates(part, k=1)
+        assert alternates[0].part['mpn'] == 'CAP4'
+        assert alternates[0].distance < 1e-6
+
+
+class RankingTest(unittest.TestCase):
+
+    def setUp(self):
+        response = bom_response()
+        self.parts = [dict_to_class(part, Part)
+                for result in response['results'] for part in result['items']]
+
+    def test_cheapest(self):
+        ranked = rank_offers(self.parts, effective_price(1000), k=2)
+        assert [entry.offer.sku for entry in ranked] == ['LM358-ND',
+                                                         '296-1234-ND']
+        assert ranked[0].key == (0.08,)
+        assert ranked[1].part.mpn == 'SN74S74N'
+        ranked = rank_offers(self.parts, effective_price(1000), k=5,
+                             authorized_only=True, min_stock=1000)
+        assert [entry.offer.sku for entry in ranked] == ['LM358-ND']
+
+    def test_tie_breaks(self):
+        ranked = rank_offers(self.parts, [lead_time, stock], k=3)
+        assert [entry.offer.sku for entry in ranked] == ['296-1234-ND',
+                '595-SN74S74N', 'LM358-ND']
+        ranked = rank_offers(self.parts, [lead_time, descending(stock)], k=3)
+        assert [entry.offer.sku for entry in ranked] == ['595-SN74S74N',
+                '296-1234-ND', 'LM358-ND']
+
+    def test_matches_full_sort(self):
+        rand = random.Random(0)
+        parts = [dict_to_class(samples.part(uid=str(number), offers=[
+            samples.offer(sku='%d-%d' % (number, count),
+                prices={'USD': [[1, rand.uniform(0.1, 1.0)],
+                                [100, rand.uniform(0.05, 0.1)]]},
+                in_stock_quantity=rand.choice([0, 10, 1000]),
+                moq=rand.choice([1, 50]), order_multiple=rand.choice([1, 7]))
+            for count in range(5)]), Part) for number in range(50)]
+        key = effective_price(10)
+        expected = sorted(((key(part, offer),), offer.sku)
+                for part in parts for offer in part.offers)[:20]
+        ranked = rank_offers(iter(parts), key, k=20)
+        assert [(entry.key, entry.offer.sku) for entry in ranked] == expected
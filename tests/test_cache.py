@@ -0,0 +1,593 @@
+"""
+Offline unit tests for the client response cache.
+"""
+
+import os
+import copy
+import shutil
+import tempfile
+import threading
+import unittest
+
+import samples
+
+from pyoctopart.cache import ResponseCache, Refresher, Entry
+from pyoctopart.cache import MemoryStore, SizedStore, DiskStore
+from pyoctopart import compression
+from pyoctopart.compression import Codec, train_dictionary
+from pyoctopart.exceptions import HTML404Error, ArgumentInvalidError
+from pyoctopart.errors import ClientErrorResponse
+from pyoctopart.octopart import Octopart
+from pyoctopart.warm import read_items, warm
+
+try:
+    from pyoctopart.shared import SharedStore
+except ImportError:
+    # Shared stores need POSIX file locks
+    SharedStore = None
+
+
+class Clock(object):
+    ''' A clock only moving when told to '''
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class OfflineOctopart(Octopart):
+    ''' Client answering from a catalog of sample parts '''
+
+    def __init__(self, catalog, **kwargs):
+        Octopart.__init__(self, **kwargs)
+        self.catalog = catalog
+        self.calls = []
+
+    def _get_data(self, method, args, payload=None, ver=2):
+        self.calls.append((method, args, payload))
+        show = (payload or {}).get('show[]')
+        if method == 'parts/get_multi':
+            found = {}
+            for uid in payload['uid[]']:
+                try:
+                    found[uid] = self._answer('parts/' + uid, args, show)
+                except HTML404Error:
+                    pass
+            return copy.deepcopy(found)
+        # Like the API, answer with new JSON at every call
+        return copy.deepcopy(self._answer(method, args, show))
+
+    def _answer(self, method, args, show):
+        def project(part):
+            if not show:
+                return part
+            return dict((field, value) for field, value in part.items()
+                        if field in show or field == '__class__')
+        if method == 'parts/match':
+            queries = args['queries']
+            return samples.match_response([samples.match_result(
+                [project(part) for part in self.catalog.values()
+                 if part['mpn'] == query['mpn']], query.get('reference'))
+                for query in queries], [samples.match_query(
+                    query['mpn'], query.get('reference'))
+                for query in queries])
+        uid = method.split('/')[1]
+        for part in self.catalog.values():
+            if part['uid'] == uid:
+                return project(part)
+        raise HTML404Error({}, [], [])
+
+
+class ResponseCacheTest(unittest.TestCase):
+
+    def test_expiry(self):
+        clock = Clock()
+        cache = ResponseCache(ttl=60, negative_ttl=10, clock=clock)
+        cache.set('found', {'uid': '1'})
+        cache.set_negative('missing')
+        assert cache.get('found').value == {'uid': '1'}
+        assert cache.get('missing').negative
+        clock.now += 10
+        assert 'missing' not in cache
+        assert 'found' in cache
+        clock.now += 50
+        assert cache.get('found') is None
+        assert len(cache) == 0
+
+    def test_key(self):
+        key = ResponseCache.key('parts/match', {'mpn': 'a', 'brand': 'b'})
+        assert key == ResponseCache.key('parts/match',
+                                        {'brand': 'b', 'mpn': 'a'})
+        assert key != ResponseCache.key('parts/match', {'mpn': 'a'})
+
+
+class TierTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'cache.sqlite')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_lru(self):
+        store = MemoryStore(max_entries=2)
+        cache = ResponseCache(tiers=[store])
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+        assert store.keys() == ['a', 'c']
+        assert cache.stats()['memory']['evictions'] == 1
+
+    def test_sized(self):
+        store = SizedStore(max_bytes=1000)
+        cache = ResponseCache(tiers=[store], costs={'parts/match': 10})
+        cache.set('parts/1:', 'x' * 400)
+        cache.set('parts/2:', 'x' * 100)
+        cache.set('parts/match:', 'x' * 400)
+        assert store.nbytes == 3 * 2 + 8 + 8 + 12 + 900
+        # The large and cheap entry goes first, even though least recent
+        cache.get('parts/1:')
+        cache.set('parts/3:', 'x' * 100)
+        assert sorted(store.keys()) == ['parts/2:', 'parts/3:',
+                                        'parts/match:']
+        assert cache.stats()['memory']['bytes'] == store.nbytes <= 1000
+        # Entries larger than the tier are not kept
+        cache.set('parts/4:', 'x' * 1000)
+        assert 'parts/4:' not in store.keys()
+        assert store.evictions == 2
+        # Unused entries age out as the tier evicts others
+        for uid in range(5, 25):
+            cache.set('parts/%d:' % uid, 'x' * 100)
+        assert 'parts/match:' not in store.keys()
+        assert store.nbytes <= 1000
+
+    def test_promotion(self):
+        clock = Clock()
+        disk = DiskStore(self.path)
+        cache = ResponseCache(ttl=60, clock=clock,
+                              tiers=[MemoryStore(), disk])
+        cache.set('found', {'uid': '1'})
+        cache.set_negative('missing')
+        disk.close()
+        # A new run starts with an empty memory tier
+        memory = MemoryStore()
+        cache = ResponseCache(ttl=60, clock=clock,
+                              tiers=[memory, DiskStore(self.path)])
+        assert cache.get('found').value == {'uid': '1'}
+        assert cache.get('missing').negative
+        assert sorted(memory.keys()) == ['found', 'missing']
+        assert cache.get('found').value == {'uid': '1'}
+        stats = cache.stats()
+        assert (stats['memory']['hits'], stats['memory']['misses']) == (1, 2)
+        assert (stats['disk']['hits'], stats['disk']['misses']) == (2, 0)
+        assert stats['disk']['entries'] == 2 and stats['disk']['bytes'] > 0
+        clock.now += 60
+        assert cache.get('found') is None
+        assert len(cache) == 1
+        clock.now += 300
+        assert cache.purge() == 2
+        assert len(cache) == 0
+
+    def test_endpoints(self):
+        disk = DiskStore(self.path)
+        cache = ResponseCache(tiers=[MemoryStore(), disk],
+                              endpoints={'parts/{uid}': ['memory']})
+        key = cache.key('parts/721abb1d3046addd', {})
+        assert cache.endpoint(key) == 'parts/{uid}'
+        cache.set(key, {'uid': '721abb1d3046addd'})
+        cache.set(cache.key('parts/match', {'mpn': 'a'}), {'hits': 1})
+        assert disk.keys() == [cache.key('parts/match', {'mpn': 'a'})]
+        assert cache.endpoint(disk.keys()[0]) == 'parts/match'
+        assert len(cache) == 2
+
+
+class CodecTest(unittest.TestCase):
+
+    def setUp(self):
+        self.parts = [samples.part(uid='%d' % uid, mpn='MPN%d' % uid)
+                      for uid in range(10)]
+
+    def test_zlib(self):
+        plain = Codec(level=9)
+        assert plain.decode(plain.encode(self.parts[0])) == self.parts[0]
+        trained = Codec(dictionary=train_dictionary(self.parts[:5]))
+        data = trained.encode(self.parts[9])
+        assert trained.decode(data) == self.parts[9]
+        assert len(data) < len(plain.encode(self.parts[9]))
+        self.assertRaises(ValueError, Codec().decode, b'S' + data[1:])
+        self.assertRaises(ArgumentInvalidError, Codec, 'lzma')
+
+    @unittest.skipIf(compression.zstandard is None, 'zstandard is missing')
+    def test_zstd(self):
+        codec = Codec('zstd', dictionary=train_dictionary(self.parts * 20,
+                      size=4096, method='zstd'))
+        assert codec.decode(codec.encode(self.parts[0])) == self.parts[0]
+
+    def test_stores(self):
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, 'cache.sqlite')
+            memory = MemoryStore(codec=Codec())
+            cache = ResponseCache(tiers=[memory, DiskStore(path,
+                                                           codec=Codec())])
+            for part in self.parts:
+                cache.set(part['uid'], part)
+            assert memory.nbytes < sum(cache.get(part['uid']).size
+                                       for part in self.parts)
+            assert cache.get('3').value == self.parts[3]
+            # Compressed entries are read back by a store without codec
+            cache = ResponseCache(tiers=[DiskStore(path)])
+            assert cache.get('3').value == self.parts[3]
+            cache.set('3', self.parts[3])
+            assert ResponseCache(tiers=[DiskStore(path, codec=Codec())]).get(
+                    '3').value == self.parts[3]
+        finally:
+            shutil.rmtree(directory)
+
+
+@unittest.skipIf(SharedStore is None, 'fcntl is missing')
+class SharedStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'cache.shm')
+        self.store = SharedStore(self.path, capacity=4096, slots=64)
+
+    def tearDown(self):
+        self.store.close()
+        shutil.rmtree(self.directory)
+
+    def test_shared(self):
+        clock = Clock()
+        writer = ResponseCache(ttl=60, clock=clock, tiers=[self.store])
+        other = SharedStore(self.path, codec=Codec())
+        reader = ResponseCache(ttl=60, clock=clock, tiers=[other])
+        writer.set('found', {'uid': '1'})
+        writer.set_negative('missing')
+        assert reader.get('found').value == {'uid': '1'}
+        assert reader.get('missing').negative
+        assert other.slots == 64 and other.capacity == 4096
+        # Written compressed, read by a store without codec
+        reader.set('found', {'uid': '2'})
+        assert writer.get('found').value == {'uid': '2'}
+        assert writer.get('found').size == len('found') + len('{"uid":"2"}')
+        reader.delete('found')
+        assert writer.get('found') is None
+        clock.now += 300
+        assert writer.purge() == 1
+        assert len(self.store) == 0
+        other.close()
+
+    def test_ring(self):
+        cache = ResponseCache(tiers=[self.store])
+        for number in range(200):
+            cache.set('key%d' % number, {'value': 'x' * number})
+        kept = sorted(int(key[3:]) for key in self.store.keys())
+        # The ring keeps the most recent entries that fit
+        assert kept == list(range(kept[0], 200))
+        assert self.store.size()['bytes'] <= 4096
+        for number in kept:
+            assert cache.get('key%d' % number).value == {
+                    'value': 'x' * number}
+        assert cache.get('key0') is None
+
+    def test_fork(self):
+        self.store.put('parent', Entry({'pid': os.getpid()}, 0, 1e12))
+        pid = os.fork()
+        if pid == 0:
+            code = 1
+            try:
+                if self.store.get('parent').value == {'pid': os.getppid()}:
+                    self.store.put('child', Entry({'pid': os.getpid()}, 0,
+                                                  1e12))
+                    code = 0
+            finally:
+                os._exit(code)
+        assert os.waitpid(pid, 0)[1] == 0
+        assert self.store.get('child').value == {'pid': pid}
+
+    def test_concurrent(self):
+        cache = ResponseCache(tiers=[self.store])
+        errors = []
+        def write(number):
+            for round in range(200):
+                cache.set('key%d' % (round % 20),
+                          {'key': 'key%d' % (round % 20), 'by': number})
+        def read():
+            for round in range(2000):
+                entry = cache.get('key%d' % (round % 20))
+                if entry is not None and\
+                        entry.value['key'] != 'key%d' % (round % 20):
+                    errors.append(entry.value)
+        threads = [threading.Thread(target=write, args=(number,))
+                   for number in range(4)]
+        threads += [threading.Thread(target=read) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert errors == []
+
+
+class RefresherTest(unittest.TestCase):
+
+    def test_deduplicates(self):
+        refresher = Refresher(workers=2)
+        release = threading.Event()
+        runs = []
+        def refresh(name):
+            release.wait(5)
+            runs.append(name)
+        assert refresher.submit('a', lambda: refresh('a'))
+        assert not refresher.submit('a', lambda: refresh('a'))
+        assert refresher.submit('b', lambda: refresh('b'))
+        assert refresher.pending() == 2
+        release.set()
+        refresher.join()
+        assert sorted(runs) == ['a', 'b']
+        assert refresher.pending() == 0
+        assert len(refresher._threads) == 2
+
+    def test_batch(self):
+        refresher = Refresher(workers=1)
+        release = threading.Event()
+        runs = []
+        assert refresher.submit('a', lambda: release.wait(5))
+        assert refresher.submit_batch(['b', 'a', 'c', 'b'], runs.append) == \
+                ['b', 'c']
+        assert refresher.submit_batch(['a', 'c'], runs.append) == []
+        assert refresher.pending() == 3
+        release.set()
+        refresher.join()
+        assert runs == [['b', 'c']] and refresher.pending() == 0
+
+    def test_failures(self):
+        refresher = Refresher(workers=1)
+        refresher.submit('a', lambda: 1 / 0)
+        refresher.join()
+        assert refresher.failures == 1
+        assert refresher.submit('a', lambda: None)
+        refresher.join()
+
+
+class ClientCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = Clock()
+        self.cache = ResponseCache(ttl=3600, negative_ttl=60,
+                                   clock=self.clock)
+        self.client = OfflineOctopart({
+            '1': samples.part(uid='1', mpn='SN74S74N'),
+            '2': samples.part(uid='2', mpn='LM358')}, cache=self.cache)
+
+    def test_parts_match(self):
+        queries = [{'mpn': 'SN74S74N'}, {'mpn': 'TYPO'}]
+        response = self.client.parts_match(queries)
+        assert [result.hits for result in response.results] == [1, 0]
+        assert len(self.client.calls) == 1
+        # Both the hit and the miss are answered locally
+        response = self.client.parts_match(queries)
+        assert [result.hits for result in response.results] == [1, 0]
+        assert response.results[0].items[0].uid == '1'
+        assert len(self.client.calls) == 1
+        # Only the new query is sent, results keep the order of queries
+        response = self.client.parts_match([{'mpn': 'LM358'}] + queries)
+        assert [result.hits for result in response.results] == [1, 1, 0]
+        assert self.client.calls[-1][1]['queries'] == [{'mpn': 'LM358'}]
+        assert [query.mpn for query in response.request.queries] == [
+                'LM358', 'SN74S74N', 'TYPO']
+
+    def test_partial_hit_error(self):
+        self.client.parts_match([{'mpn': 'SN74S74N'}])
+        error = {'__class__': 'ClientErrorResponse', 'message': 'Bad query'}
+        self.client._answer = lambda method, args, show: error
+        response = self.client.parts_match([{'mpn': 'SN74S74N'},
+                                            {'mpn': 'LM358'}])
+        assert isinstance(response, ClientErrorResponse)
+        assert response.message == 'Bad query'
+        assert self.client.calls[-1][1]['queries'] == [{'mpn': 'LM358'}]
+
+    def test_negative_ttl(self):
+        self.client.parts_match([{'mpn': 'TYPO'}])
+        self.clock.now += 61
+        self.client.parts_match([{'mpn': 'TYPO'}])
+        assert len(self.client.calls) == 2
+        self.client.parts_match([{'mpn': 'TYPO'}])
+        assert len(self.client.calls) == 2
+
+    def test_parts_get(self):
+        assert self.client.parts_get(1).mpn == 'SN74S74N'
+        assert self.client.parts_get(1).mpn == 'SN74S74N'
+        assert len(self.client.calls) == 1
+        self.assertRaises(HTML404Error, self.client.parts_get, 3)
+        self.assertRaises(HTML404Error, self.client.parts_get, 3)
+        assert len(self.client.calls) == 2
+        self.clock.now += 61
+        self.assertRaises(HTML404Error, self.client.parts_get, 3)
+        assert len(self.client.calls) == 3
+        stats = self.cache.stats()
+        assert (stats['network']['hits'], stats['network']['misses']) == (1, 2)
+        assert stats['memory']['hits'] == 2
+
+    def test_parts_get_error(self):
+        self.cache.stale_ttl = 600
+        self.cache.refresher = Refresher(workers=1)
+        answer = self.client._answer
+        error = {'__class__': 'ServerErrorResponse', 'message': 'Rate limited'}
+        self.client._answer = lambda method, args, show: error
+        assert self.client.parts_get(1).message == 'Rate limited'
+        self.client._answer = answer
+        assert self.client.parts_get(1).mpn == 'SN74S74N'
+        assert len(self.client.calls) == 2
+        # A failed refresh keeps serving the stale part
+        self.clock.now += 3601
+        self.client._answer = lambda method, args, show: error
+        assert self.client.parts_get(1).mpn == 'SN74S74N'
+        self.cache.refresher.join()
+        assert len(self.client.calls) == 3
+        assert self.client.parts_get(1).mpn == 'SN74S74N'
+
+    def test_stale_while_revalidate(self):
+        self.cache.stale_ttl = 600
+        self.cache.refresher = Refresher(workers=1)
+        self.client.parts_match([{'mpn': 'LM358'}])
+        assert self.client.parts_get(2).mpn == 'LM358'
+        self.client.catalog['2']['mpn'] = 'LM358A'
+        self.clock.now += 3601
+        # Stale responses are served at once, refreshed in the background
+        assert self.client.parts_get(2).mpn == 'LM358'
+        response = self.client.parts_match([{'mpn': 'LM358'}])
+        assert response.results[0].hits == 1
+        self.cache.refresher.join()
+        assert len(self.client.calls) == 4
+        assert self.client.parts_get(2).mpn == 'LM358A'
+        assert self.client.parts_match([{'mpn': 'LM358'}]).results[0].hits == 0
+        assert len(self.client.calls) == 4
+        # Past the stale window, responses are fetched again
+        self.clock.now += 3600 + 601
+        self.client.parts_get(2)
+        assert len(self.client.calls) == 5
+
+    def test_stale_batch(self):
+        self.cache.stale_ttl = 600
+        self.cache.refresher = Refresher(workers=1)
+        queries = [{'mpn': 'SN74S74N'}, {'mpn': 'LM358'}, {'mpn': 'SN74S74N'}]
+        self.client.parts_match(queries)
+        self.clock.now += 3601
+        # Stale results are refreshed by one call, without duplicates
+        response = self.client.parts_match(queries)
+        assert [result.hits for result in response.results] == [1, 1, 1]
+        self.cache.refresher.join()
+        assert len(self.client.calls) == 2
+        assert self.client.calls[-1][1]['queries'] == queries[:2]
+        # Results with a refresh pending are left to it
+        self.clock.now += 3601
+        key = [key for key in self.cache.tiers[0].keys() if 'LM358' in key]
+        release = threading.Event()
+        self.cache.revalidate(key[0], lambda: release.wait(5))
+        self.client.parts_match(queries)
+        release.set()
+        self.cache.refresher.join()
+        assert len(self.client.calls) == 3
+        assert self.client.calls[-1][1]['queries'] == queries[:1]
+
+    def test_field_ttls(self):
+        self.cache.field_ttls = {'offers': 100, 'specs': 7200}
+        self.client.parts_get(1)
+        self.client.parts_match([{'mpn': 'SN74S74N'}])
+        self.client.catalog['1']['offers'][0]['in_stock_quantity'] = 7
+        self.clock.now += 101
+        part = self.client.parts_get(1)
+        assert part.offers[0].in_stock_quantity == 7
+        assert part.mpn == 'SN74S74N' and part.manufacturer is not None
+        method, _, payload = self.client.calls[-1]
+        assert method == 'parts/1' and payload == {'show[]': ['uid', 'offers']}
+        # Refreshed offers are fresh again
+        self.client.parts_get(1)
+        assert len(self.client.calls) == 3
+        response = self.client.parts_match([{'mpn': 'SN74S74N'}])
+        assert response.results[0].items[0].offers[0].in_stock_quantity == 7
+        assert response.results[0].items[0].mpn == 'SN74S74N'
+        assert self.client.calls[-1][2] == {'show[]': ['uid', 'offers']}
+        assert len(self.client.calls) == 4
+        self.client.parts_match([{'mpn': 'SN74S74N'}])
+        assert len(self.client.calls) == 4
+
+
+    def test_field_refresh_error(self):
+        self.cache.field_ttls = {'offers': 100}
+        self.client.parts_get(1)
+        self.client.catalog['1']['offers'][0]['in_stock_quantity'] = 7
+        self.clock.now += 101
+        answer = self.client._answer
+        error = {'__class__': 'ServerErrorResponse', 'message': 'Rate limited'}
+        self.client._answer = lambda method, args, show: error
+        part = self.client.parts_get(1)
+        assert part.offers[0].in_stock_quantity != 7
+        assert len(self.client.calls) == 2
+        # The offers are still stale, and refreshed once the API recovers
+        self.client._answer = answer
+        assert self.client.parts_get(1).offers[0].in_stock_quantity == 7
+        assert len(self.client.calls) == 3
+
+class ReadItemsTest(unittest.TestCase):
+
+    def test_header(self):
+        queries, uids = read_items(['# BOM', 'Ref,MPN,Brand,UID',
+                'R1,RC0603,Yageo,', 'U1,,,42', 'C1, GRM188 ,Murata,', ''])
+        assert queries == [{'mpn': 'RC0603', 'brand': 'Yageo'},
+                           {'mpn': 'GRM188', 'brand': 'Murata'}]
+        assert uids == ['42']
+
+    def test_plain(self):
+        queries, uids = read_items(['SN74S74N', 'LM358,TI'])
+        assert queries == [{'mpn': 'SN74S74N'}, {'mpn': 'LM358',
+                                                 'brand': 'TI'}]
+        assert uids == []
+
+
+class WarmTest(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = Clock()
+        self.client = OfflineOctopart(dict(('%d' % uid, samples.part(
+            uid='%d' % uid, mpn='MPN%d' % uid)) for uid in range(1, 31)),
+            cache=ResponseCache(clock=self.clock))
+
+    def test_warm(self):
+        sleeps, reports = [], []
+        def sleep(seconds):
+            sleeps.append(seconds)
+            self.clock.now += seconds
+        queries = [{'mpn': 'MPN%d' % uid} for uid in range(1, 26)]
+        report = warm(self.client, queries + [{'mpn': 'TYPO'}], ['3', '99'],
+                      rate=2, clock=self.clock, sleep=sleep,
+                      progress=lambda *args: reports.append(args))
+        assert (report.matched, report.missing, report.calls) == (26, 2, 3)
+        assert [len(call[1]['queries']) for call in self.client.calls[:2]]\
+                == [20, 6]
+        assert self.client.calls[2][2]['uid[]'] == ['3', '99']
+        assert reports == [(20, 28, 1), (26, 28, 2), (28, 28, 3)]
+        assert sleeps == [0.5] * 2
+        # Warmed queries are answered by the cache, without waiting
+        del sleeps[:]
+        report = warm(self.client, queries, ['3', '99'], rate=2,
+                      clock=self.clock, sleep=sleep)
+        assert report.calls == 0 and sleeps == []
+        assert self.client.parts_match(queries[:1]).results[0].hits == 1
+        assert self.client.parts_get('3').mpn == 'MPN3'
+        self.assertRaises(HTML404Error, self.client.parts_get, 99)
+        assert len(self.client.calls) == 3
+
+    def test_failed_batch(self):
+        answer = self.client._answer
+        error = {'__class__': 'ClientErrorResponse', 'message': 'Bad query'}
+        def fail_first(method, args, show):
+            if len(self.client.calls) == 1:
+                return error
+            return answer(method, args, show)
+        self.client._answer = fail_first
+        queries = [{'mpn': 'MPN%d' % uid} for uid in range(1, 26)]
+        report = warm(self.client, queries, ['3', '4'])
+        assert (report.matched, report.missing, report.calls) == (7, 0, 3)
+        assert [(batch, reply.message) for batch, reply in report.failed]\
+                == [(queries[:20], 'Bad query')]
+        # Failed batches are not cached, and get sent again
+        report = warm(self.client, queries, ['3', '4'])
+        assert (report.matched, report.failed, report.calls) == (27, [], 1)
+
+    def test_uids(self):
+        self.client.catalog['hex'] = samples.part()
+        uids = ['721abb1d3046addd', ' 7 ', 'not a uid', 'R1'] + [
+                '%d' % uid for uid in range(10, 31)]
+        report = warm(self.client, [], uids)
+        assert report.invalid == ['not a uid', 'R1']
+        assert (report.uids, report.matched, report.missing) == (23, 23, 0)
+        assert [len(call[2]['uid[]']) for call in self.client.calls] == \
+                [20, 3]
+        assert self.client.parts_get('721abb1d3046addd').mpn == 'SN74S74N'
+        assert len(self.client.calls) == 2
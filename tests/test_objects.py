@@ -0,0 +1,410 @@
+"""
+Offline unit tests for the APIv3 object model.
+"""
+
+import os
+import copy
+import json
+import pickle
+import shutil
+import struct
+import tempfile
+import unittest
+
+import samples
+
+from pyoctopart.objects import Part, PartOffer, SpecValue, SpecMetadata, Brand
+from pyoctopart.util import dict_to_class, list_to_class, APIOBJECTS
+from pyoctopart.fingerprint import fingerprint
+from pyoctopart import diff
+from pyoctopart.index import PartIndex
+from pyoctopart.compression import Codec
+from pyoctopart.snapshot import Snapshot, write_snapshot
+from pyoctopart import serialize
+from pyoctopart.exceptions import TypeArgumentError
+from pyoctopart.responses import PartsMatchResponse, SearchResult
+
+
+class HashingTest(unittest.TestCase):
+
+    def test_part_hash_matches_eq(self):
+        part = Part.new_from_dict(samples.part())
+        twin = Part.new_from_dict(samples.part())
+        assert part == twin
+        assert hash(part) == hash(twin)
+        assert len(set([part, twin])) == 1
+
+    def test_part_hash_is_cached(self):
+        part = Part.new_from_dict(samples.part())
+        assert '_hash' not in part.__dict__
+        value = hash(part)
+        assert part.__dict__['_hash'][1] == value
+        assert hash(part) == value
+
+    def test_offer_hash_distinguishes_prices(self):
+        offer = PartOffer.new_from_dict(samples.offer())
+        other = PartOffer.new_from_dict(samples.offer(
+            prices={'USD': [[1, '0.55']]}))
+        assert offer != other
+        assert len(set([offer, other])) == 2
+
+    def test_response_hash(self):
+        resource = samples.match_response([
+            samples.match_result([samples.part()])])
+        response = PartsMatchResponse.new_from_dict(resource)
+        twin = PartsMatchResponse.new_from_dict(copy.deepcopy(resource))
+        assert {response: 1}[twin] == 1
+
+    def test_pickled_hash_recomputed(self):
+        part = Part.new_from_dict(samples.part())
+        hash(part)
+        clone = pickle.loads(pickle.dumps(part))
+        assert hash(clone) == hash(part)
+
+
+class FingerprintTest(unittest.TestCase):
+
+    def test_json_and_object_agree(self):
+        resource = samples.part()
+        part = Part.new_from_dict(resource)
+        assert fingerprint(resource) == part.fingerprint()
+        offer = resource['offers'][0]
+        assert fingerprint(offer) == PartOffer.new_from_dict(offer).fingerprint()
+        spec = samples.spec()
+        assert fingerprint(spec) == SpecValue.new_from_dict(spec).fingerprint()
+
+    def test_specs_agree(self):
+        resource = samples.part(specs=samples.specs(samples.spec(),
+                samples.spec('case_package', '0603', '0603', 'string',
+                             None, None)))
+        part = Part.new_from_dict(resource)
+        assert fingerprint(resource) == part.fingerprint()
+        assert fingerprint(resource, ['specs.value']) == \
+            part.fingerprint(['specs.value'])
+        assert fingerprint(resource) != fingerprint(samples.part())
+
+    def test_unmapped_keys(self):
+        resource = samples.part(specs=[samples.spec()])
+        resource['manufacturer']['logo_url'] = 'https://example.com/ti.png'
+        resource['offers'][0]['seller']['country'] = 'US'
+        part = Part.new_from_dict(resource)
+        assert fingerprint(resource) == part.fingerprint()
+        assert fingerprint(resource, ['specs.value']) == \
+            part.fingerprint(['specs.value'])
+        assert fingerprint(resource) == fingerprint(
+                samples.part(specs=samples.specs(samples.spec())))
+        response = samples.match_response([samples.match_result([resource])])
+        assert fingerprint(response) == fingerprint(dict_to_class(response))
+        for cls in APIOBJECTS.values():
+            assert 'fingerprint_fields' in vars(cls), cls
+
+    def test_detects_changes(self):
+        part = Part.new_from_dict(samples.part())
+        changed = samples.part(offers=[samples.offer(in_stock_quantity=5)])
+        assert part.fingerprint() != fingerprint(changed)
+
+    def test_selected_fields(self):
+        fields = ('offers.prices', 'offers.in_stock_quantity')
+        old = samples.part()
+        new = samples.part(offers=[samples.offer(factory_lead_days=10)])
+        assert fingerprint(old) != fingerprint(new)
+        assert fingerprint(old, fields) == fingerprint(new, fields)
+        assert Part.new_from_dict(new).fingerprint(fields) == \
+                fingerprint(old, fields)
+
+    def test_selected_spec_fields(self):
+        old = samples.part(specs=samples.specs(samples.spec()))
+        new = samples.part(specs=samples.specs(samples.spec(
+                display_value='4.70 uF')))
+        assert fingerprint(old, ['specs.value']) != fingerprint(old, ['specs'])
+        assert fingerprint(old, ['specs']) != fingerprint(new, ['specs'])
+        assert fingerprint(old, ['specs.value']) == \
+            fingerprint(new, ['specs.value'])
+
+
+class DispatchTest(unittest.TestCase):
+
+    def test_nested_tags(self):
+        response = dict_to_class(samples.match_response([
+            samples.match_result([samples.part()])]))
+        assert isinstance(response, PartsMatchResponse)
+        part = response.results[0].items[0]
+        assert isinstance(part, Part)
+        assert isinstance(part.offers[0], PartOffer)
+
+    def test_polymorphic_search_result(self):
+        result = SearchResult.new_from_dict({'__class__': 'SearchResult',
+                                             'item': samples.brand()})
+        assert isinstance(result.item, Brand)
+
+    def test_null_values(self):
+        assert dict_to_class(None) is None
+        assert dict_to_class(None, Brand) is None
+        assert list_to_class(None, PartOffer) == []
+        part = Part.new_from_dict(samples.part(brand=None))
+        assert part.brand is None
+        spec = SpecValue.new_from_dict(samples.spec())
+        assert spec.attribution is None
+
+    def test_keyed_specs(self):
+        resource = samples.part(specs=samples.specs(samples.spec(),
+                samples.spec('voltage_rating_dc', '50', '50 V',
+                             unit_symbol='V',
+                             unit_name='volts')))
+        part = Part.new_from_dict(resource)
+        assert sorted(part.specs) == ['capacitance', 'voltage_rating_dc']
+        assert isinstance(part.specs['capacitance'], SpecValue)
+        assert part.specs['voltage_rating_dc'].display_value == '50 V'
+        twin = Part.new_from_dict(copy.deepcopy(resource))
+        assert part == twin and hash(part) == hash(twin)
+        # Lists of specs are keyed by their metadata key
+        listed = dict(resource, specs=list(resource['specs'].values()))
+        assert Part.new_from_dict(listed) == part
+        self.assertRaises(TypeArgumentError, list_to_class,
+                          resource['specs'], SpecValue)
+
+    def test_instantiated_objects_pass_through(self):
+        brand = dict_to_class(samples.brand())
+        assert dict_to_class(brand, Brand) is brand
+        assert list_to_class([brand, None]) == [brand, None]
+
+
+class ProjectionTest(unittest.TestCase):
+
+    def test_projection(self):
+        params = {}
+        params.update(Part.includes(include_specs=True,
+                                    include_compliance_documents=True))
+        params.update(Part.hides(hide_broker_listings=True))
+        fields = Part.projection(params)
+        assert 'specs' in fields and 'compliance_documents' in fields
+        assert 'offers' in fields and 'broker_listings' not in fields
+        assert Part.projection(Part.shows(show_uid=True, show_offers=True)) \
+                == frozenset(['uid', 'offers'])
+
+    def test_unrequested_fields_skipped(self):
+        resource = samples.match_response([samples.match_result([
+            samples.part(specs=samples.specs(samples.spec()))])])
+        fields = frozenset(['uid', 'offers'])
+        response = PartsMatchResponse.new_from_dict(resource, fields=fields)
+        part = response.results[0].items[0]
+        assert part.requested_fields == fields
+        assert part.specs == {} and not part.fetched('specs')
+        assert part.brand is None and not part.fetched('brand')
+        assert len(part.offers) == 1 and part.fetched('offers')
+
+    def test_no_projection(self):
+        part = Part.new_from_dict(samples.part(
+                specs=samples.specs(samples.spec())))
+        assert part.requested_fields is None
+        assert part.fetched('specs') and len(part.specs) == 1
+
+
+class DiffTest(unittest.TestCase):
+
+    def test_identical_parts(self):
+        assert diff.diff(samples.part(), samples.part()) == []
+
+    def test_offer_changes(self):
+        old = samples.part(offers=[
+            samples.offer(),
+            samples.offer(sku='GONE', seller_uid='2', seller_name='Mouser')])
+        new = samples.part(offers=[
+            samples.offer(in_stock_quantity=60,
+                prices={'USD': [[1, '0.45']]}),
+            samples.offer(sku='NEW', seller_uid='3', seller_name='Newark')])
+        changes = diff.diff(old, new)
+        kinds = [change.__class__ for change in changes]
+        assert kinds == [diff.PriceChanged, diff.StockChanged,
+                diff.OfferRemoved, diff.OfferAdded]
+        assert changes[0].path == ('721abb1d3046addd', ('459', '296-1234-ND'))
+        assert changes[1].delta == -40
+        assert changes[2].offer.sku == 'GONE'
+        assert changes[3].offer.sku == 'NEW'
+
+    def test_spec_changes(self):
+        old = samples.part(specs=samples.specs(samples.spec(),
+                samples.spec('case_package', '0603', '0603', 'string',
+                             None, None)))
+        new = samples.part(specs=samples.specs(
+                samples.spec(value='0.00001', display_value='10 uF'),
+                samples.spec('voltage_rating_dc', '50', '50 V',
+                             unit_symbol='V',
+                             unit_name='volts')))
+        changes = diff.diff(old, new)
+        assert [change.__class__ for change in changes] == \
+            [diff.SpecChanged] * 3
+        changes = dict((change.key, change) for change in changes)
+        assert sorted(changes) == ['capacitance', 'case_package',
+                                   'voltage_rating_dc']
+        assert changes['capacitance'].path == ('721abb1d3046addd',
+                                               'capacitance')
+        assert changes['capacitance'].new.display_value == '10 uF'
+        assert changes['case_package'].new is None
+        assert changes['voltage_rating_dc'].old is None
+        assert diff.diff(old, copy.deepcopy(old)) == []
+
+    def test_response_changes(self):
+        old = samples.match_response([
+            samples.match_result([samples.part(), samples.part(uid='b')])])
+        new = samples.match_response([
+            samples.match_result([samples.part(mpn='SN74S74NE4'),
+                                  samples.part(uid='c')])])
+        changes = diff.diff(old, new)
+        assert changes[0] == diff.FieldChanged((0, '721abb1d3046addd'),
+                'mpn', 'SN74S74N', 'SN74S74NE4')
+        assert changes[1].__class__ is diff.PartRemoved
+        assert changes[2].__class__ is diff.PartAdded
+        assert changes[2].path == (0, 'c')
+
+
+
+class PartIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.ti = samples.part(uid='a', category_uids=['logic'])
+        self.st = samples.part(uid='b', mpn='LM358', offers=[
+            samples.offer(sku='LM358-ND'),
+            samples.offer(sku='511-LM358', seller_uid='2',
+                          seller_name='Mouser')],
+            manufacturer=samples.manufacturer('st', 'STMicroelectronics'),
+            category_uids=['amplifiers'])
+        self.index = PartIndex(list_to_class([self.ti, self.st], Part))
+
+    def test_lookups(self):
+        assert len(self.index) == 2 and 'a' in self.index
+        assert sorted(offer.sku for _, offer in
+                self.index.offers_by_seller('459')) == ['296-1234-ND',
+                                                        'LM358-ND']
+        assert [part.uid for part, _ in
+                self.index.offers_by_seller('2')] == ['b']
+        assert [part.mpn for part in
+                self.index.parts_by_manufacturer('st')] == ['LM358']
+        assert [part.mpn for part in
+                self.index.parts_by_category('logic')] == ['SN74S74N']
+        assert len(self.index.parts_by_brand('2c3be9310496fffc')) == 2
+        assert self.index.parts_by_seller('nobody') == []
+
+    def test_refresh(self):
+        refreshed = Part.new_from_dict(dict(self.st, offers=[
+            samples.offer(sku='511-LM358', seller_uid='2',
+                          seller_name='Mouser')], category_uids=['logic']))
+        previous = self.index.refresh(refreshed)
+        assert previous.uid == 'b' and previous is not refreshed
+        assert [part.uid for part, _ in
+                self.index.offers_by_seller('459')] == ['a']
+        assert len(self.index.parts_by_category('logic')) == 2
+        assert 'amplifiers' not in self.index.categories
+        assert self.index.get('b') is refreshed
+
+    def test_remove(self):
+        self.index.remove('b')
+        assert 'b' not in self.index
+        assert '2' not in self.index.sellers
+        assert 'st' not in self.index.manufacturers
+        assert len(self.index.offers_by_seller('459')) == 1
+        self.assertRaises(KeyError, self.index.remove, 'b')
+
+
+class SnapshotTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'catalog.snapshot')
+        self.parts = [samples.part(uid='%x' % uid, mpn='MPN%d' % uid)
+                      for uid in range(100)]
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_lookup(self):
+        assert write_snapshot(self.path, iter(self.parts),
+                              metadata={'source': 'test'}) == 100
+        with Snapshot(self.path) as snapshot:
+            assert len(snapshot) == 100 and snapshot.version == 1
+            assert snapshot.metadata == {'source': 'test'}
+            part = snapshot.get('2a')
+            assert part == Part.new_from_dict(self.parts[42])
+            assert part.offers[0].sku == '296-1234-ND'
+            assert snapshot.resource('2a') == self.parts[42]
+            assert snapshot.get('missing') is None and 'missing' not in \
+                snapshot
+            assert sorted(part.uid for part in snapshot) == sorted(
+                    part['uid'] for part in self.parts)
+
+    def test_codec(self):
+        write_snapshot(self.path, self.parts, codec=Codec(
+                dictionary=b'"__class__":"PartOffer",'))
+        with Snapshot(self.path) as snapshot:
+            assert snapshot.codec.dictionary == b'"__class__":"PartOffer",'
+            assert snapshot.get('63').mpn == 'MPN99'
+            assert snapshot.metadata is None
+
+    def test_version(self):
+        write_snapshot(self.path, self.parts[:1])
+        with open(self.path, 'r+b') as snapshot:
+            snapshot.seek(8)
+            snapshot.write(struct.pack('<I', 2))
+        self.assertRaises(ValueError, Snapshot, self.path)
+
+
+class SerializeTest(unittest.TestCase):
+
+    def setUp(self):
+        resource = samples.match_response([samples.match_result([
+            samples.part(specs=samples.specs(samples.spec()))])])
+        self.response = PartsMatchResponse.new_from_dict(resource,
+                fields=frozenset(['uid', 'offers', 'specs']))
+
+    def assert_same(self, clone, original):
+        assert clone == original
+        assert clone.__class__ is original.__class__
+        state = dict((key, val) for key, val in vars(original).items()
+                     if not key.startswith('_'))
+        assert vars(clone) == state
+
+    def test_to_dict(self):
+        state = json.loads(json.dumps(self.response.to_dict()))
+        clone = PartsMatchResponse.from_dict(state)
+        self.assert_same(clone, self.response)
+        part, original = clone.results[0].items[0], \
+            self.response.results[0].items[0]
+        self.assert_same(part, original)
+        self.assert_same(part.offers[0], original.offers[0])
+        assert part.requested_fields == frozenset(['uid', 'offers', 'specs'])
+        # Raw resources kept by objects are not read back as objects
+        assert part.specs['capacitance'].metadata == samples.spec()['metadata']
+        self.assertRaises(TypeArgumentError, Part.from_dict, state)
+
+    def test_datatype(self):
+        metadata = SpecMetadata.new_from_dict(samples.spec()['metadata'])
+        clone = SpecMetadata.from_dict(json.loads(json.dumps(
+                metadata.to_dict())))
+        assert clone.datatype is float and clone.unit == metadata.unit
+
+    def test_pickle(self):
+        part = Part.new_from_dict(samples.part(),
+                                  fields=frozenset(['uid', 'offers']))
+        hash(part)
+        clone = pickle.loads(pickle.dumps(part, pickle.HIGHEST_PROTOCOL))
+        assert '_hash' not in clone.__dict__
+        self.assert_same(clone, part)
+
+    def test_dumps(self):
+        data = serialize.dumps([self.response], 'pickle')
+        assert data[:1] == b'P'
+        self.assert_same(serialize.loads(data)[0], self.response)
+        self.assertRaises(ValueError, serialize.loads, b'X')
+
+    @unittest.skipIf(serialize.msgpack is None, 'msgpack is not installed')
+    def test_msgpack(self):
+        data = serialize.dumps({'response': self.response}, 'msgpack')
+        assert data[:1] == b'M'
+        clone = serialize.loads(data)['response']
+        self.assert_same(clone, self.response)
+        assert clone.results[0].items[0].specs['capacitance'].metadata == \
+            samples.spec()['metadata']
+
+
+if __name__ == '__main__':
+    unittest.main()